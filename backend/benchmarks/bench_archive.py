@@ -0,0 +1,105 @@
+"""
+Benchmark - Arquivo frio comprimido do histórico.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_archive.py [sessoes] [mensagens_por_sessao]
+
+Cria um histórico sintético (APPDATA isolado) em que 90% das sessões estão
+ociosas há 60 dias, mede o tamanho do arquivo e a latência a quente das
+leituras, roda o arquivamento + VACUUM incremental e mede de novo:
+  - histórico completo de uma sessão antiga (tabela quente x blob descomprimido)
+  - primeira página de uma sessão recente (que continua na tabela quente)
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import build_vocabulary
+
+
+def populate(db, sessions, per_session):
+    rng = random.Random(7)
+    vocabulary, weights = build_vocabulary(rng)
+    from itertools import accumulate
+    cum_weights = list(accumulate(weights))
+    old, recent = [], []
+    for index in range(sessions):
+        session_id = f"sess_{index:06d}"
+        idle = index % 10 != 0
+        (old if idle else recent).append(session_id)
+        age = "-60 days" if idle else "-1 hours"
+        rows = []
+        for turn in range(per_session):
+            role = "user" if turn % 2 == 0 else "assistant"
+            text = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(10, 120)))
+            metadata = '{"tokens": %d, "tps": 42.0, "duration": 1.5, "model": "llama3"}' % rng.randint(10, 400) if role == "assistant" else None
+            rows.append((session_id, role, text, age, metadata))
+        with db.pool.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO history (session_id, role, content, timestamp, metadata)
+                VALUES (?, ?, ?, datetime('now', ?), ?)
+            ''', rows)
+    return old, recent
+
+
+def file_size(db):
+    db.pool.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(db.db_path)
+
+
+def latency(func, session_ids, repeats=200):
+    rng = random.Random(1)
+    samples = []
+    for _ in range(repeats):
+        session_id = rng.choice(session_ids)
+        t0 = time.perf_counter()
+        func(session_id)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def measure(label, db, history_manager, old, recent):
+    size = file_size(db)
+    full = latency(history_manager._get_full_history_sync, old)
+    page = latency(history_manager._get_history_page_sync, recent)
+    print(f"  {label:<7} banco {size / 1024 / 1024:8.1f} MB | histórico antigo {full:6.2f} ms | página recente {page:6.2f} ms")
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    per_session = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["APPDATA"] = tmp
+        from core.database import db
+        from core.history_manager import history_manager
+        from core.history_archive import history_archive
+
+        print(f"Populando {sessions} sessões x {per_session} mensagens...")
+        old, recent = populate(db, sessions, per_session)
+
+        print("Medições (mediana a quente):")
+        measure("antes", db, history_manager, old, recent)
+
+        t0 = time.perf_counter()
+        archived = history_archive.archive_idle_sessions()
+        steps = 0
+        while db.incremental_vacuum() > 0:
+            steps += 1
+        elapsed = time.perf_counter() - t0
+        stats = history_archive.stats
+        ratio = stats["bytes_in"] / max(stats["bytes_out"], 1)
+        print(f"  arquivadas {archived['sessions']} sessões / {archived['messages']} mensagens em {elapsed:.1f}s "
+              f"(compressão {ratio:.1f}x, {steps} passos de VACUUM)")
+
+        measure("depois", db, history_manager, old, recent)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
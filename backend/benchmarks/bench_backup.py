@@ -0,0 +1,102 @@
+"""
+Benchmark - Latência de escrita do chat durante o backup online.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_backup.py [mensagens]
+
+Cria um histórico sintético (APPDATA isolado) e, enquanto uma thread grava uma
+mensagem a cada 5 ms (como o flush da fila write-behind), mede a latência de
+escrita em três cenários:
+  - sem backup
+  - backup em passos com pausa (BackupManager, o usado em produção)
+  - backup em um único passo (pages=-1), para comparação
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WRITE_INTERVAL = 0.005
+
+
+def populate(db, count):
+    rng = random.Random(3)
+    words = ["modelo", "contexto", "resposta", "python", "sqlite", "backup", "sessão", "token", "latência"]
+    for start in range(0, count, 5000):
+        rows = [
+            (f"sess_{index // 40:06d}", "user" if index % 2 == 0 else "assistant",
+             " ".join(rng.choices(words, k=rng.randint(20, 200))))
+            for index in range(start, min(start + 5000, count))
+        ]
+        with db.pool.transaction() as conn:
+            conn.executemany('INSERT INTO history (session_id, role, content) VALUES (?, ?, ?)', rows)
+
+
+def measure_writes(db, stop):
+    """Grava uma mensagem por transação até `stop` e retorna as latências (ms)."""
+    samples = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        with db.pool.transaction() as conn:
+            conn.execute('INSERT INTO history (session_id, role, content) VALUES (?, ?, ?)',
+                         ("sess_bench", "user", "mensagem durante o backup"))
+        samples.append((time.perf_counter() - t0) * 1000)
+        time.sleep(WRITE_INTERVAL)
+    return samples
+
+
+def scenario(label, db, work):
+    stop = threading.Event()
+    result = {}
+    writer = threading.Thread(target=lambda: result.setdefault("samples", measure_writes(db, stop)))
+    writer.start()
+    t0 = time.perf_counter()
+    info = work()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    writer.join()
+    samples = sorted(result["samples"])
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {label:<18} {elapsed:6.2f}s | escritas {len(samples):5d} | p50 {statistics.median(samples):6.2f} ms "
+          f"| p99 {p99:6.2f} ms | máx {samples[-1]:7.2f} ms{info or ''}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["APPDATA"] = tmp
+        import sqlite3
+        from core.database import db
+        from core.backup_manager import backup_manager
+
+        print(f"Populando {count} mensagens...")
+        populate(db, count)
+        db.pool.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"Banco: {os.path.getsize(db.db_path) / 1024 / 1024:.1f} MB")
+
+        def stepped():
+            info = backup_manager.create_backup()
+            return f" | {info['steps']} passos"
+
+        def single_step():
+            source = sqlite3.connect(db.db_path)
+            target = sqlite3.connect(os.path.join(tmp, "single.db"))
+            source.backup(target)
+            target.close()
+            source.close()
+
+        print("Latência de escrita:")
+        scenario("sem backup", db, lambda: time.sleep(2))
+        scenario("backup em passos", db, stepped)
+        scenario("backup único", db, single_step)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Microbenchmark - Conexão por operação vs ConnectionManager persistente.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_database.py [iteracoes]
+
+Compara a latência por operação dos padrões usados no DatabaseManager
+(leitura de setting e insert de métrica) abrindo uma conexão nova a cada
+chamada (comportamento antigo) e reutilizando a conexão persistente em WAL.
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.connection_manager import ConnectionManager
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT, is_encrypted INTEGER DEFAULT 0)",
+    """CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, provider TEXT, model TEXT,
+        input_tokens INTEGER DEFAULT 0, output_tokens INTEGER DEFAULT 0, latency REAL,
+        status TEXT, cost REAL DEFAULT 0.0, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)""",
+]
+SELECT_SETTING = "SELECT value, is_encrypted FROM settings WHERE key = ?"
+INSERT_METRIC = "INSERT INTO metrics (session_id, provider, model, output_tokens, latency, status) VALUES (?, ?, ?, ?, ?, ?)"
+METRIC_ROW = ("sess_bench", "ollama", "llama3", 128, 1.5, "success")
+
+
+def _prepare(db_path):
+    with sqlite3.connect(db_path) as conn:
+        for ddl in SCHEMA:
+            conn.execute(ddl)
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('theme', 'night-blue')")
+
+
+def _timeit(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<32} {elapsed / iterations * 1e6:10.1f} us/op")
+    return elapsed
+
+
+def bench_per_op_connect(db_path, iterations):
+    def read():
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(SELECT_SETTING, ("theme",)).fetchone()
+
+    def write():
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(INSERT_METRIC, METRIC_ROW)
+
+    print("Conexão por operação (antes):")
+    return _timeit("get_setting", read, iterations), _timeit("save_metric", write, iterations)
+
+
+def bench_persistent(db_path, iterations):
+    pool = ConnectionManager(db_path)
+
+    def read():
+        pool.connection().execute(SELECT_SETTING, ("theme",)).fetchone()
+
+    def write():
+        with pool.transaction() as conn:
+            conn.execute(INSERT_METRIC, METRIC_ROW)
+
+    print("ConnectionManager persistente (depois):")
+    try:
+        return _timeit("get_setting", read, iterations), _timeit("save_metric", write, iterations)
+    finally:
+        pool.close()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, "before.db")
+        after_path = os.path.join(tmp, "after.db")
+        _prepare(before_path)
+        _prepare(after_path)
+
+        before = bench_per_op_connect(before_path, iterations)
+        after = bench_persistent(after_path, iterations)
+
+    print("Speedup:")
+    print(f"  get_setting {before[0] / after[0]:.1f}x | save_metric {before[1] / after[1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
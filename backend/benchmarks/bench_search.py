@@ -0,0 +1,101 @@
+"""
+Benchmark - Busca FTS5 no histórico de conversas.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_search.py [mensagens] [repeticoes]
+
+Cria um banco sintético em um diretório temporário (APPDATA isolado), popula
+`history` pelos triggers do índice FTS5 e mede a latência de buscas por
+termo, prefixo e frase através de HistoryManager._search_history_sync.
+
+O texto sintético segue uma distribuição tipo Zipf (palavras funcionais muito
+frequentes, vocabulário longo e raro), próxima de conversas reais.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STOPWORDS = "de que o a e é para um uma com não os no na se por mais".split()
+
+TOPIC_WORDS = (
+    "projeto código função banco dados modelo resposta contexto sessão usuário "
+    "servidor cliente interface desempenho memória consulta índice tabela página "
+    "arquivo pasta configuração prompt sistema local rede latência token geração "
+    "python react electron ollama studio tradução resumo análise relatório criativo"
+).split()
+
+QUERIES = {
+    "termo": "latência",
+    "prefixo": "config*",
+    "frase": '"banco dados"',
+    "termos (AND)": "python índice",
+}
+
+
+def build_vocabulary(rng, size=20_000):
+    """Gera palavras sintéticas por sílabas com pesos Zipf (1/rank)."""
+    syllables = ["ba", "ca", "da", "fe", "ge", "li", "mo", "nu", "pa", "ra", "so", "ta", "vi", "xo", "zu"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(syllables, k=rng.randint(2, 4))))
+    words = sorted(words)
+    weights = [1.0 / rank for rank in range(1, size + 1)]
+    scale = 0.65 / sum(weights)
+    vocabulary = STOPWORDS + TOPIC_WORDS + words
+    weights = [0.30 / len(STOPWORDS)] * len(STOPWORDS) + [0.05 / len(TOPIC_WORDS)] * len(TOPIC_WORDS) + [w * scale for w in weights]
+    return vocabulary, weights
+
+
+def populate(db, total, batch=50_000):
+    rng = random.Random(42)
+    vocabulary, weights = build_vocabulary(rng)
+    inserted = 0
+    while inserted < total:
+        size = min(batch, total - inserted)
+        rows = [
+            (f"sess_{(inserted + i) // 200}", "user" if i % 2 else "assistant",
+             " ".join(rng.choices(vocabulary, weights, k=rng.randint(8, 40))))
+            for i in range(size)
+        ]
+        with db.pool.transaction() as conn:
+            conn.executemany("INSERT INTO history (session_id, role, content) VALUES (?, ?, ?)", rows)
+        inserted += size
+        print(f"\r  {inserted}/{total} mensagens", end="", flush=True)
+    print()
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["APPDATA"] = tmp
+        from core.database import db
+        from core.history_manager import history_manager
+
+        print(f"Populando {total} mensagens...")
+        start = time.perf_counter()
+        populate(db, total)
+        print(f"  inserção + indexação: {time.perf_counter() - start:.1f}s")
+
+        print(f"Latência de busca ({repeats} repetições, top 20):")
+        for label, query in QUERIES.items():
+            samples = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                results = history_manager._search_history_sync(query)
+                samples.append((time.perf_counter() - t0) * 1000)
+            samples.sort()
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            print(f"  {label:<14} mediana {statistics.median(samples):7.2f} ms | p95 {p95:7.2f} ms | {len(results)} resultados")
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
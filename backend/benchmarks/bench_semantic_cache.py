@@ -0,0 +1,128 @@
+"""
+Benchmark - Cache semântico contra um servidor de embeddings local.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_semantic_cache.py [perguntas]
+
+Sobe um servidor substituto de `/v1/embeddings` (compatível com OpenAI, vetores
+de trigramas de caracteres com hashing - perguntas parecidas ficam próximas),
+aponta o provedor Ollama para ele (APPDATA isolado) e envia um conjunto de
+perguntas com variações de escrita. Mede:
+  - taxa de acerto por limiar de similaridade
+  - latência da consulta (embedding + busca no índice)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DIMENSIONS = 768
+TOPICS = [
+    "como instalar o python no windows", "qual a diferença entre lista e tupla em python",
+    "como criar um ambiente virtual", "o que é uma api rest", "como fazer um loop em javascript",
+    "explique o que é recursão", "como ler um arquivo csv com pandas", "o que é docker",
+    "como centralizar uma div com css", "qual a capital da austrália"
+]
+
+
+def embed_text(text):
+    """Vetor de trigramas com hashing (determinístico, sem modelo)."""
+    vector = [0.0] * DIMENSIONS
+    padded = f"  {text.lower()}  "
+    for index in range(len(padded) - 2):
+        digest = hashlib.blake2b(padded[index:index + 3].encode("utf-8"), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % DIMENSIONS] += 1.0
+    return vector
+
+
+class EmbeddingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        body = json.dumps({
+            "object": "list", "model": request.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": embed_text(t)} for i, t in enumerate(texts)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EmbeddingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def variations(question, rng):
+    """Reescritas leves: pontuação, caixa, palavras de cortesia."""
+    options = [
+        question + "?", question.capitalize() + "?", "por favor, " + question,
+        question.replace("como ", "como eu "), question + " ?", question.upper()
+    ]
+    return rng.sample(options, 3)
+
+
+async def run(count):
+    from core.database import db
+    from core.semantic_cache import SemanticCache
+    from core.providers.ollama.provider import Provider
+
+    server = start_server()
+    db.set_setting("base_url_ollama", f"http://127.0.0.1:{server.server_port}/v1")
+    # Sem modelo de embeddings configurado o cache semântico fica desligado
+    db.set_setting("embedding_model_ollama", "nomic-embed-text")
+    provider = Provider()
+    rng = random.Random(9)
+    system = {"role": "system", "content": "Você é o CriativosPro."}
+
+    for threshold in (0.97, 0.93, 0.90):
+        db.set_setting("semantic_cache_threshold", str(threshold))
+        cache = SemanticCache()
+        latencies, hits, total = [], 0, 0
+        for topic in TOPICS:
+            query = await cache.lookup(provider, "ollama", "bench", [system, {"role": "user", "content": topic}])
+            cache.store(query, f"resposta sobre {topic}", {"tokens": 10})
+        for _ in range(count):
+            topic = rng.choice(TOPICS)
+            question = variations(topic, rng)[0]
+            t0 = time.perf_counter()
+            query = await cache.lookup(provider, "ollama", "bench", [system, {"role": "user", "content": question}])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            total += 1
+            if query.response is not None:
+                hits += 1
+                assert query.response.content == f"resposta sobre {topic}", (question, query.response.content)
+        latencies.sort()
+        print(f"  limiar {threshold:.2f} | acertos {hits / total:6.1%} | consulta p50 {latencies[len(latencies) // 2]:5.2f} ms "
+              f"| p99 {latencies[int(len(latencies) * 0.99)]:5.2f} ms")
+    server.shutdown()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["APPDATA"] = tmp
+        print(f"{count} perguntas variadas sobre {len(TOPICS)} temas (vetores de {DIMENSIONS} dimensões)")
+        asyncio.run(run(count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark - Tempo de inicialização do banco no boot do backend.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_startup.py [repeticoes]
+
+Cada medição roda em um processo Python novo (como um boot real) e cronometra
+a importação de `core.history_manager`, que instancia o DatabaseManager e
+prepara o esquema; as dependências que não tocam o banco são importadas antes.
+"Primeiro boot" usa um APPDATA vazio; "boot a quente" reabre um banco já
+criado (caso comum, em que nenhum DDL deveria rodar).
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+# Dependências sem efeito no banco ficam fora da medição
+import cryptography.fernet, core.constants, core.connection_manager, core.quantile_sketch, core.logger
+t0 = time.perf_counter()
+from core.history_manager import history_manager
+print((time.perf_counter() - t0) * 1000)
+"""
+
+
+def boot(appdata):
+    env = dict(os.environ, APPDATA=appdata)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, cwd=BACKEND_DIR,
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def report(label, samples):
+    print(f"  {label:<16} mediana {statistics.median(samples):7.2f} ms | min {min(samples):7.2f} ms")
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    cold = []
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as tmp:
+            cold.append(boot(tmp))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        boot(tmp)  # cria o banco
+        warm = [boot(tmp) for _ in range(repeats)]
+
+    print(f"Inicialização do banco ({repeats} processos por cenário):")
+    report("primeiro boot", cold)
+    report("boot a quente", warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark - Agrupamento dos chat_chunk no streaming.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_stream_coalescing.py [tokens]
+
+Simula um provedor gerando `tokens` deltas em ritmos diferentes e compara o
+envio de um frame por delta (window_ms=0) com o agrupador padrão. O "emit"
+serializa o pacote como o Socket.IO faz (JSON com o prefixo "42"). Mede:
+  - frames e bytes enviados
+  - TTFT do primeiro frame (atraso entre o primeiro delta e o primeiro envio)
+  - atraso máximo entre um delta chegar e ser enviado
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chunk_coalescer import ChunkCoalescer
+from core.constants import STREAM_COALESCE_WINDOW_MS, STREAM_COALESCE_MAX_BYTES
+
+PAYLOAD = {"session_id": "sess_1700000000000_abcdefghi"}
+
+
+async def run(tokens, tps, window_ms):
+    rng = random.Random(5)
+    sent = {"frames": 0, "bytes": 0, "chars": 0, "first": None, "max_delay": 0.0}
+    arrivals = []  # (instante de chegada, total de caracteres até aqui)
+
+    async def emit(text):
+        now = time.perf_counter()
+        packet = "42" + json.dumps(["chat_chunk", {"content": text, **PAYLOAD}], separators=(",", ":"))
+        sent["frames"] += 1
+        sent["bytes"] += len(packet)
+        sent["chars"] += len(text)
+        if sent["first"] is None:
+            sent["first"] = now
+        # Atraso do delta mais antigo incluído neste frame
+        for arrived, total in arrivals:
+            if total > sent["chars"] - len(text):
+                sent["max_delay"] = max(sent["max_delay"], now - arrived)
+                break
+
+    coalescer = ChunkCoalescer(emit, window_ms=window_ms, max_bytes=STREAM_COALESCE_MAX_BYTES)
+    total = 0
+    start = None
+    for _ in range(tokens):
+        await asyncio.sleep(rng.expovariate(tps))
+        text = rng.choice(["a", "o", "de", "para", "modelo", " ", "resposta", ",", "\n"]) + " "
+        now = time.perf_counter()
+        start = start or now
+        total += len(text)
+        arrivals.append((now, total))
+        await coalescer.push(text)
+    await coalescer.close()
+    return sent, (sent["first"] - start) * 1000
+
+
+async def main():
+    tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    print(f"{tokens} deltas por cenário (janela padrão {STREAM_COALESCE_WINDOW_MS} ms, limite {STREAM_COALESCE_MAX_BYTES} B)")
+    for tps in (20, 100, 400):
+        for label, window in (("1 frame/delta", 0), ("agrupado", STREAM_COALESCE_WINDOW_MS)):
+            sent, ttft = await run(tokens if tps > 20 else tokens // 10, tps, window)
+            print(f"  {tps:4d} tok/s {label:<14} frames {sent['frames']:5d} | {sent['bytes'] / 1024:7.1f} KB "
+                  f"| TTFT +{ttft:5.2f} ms | atraso máx {sent['max_delay'] * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
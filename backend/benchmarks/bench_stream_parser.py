@@ -0,0 +1,73 @@
+"""
+Benchmark - Parser incremental do raciocínio (<think>) no streaming.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_stream_parser.py [deltas]
+
+Gera um stream longo de um modelo de reasoning (bloco <think> seguido da
+resposta), cortado em deltas de 1 a 8 caracteres, de modo que as tags caem
+partidas entre deltas. Compara o filtro antigo (str.split por delta +
+concatenação de string) com o ReasoningStreamParser:
+  - deltas por segundo
+  - se a resposta reconstruída está correta
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.stream_parser import ReasoningStreamParser
+
+WORDS = ["o", "modelo", "precisa", "de", "contexto", "para", "responder", "sobre", "python", "<b>", "a<c", "\n"]
+
+
+def build_stream(deltas, seed=11):
+    rng = random.Random(seed)
+    words = max(deltas, 10)
+    thinking = " ".join(rng.choice(WORDS) for _ in range(words))
+    answer = " ".join(rng.choice(WORDS) for _ in range(words))
+    text = f"<think>{thinking}</think>{answer}"
+    chunks, position = [], 0
+    while position < len(text):
+        size = rng.randint(1, 8)
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks, answer
+
+
+def legacy_filter(chunks):
+    """Filtro anterior do controller."""
+    full_response = ""
+    is_thinking = False
+    for content in chunks:
+        if "<think>" in content: is_thinking = True; content = content.split("<think>")[-1]
+        if "</think>" in content: is_thinking = False; content = content.split("</think>")[-1]
+        if content and not is_thinking:
+            full_response += content
+    return full_response
+
+
+def incremental_parser(chunks):
+    parser = ReasoningStreamParser()
+    for content in chunks:
+        parser.feed(content)
+    parser.finish()
+    return parser.answer
+
+
+def main():
+    deltas = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    chunks, expected = build_stream(deltas)
+    print(f"{len(chunks)} deltas, {sum(map(len, chunks)) / 1024:.0f} KB de texto")
+    for label, fn in (("split por delta", legacy_filter), ("parser incremental", incremental_parser)):
+        t0 = time.perf_counter()
+        result = fn(chunks)
+        elapsed = time.perf_counter() - t0
+        status = "correta" if result == expected else f"INCORRETA ({len(result)} de {len(expected)} caracteres)"
+        print(f"  {label:<20} {len(chunks) / elapsed / 1000:8.0f} mil deltas/s | {elapsed * 1000:7.1f} ms | resposta {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark - Contagem de tokens com o tokenizador local.
+
+Uso (a partir da raiz do projeto):
+    python backend/benchmarks/bench_tokenizer.py [caracteres] [vocabulario.json.gz]
+
+Sem vocabulário, treina um BPE em bytes pequeno (2000 merges) sobre texto em
+português, no mesmo formato salvo pelo TokenizerService; com um arquivo de
+`APPDATA/CriativosPro/tokenizers`, usa o vocabulário real do modelo. Mede:
+  - contagens frias (sem cache de palavras) e com o cache de palavras aquecido
+  - recontagem de um contexto de 10 turnos pela LRU de conteúdo
+  - comparação com a estimativa len/4
+"""
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PARAGRAPH = (
+    "A inteligência artificial generativa tem transformado a maneira como as pessoas trabalham, estudam e se "
+    "comunicam. Modelos de linguagem executados localmente garantem privacidade, já que nenhuma informação sai do "
+    "computador do usuário. Entretanto, é necessário gerenciar com cuidado o tamanho do contexto: cada mensagem "
+    "adicionada aumenta o tempo de processamento do prompt, e conversas longas podem ultrapassar a janela do modelo. "
+    "Por isso, contar tokens com precisão — e não apenas estimar pelo número de caracteres — permite decidir quais "
+    "mensagens enviar, quando resumir o histórico e como medir a velocidade de geração em tokens por segundo. "
+    "Além disso, acentuação, cedilha e pontuação (ç, ã, õ, é, ê, á, í, ú) mudam bastante a segmentação em português."
+)
+
+
+def portuguese_text(chars, seed=4):
+    rng = random.Random(seed)
+    words = PARAGRAPH.split()
+    parts, size = [], 0
+    while size < chars:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 30)))
+        parts.append(sentence[0].upper() + sentence[1:] + rng.choice([".", "!", "?", ":", ";"]))
+        size += len(parts[-1]) + 1
+    return " ".join(parts)[:chars]
+
+
+def train_byte_bpe(text, merges=2000):
+    """BPE em bytes mínimo (mesma pré-tokenização do tokenizador) para o benchmark rodar sem Ollama."""
+    from core.tokenizer import PRETOKENIZE_PATTERN, BYTE_ENCODER
+    words = Counter(tuple(BYTE_ENCODER[b] for b in word.encode("utf-8")) for word in PRETOKENIZE_PATTERN.findall(text))
+    learned = []
+    for _ in range(merges):
+        pairs = Counter()
+        for word, count in words.items():
+            for pair in zip(word, word[1:]):
+                pairs[pair] += count
+        if not pairs:
+            break
+        (first, second), _ = pairs.most_common(1)[0]
+        learned.append(f"{first} {second}")
+        merged_words = Counter()
+        for word, count in words.items():
+            symbols, index = [], 0
+            while index < len(word):
+                if index < len(word) - 1 and word[index] == first and word[index + 1] == second:
+                    symbols.append(first + second)
+                    index += 2
+                else:
+                    symbols.append(word[index])
+                    index += 1
+            merged_words[tuple(symbols)] += count
+        words = merged_words
+    return {"type": "gpt2", "merges": learned}
+
+
+def rate(label, chars, fn, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - t0) / repeat
+    print(f"  {label:<34} {elapsed * 1000:8.2f} ms | {chars / elapsed / 1e6:6.2f} M caracteres/s")
+    return result
+
+
+def main():
+    chars = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["APPDATA"] = tmp
+        from core.tokenizer import TokenizerService, load_tokenizer
+
+        if len(sys.argv) > 2:
+            with gzip.open(sys.argv[2], "rt", encoding="utf-8") as source:
+                data = json.load(source)
+            family = os.path.basename(sys.argv[2]).split(".json")[0]
+        else:
+            print("Treinando BPE de exemplo (2000 merges)...")
+            data = train_byte_bpe(portuguese_text(200000, seed=1))
+            family = "bench-bpe"
+
+        text = portuguese_text(chars)
+        print(f"Texto: {len(text) / 1000:.0f} mil caracteres em português | vocabulário '{family}'")
+
+        tokenizer = load_tokenizer(family, data)
+        tokens = rate("frio (sem cache de palavras)", len(text), lambda: tokenizer.count(text))
+        rate("cache de palavras aquecido", len(text), lambda: tokenizer.count(text), repeat=5)
+        print(f"  tokens: {tokens} | estimativa len/4: {len(text) // 4} ({(len(text) // 4 - tokens) / tokens:+.1%})")
+
+        service = TokenizerService(os.path.join(tmp, "tokenizers"))
+        service.register("bench", family, tokenizer)
+        rng = random.Random(2)
+        context = [{"role": "user" if i % 2 == 0 else "assistant", "content": portuguese_text(rng.randint(200, 4000), seed=i)}
+                   for i in range(10)]
+        context_chars = sum(len(m["content"]) for m in context)
+        rate("contexto de 10 turnos (1ª contagem)", context_chars, lambda: service.count_messages("bench", context))
+        rate("contexto de 10 turnos (LRU)", context_chars, lambda: service.count_messages("bench", context), repeat=200)
+        print(f"  LRU: {service.get_stats()['hit_ratio']:.1%} de acertos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Backup Online do Banco - CriativosPro
+Gera snapshots periódicos de `criativospro.db` com a API de backup do SQLite
+(`sqlite3.Connection.backup`), copiando poucas páginas por passo com pausas
+entre eles, sem bloquear as escritas do chat. Mantém só os mais recentes.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from core.database import db
+from core.constants import BACKUP_KEEP, BACKUP_STEP_PAGES, BACKUP_STEP_PAUSE
+
+BACKUP_PREFIX = "criativospro-"
+BACKUP_SUFFIX = ".db"
+
+
+class BackupManager:
+    """Cria, valida e rotaciona os snapshots do banco."""
+
+    def __init__(self, keep=BACKUP_KEEP):
+        self.backup_dir = os.path.join(os.path.dirname(db.db_path), 'backups')
+        self.keep = keep
+        self._cancel = threading.Event()
+        self.stats = {"backups": 0, "last_duration": 0.0, "last_steps": 0, "last_bytes": 0}
+
+    def list_backups(self):
+        """Snapshots existentes, do mais antigo para o mais recente (o nome carrega a data)."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        return sorted(
+            os.path.join(self.backup_dir, name) for name in os.listdir(self.backup_dir)
+            if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)
+        )
+
+    def create_backup(self, pages=BACKUP_STEP_PAGES, pause=BACKUP_STEP_PAUSE):
+        """
+        Copia o banco para `backups/criativospro-<data>.db`.
+
+        A origem fica em uma transação de leitura durante toda a cópia: no WAL isso
+        não bloqueia os escritores e fixa o snapshot, senão cada commit do chat
+        reiniciaria o backup do zero. Cada passo copia `pages` páginas e dorme
+        `pause` segundos, então a cópia nunca disputa o disco por muito tempo.
+        Roda em thread própria (não ocupa o executor do banco).
+
+        Returns:
+            dict com caminho, tamanho, passos e duração
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        path = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S')}{BACKUP_SUFFIX}")
+        partial = path + ".part"
+        steps = 0
+
+        def step(status, remaining, total):
+            nonlocal steps
+            steps += 1
+            if self._cancel.is_set():
+                raise RuntimeError("Backup interrompido pelo encerramento do backend.")
+            if remaining:
+                time.sleep(pause)
+
+        started = time.perf_counter()
+        source = db.pool.connection()
+        target = sqlite3.connect(partial)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # abre o snapshot
+            try:
+                source.backup(target, pages=pages, progress=step)
+            finally:
+                source.rollback()
+
+            result = target.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"Backup corrompido: {result}")
+            target.close()
+            os.replace(partial, path)
+        except BaseException:
+            target.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        self.stats.update({
+            "backups": self.stats["backups"] + 1,
+            "last_duration": round(time.perf_counter() - started, 3),
+            "last_steps": steps,
+            "last_bytes": os.path.getsize(path)
+        })
+        removed = self.rotate()
+        return {"path": path, "bytes": self.stats["last_bytes"], "steps": steps,
+                "duration": self.stats["last_duration"], "removed": removed}
+
+    def cancel(self):
+        """Interrompe um backup em andamento no próximo passo (shutdown)."""
+        self._cancel.set()
+
+    def rotate(self):
+        """Apaga os snapshots mais antigos além de `keep`. Retorna quantos foram removidos."""
+        backups = self.list_backups()
+        expired = backups[:-self.keep] if self.keep > 0 else backups
+        for path in expired:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"[Backup] Não foi possível remover {path}: {e}")
+        return len(expired)
+
+# Instância global
+backup_manager = BackupManager()
@@ -38,10 +38,10 @@ class CentralBrain:
                         models = []
                     
                     # Sincronizar modelos no banco
-                    db.sync_models(provider, models)
+                    await db.run(db.sync_models, provider, models)
                     
                     # Filtrar apenas modelos ativos
-                    active_models = db.get_active_models(provider)
+                    active_models = await db.run(db.get_active_models, provider)
                     active_model_names = [m['model_name'] for m in active_models]
                     
                     self.available_models[provider] = active_model_names
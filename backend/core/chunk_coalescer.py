@@ -0,0 +1,147 @@
+"""
+Agrupador de Chunks do Streaming - CriativosPro
+Junta os deltas de texto de uma geração antes de emitir `chat_chunk`, para
+não gerar um frame do Socket.IO (e uma serialização JSON) por token.
+
+O primeiro delta sai na hora (preserva o TTFT). Depois, o texto acumulado é
+enviado quando a janela de tempo vence ou o buffer passa do limite de bytes.
+É adaptativo: se os tokens chegam mais devagar que a janela, cada um sai
+imediatamente e o agrupamento não acrescenta latência.
+"""
+import asyncio
+import json
+import time
+from core.constants import STREAM_COALESCE_WINDOW_MS, STREAM_COALESCE_MAX_BYTES
+
+
+class ChunkCoalescer:
+    """Buffer de streaming de uma geração."""
+
+    def __init__(self, emit, window_ms=STREAM_COALESCE_WINDOW_MS, max_bytes=STREAM_COALESCE_MAX_BYTES,
+                 frame_overhead=0):
+        """
+        Args:
+            emit: Coroutine function `emit(texto)` que envia um frame
+            window_ms: Janela de agrupamento (0 = um frame por delta)
+            max_bytes: Tamanho do buffer que força o envio antes da janela
+            frame_overhead: Bytes fixos de um frame (evento + envelope), para estimar a economia
+        """
+        self._emit = emit
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+        self.frame_overhead = frame_overhead
+        self._buffer = []
+        self._size = 0  # Bytes UTF-8 acumulados (o que vai no frame, não caracteres)
+        self._timer = None
+        self._lock = asyncio.Lock()  # Mantém os frames em ordem (timer x push)
+        self._started_at = None
+        self._last_flush = 0.0
+        self.deltas = 0
+        self.frames = 0
+
+    async def push(self, text):
+        """Acrescenta um delta; envia na hora se for o primeiro, se a janela venceu ou se o buffer encheu."""
+        if not text:
+            return
+        now = time.monotonic()
+        self.deltas += 1
+        self._buffer.append(text)
+        self._size += len(text.encode("utf-8"))
+
+        if self._started_at is None:
+            self._started_at = now
+            await self.flush()
+        elif self._size >= self.max_bytes or now - self._last_flush >= self.window:
+            await self.flush()
+        elif self._timer is None:
+            # Garante o envio do resto mesmo se o modelo parar de mandar tokens
+            delay = self.window - (now - self._last_flush)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Envia o texto acumulado (se houver) como um único frame."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._buffer:
+                return
+            text = "".join(self._buffer)
+            self._buffer.clear()
+            self._size = 0
+            self._last_flush = time.monotonic()
+            self.frames += 1
+            await self._emit(text)
+
+    async def close(self):
+        """Envia o que restou no buffer (chamar antes do `chat_end`)."""
+        await self.flush()
+
+    def cancel(self):
+        """Descarta o timer pendente (geração cancelada ou com erro)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def summary(self):
+        """Telemetria da geração: frames enviados, frames por segundo e bytes economizados."""
+        elapsed = (self._last_flush - self._started_at) if self._started_at is not None else 0.0
+        return {
+            "deltas": self.deltas,
+            "frames": self.frames,
+            "fps": round(self.frames / elapsed, 1) if elapsed > 0 else float(self.frames),
+            "bytes_saved": (self.deltas - self.frames) * self.frame_overhead
+        }
+
+
+class StreamSettings:
+    """Preferências de agrupamento por cliente (sid) e telemetria agregada."""
+
+    def __init__(self):
+        self._clients = {}  # sid -> {"window_ms", "max_bytes", "thinking"}
+        self.stats = {"generations": 0, "deltas": 0, "frames": 0, "bytes_saved": 0}
+
+    def set_client_options(self, sid, window_ms, max_bytes, thinking=False):
+        self._clients[sid] = {"window_ms": window_ms, "max_bytes": max_bytes, "thinking": thinking}
+
+    def client_options(self, sid):
+        return self._clients.get(sid, {
+            "window_ms": STREAM_COALESCE_WINDOW_MS, "max_bytes": STREAM_COALESCE_MAX_BYTES, "thinking": False
+        })
+
+    def wants_thinking(self, sid):
+        """Se o cliente pediu o raciocínio do modelo no canal `thinking_chunk`."""
+        return self.client_options(sid)["thinking"]
+
+    def clear(self, sid):
+        self._clients.pop(sid, None)
+
+    def coalescer_for(self, sid, event, payload, emit):
+        """
+        Cria o agrupador de uma geração com as preferências do cliente.
+        `payload` é o dict fixo do frame (sem o texto), usado para medir o overhead por frame.
+        """
+        overhead = len(json.dumps([event, {**payload, "content": ""}], separators=(",", ":"))) + 2  # "42" do Socket.IO
+        options = self.client_options(sid)
+        return ChunkCoalescer(emit, window_ms=options["window_ms"], max_bytes=options["max_bytes"], frame_overhead=overhead)
+
+    def record(self, coalescer):
+        """Soma a telemetria de uma geração encerrada e a retorna."""
+        summary = coalescer.summary()
+        self.stats["generations"] += 1
+        self.stats["deltas"] += summary["deltas"]
+        self.stats["frames"] += summary["frames"]
+        self.stats["bytes_saved"] += summary["bytes_saved"]
+        return summary
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["deltas_per_frame"] = round(stats["deltas"] / stats["frames"], 2) if stats["frames"] else 0.0
+        return stats
+
+# Instância global
+stream_settings = StreamSettings()
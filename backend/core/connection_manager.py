@@ -0,0 +1,97 @@
+"""
+Gerenciador de Conexões SQLite - CriativosPro
+Mantém conexões persistentes (uma por thread) com PRAGMAs de performance e
+executa o trabalho de banco em um executor dedicado, fora do event loop.
+"""
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from core.constants import (
+    DB_TIMEOUT, DB_EXECUTOR_WORKERS, DB_CACHED_STATEMENTS,
+    DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+)
+
+
+class ConnectionManager:
+    """
+    Pool simples de conexões SQLite persistentes.
+
+    Cada thread recebe sua própria conexão (o módulo sqlite3 não permite
+    compartilhar entre threads), criada uma única vez e reaproveitada. O cache
+    de statements do sqlite3 (`cached_statements`) garante que as queries
+    repetidas reutilizem o prepared statement já compilado.
+    """
+
+    def __init__(self, db_path: str, max_workers: int = DB_EXECUTOR_WORKERS):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="criativospro-db")
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        """Abre uma nova conexão e aplica os PRAGMAs de performance."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_TIMEOUT,
+            cached_statements=DB_CACHED_STATEMENTS,
+            # Cada conexão só é usada pela thread dona; a flag apenas permite o close() no shutdown
+            check_same_thread=False
+        )
+        # Só tem efeito em banco vazio; precisa vir antes do WAL, que já grava o cabeçalho
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(DB_TIMEOUT * 1000)}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Retorna a conexão persistente da thread atual (criando se necessário)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._closed:
+                raise RuntimeError("ConnectionManager já foi encerrado.")
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Executa um bloco em transação: commit no sucesso, rollback em erro."""
+        conn = self.connection()
+        with conn:
+            yield conn
+
+    @contextmanager
+    def rows(self):
+        """Cursor com `sqlite3.Row` sem alterar o row_factory da conexão compartilhada."""
+        cursor = self.connection().cursor()
+        cursor.row_factory = sqlite3.Row
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    async def run(self, func, *args, **kwargs):
+        """Executa uma função síncrona de banco no executor dedicado."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        """Encerra o executor e fecha todas as conexões abertas."""
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
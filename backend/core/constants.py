@@ -19,6 +19,7 @@ MAX_MESSAGE_LENGTH = 50000  # 50k caracteres
 MAX_SESSION_NAME_LENGTH = 100
 MAX_PROMPT_LENGTH = 10000
 MAX_PROFILE_FIELD_LENGTH = 500
+MAX_SEARCH_QUERY_LENGTH = 200
 MIN_MESSAGE_LENGTH = 1
 
 # === Timeouts (em segundos) ===
@@ -26,9 +27,41 @@ STREAM_TIMEOUT = 300  # 5 minutos
 CONNECTION_TIMEOUT = 30
 THINKING_DELAY_MS = 600  # Delay para efeito de "pensando"
 
+# === Streaming ===
+STREAM_COALESCE_WINDOW_MS = 25  # Janela de agrupamento dos chat_chunk (~40 frames/s no máximo)
+STREAM_COALESCE_MAX_BYTES = 1024  # Texto acumulado que força o envio antes da janela
+STREAM_COALESCE_MAX_WINDOW_MS = 100  # Maior janela aceita por cliente
+STREAM_THINK_OPEN_TAG = "<think>"  # Início do raciocínio dos modelos de reasoning
+STREAM_THINK_CLOSE_TAG = "</think>"  # Fim do raciocínio
+
+# === Cache de Respostas ===
+RESPONSE_CACHE_MEMORY_BYTES = 4 * 1024 * 1024  # Camada em memória (LRU por tamanho do texto)
+RESPONSE_CACHE_DISK_BYTES = 64 * 1024 * 1024  # Camada em disco (SQLite), despeja as menos usadas
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # Validade de uma resposta em cache (segundos)
+RESPONSE_CACHE_REPLAY_CHARS_PER_SEC = 4000  # Velocidade da reprodução de um acerto (0 = instantâneo)
+RESPONSE_CACHE_REPLAY_PIECE_CHARS = 24  # Tamanho dos pedaços enviados na reprodução
+RESPONSE_CACHE_PRUNE_INTERVAL = 3600  # Remoção periódica das entradas expiradas
+
+# === Cache Semântico ===
+SEMANTIC_CACHE_ENABLED = True  # Só age em provedores com embedding_model_<provedor> configurado (sem padrão)
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Similaridade de cosseno mínima (sobrescrita pela setting semantic_cache_threshold)
+SEMANTIC_CACHE_MAX_PER_MODEL = 256  # Perguntas indexadas por provedor/modelo (LRU)
+SEMANTIC_CACHE_RETRY_AFTER = 300  # Pausa após falha do /v1/embeddings de um provedor (segundos)
+
+# === Tokenizador Local ===
+TOKENIZER_DIR_NAME = 'tokenizers'  # Vocabulários baixados (APPDATA/CriativosPro/tokenizers)
+TOKEN_COUNT_CACHE_ENTRIES = 8192  # Contagens memorizadas por hash do conteúdo (LRU)
+TOKENIZER_WORD_CACHE_ENTRIES = 200000  # Palavras já segmentadas por vocabulário
+TOKENIZER_MESSAGE_OVERHEAD = 4  # Tokens do template de chat por mensagem (papel + delimitadores)
+TOKENIZER_FETCH_RETRY = 600  # Espera antes de tentar baixar de novo um vocabulário que falhou (segundos)
+
 # === Rate Limiting ===
 MAX_MESSAGES_PER_MINUTE = 20
-MAX_CONCURRENT_SESSIONS = 5
+MAX_CONCURRENT_SESSIONS = 5  # Gerações simultâneas (todas as sessões e clientes)
+PROVIDER_MAX_CONCURRENT = {  # Gerações simultâneas por provedor (servidores locais dividem a mesma GPU)
+    'ollama': 2,
+    'lmstudio': 1
+}
 
 # === Caminhos de Diretórios ===
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,6 +75,28 @@ class SystemState:
     ERROR = "ERROR"
     WAITING_INPUT = "WAITING_INPUT"
 
+# === Status de Geração por Sessão ===
+class GenerationStatus:
+    IDLE = "idle"
+    QUEUED = "queued"
+    GENERATING = "generating"
+
+# === Fila de Admissão de Gerações ===
+class GenerationPriority:
+    INTERACTIVE = 0  # Mensagens digitadas pelo usuário
+    BATCH = 1        # Pedidos em lote enviados pelo cliente
+    BACKGROUND = 2   # Trabalho interno (ex.: resumos), sem cliente esperando
+    ORDER = (INTERACTIVE, BATCH, BACKGROUND)
+    NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+ADMISSION_QUEUE_MAX = 64  # Pedidos esperando vaga (acima disso o pedido é recusado com aviso)
+ADMISSION_QUEUE_MAX_PER_CLIENT = 8  # Pedidos na fila por cliente (sid)
+ADMISSION_DEADLINES = {  # segundos que um pedido pode esperar na fila antes de ser descartado
+    GenerationPriority.INTERACTIVE: 120,
+    GenerationPriority.BATCH: 600,
+    GenerationPriority.BACKGROUND: 900
+}
+
 # === Tipos de Mensagens ===
 class MessageRole:
     USER = "user"
@@ -82,6 +137,52 @@ ENCRYPTION_ALGORITHM = 'Fernet'
 # === Configurações de Banco de Dados ===
 DB_NAME = 'criativospro.db'
 DB_TIMEOUT = 10  # segundos
+DB_EXECUTOR_WORKERS = 2  # Threads dedicadas ao trabalho de banco (fora do event loop)
+DB_CACHED_STATEMENTS = 256  # Prepared statements reaproveitados por conexão
+DB_CACHE_SIZE_KB = 16384  # 16MB de page cache por conexão
+DB_MMAP_SIZE = 256 * 1024 * 1024  # 256MB de I/O mapeado em memória
+WRITE_BEHIND_MAX_BATCH = 64  # Itens pendentes que disparam um flush imediato
+WRITE_BEHIND_FLUSH_INTERVAL = 0.25  # segundos entre flushes da fila write-behind
+WRITE_BEHIND_MAX_RETRIES = 3  # Falhas seguidas (não transitórias) antes de gravar item a item
+WRITE_BEHIND_REJECTED_KEEP = 100  # Itens recusados guardados em memória para inspeção
+HISTORY_PAGE_SIZE = 50  # Mensagens por página ao carregar uma sessão
+SESSIONS_PAGE_SIZE = 30  # Sessões por página na barra lateral
+SEARCH_RESULTS_LIMIT = 20  # Resultados máximos da busca no histórico
+METRICS_RAW_RETENTION_DAYS = 30  # Métricas brutas (já agregadas nos rollups)
+METRICS_HOURLY_RETENTION_DAYS = 90  # Rollup horário; o diário é mantido para sempre
+METRICS_PRUNE_BATCH = 5000  # Linhas apagadas por transação na poda
+METRICS_RETENTION_INTERVAL = 6 * 3600  # segundos entre execuções da retenção
+SKETCH_RELATIVE_ACCURACY = 0.01  # Erro relativo máximo dos percentis de latência (1%)
+CONTEXT_CACHE_MAX_BYTES = 16 * 1024 * 1024  # Limite do cache LRU de contexto por sessão (caracteres)
+CONTEXT_MAX_MESSAGES = 40  # Mensagens recentes mantidas por sessão (o orçamento de tokens decide quantas vão)
+CONTEXT_TOKEN_BUDGET = 3072  # Tokens de entrada por pedido (setting context_budget_<modelo>); sobra espaço para a resposta em 4k
+CONTEXT_CHARS_PER_TOKEN = 4  # Estimativa de caracteres por token
+CONTEXT_COMPACTION_TARGET = 0.6  # Fração do orçamento ocupada logo após uma compactação (folga para crescer sem cortes)
+CONTEXT_SUMMARY_TRIGGER = 0.85  # Acima disso do orçamento, o resumo é gerado antes da compactação
+CONTEXT_FRAMES_MAX = 512  # Sessões com o estado do prompt (âncora/prefixo) em memória
+CONTEXT_SUMMARY_MAX_MESSAGES = 20  # Mensagens por rodada de resumo (sessões longas avançam em várias rodadas)
+CONTEXT_SUMMARY_MESSAGE_TOKENS = 512  # Cada mensagem é truncada a isso na entrada do resumo
+CONTEXT_SUMMARY_MAX_TOKENS = 400  # Tamanho alvo do resumo
+ARCHIVE_AFTER_DAYS = 30  # Sessões sem atividade há mais tempo vão para o arquivo comprimido (setting 'archive_after_days')
+ARCHIVE_INTERVAL = 6 * 3600  # segundos entre execuções do arquivamento
+ARCHIVE_BATCH_SESSIONS = 10  # Sessões arquivadas por transação (~50 ms de lock de escrita)
+ARCHIVE_COMPRESSION_LEVEL = 6  # Nível zlib (o 9 ganha ~3% de taxa custando ~4x mais CPU)
+ARCHIVE_DICT_SIZE = 32 * 1024  # Tamanho máximo do dicionário zlib (limite da janela do deflate)
+ARCHIVE_DICT_SAMPLE_MESSAGES = 2000  # Mensagens amostradas para treinar o dicionário
+ARCHIVE_DICT_MIN_MESSAGES = 200  # Abaixo disso comprime sem dicionário e treina numa próxima execução
+VACUUM_STEP_PAGES = 512  # Páginas liberadas por passo do VACUUM incremental
+VACUUM_STEP_PAUSE = 0.05  # segundos entre passos (deixa as escritas da fila passarem)
+BACKUP_INTERVAL = 3600  # segundos entre snapshots do banco
+BACKUP_KEEP = 24  # Snapshots mantidos (um dia de backups horários)
+BACKUP_STEP_PAGES = 256  # Páginas copiadas por passo do backup online (1MB com páginas de 4KB)
+BACKUP_STEP_PAUSE = 0.01  # segundos entre passos do backup
+TRANSFER_BATCH_ROWS = 1000  # Registros lidos por fetchmany na exportação e gravados por transação na importação
+TRANSFER_PROGRESS_INTERVAL = 0.5  # segundos entre eventos de progresso da exportação/importação
+
+# === Pool HTTP (clientes compartilhados por servidor) ===
+HTTP_POOL_MAX_CONNECTIONS = 20  # Conexões simultâneas por servidor (gerações + varreduras + embeddings)
+HTTP_POOL_MAX_KEEPALIVE = 10  # Conexões ociosas mantidas abertas para reuso
+HTTP_POOL_KEEPALIVE_EXPIRY = 60  # Segundos até fechar uma conexão ociosa
 
 # === URLs Padrão dos Provedores ===
 DEFAULT_URLS = {
@@ -0,0 +1,317 @@
+"""
+Montagem do Contexto - CriativosPro
+Escolhe o que vai para o modelo por orçamento de tokens, e não por número de
+mensagens: system prompt + resumo das mensagens antigas + as mensagens mais
+recentes que couberem.
+
+Quando mensagens antigas deixam de caber, elas são resumidas em background
+(fila de gerações, prioridade BACKGROUND) por um modelo pequeno, e o resumo
+contínuo da sessão passa a representá-las. O modelo do resumo é a setting
+`summary_model_<provedor>` (ex.: "qwen2.5:0.5b"); sem ela não há resumo e as
+mensagens antigas só saem do contexto, para uma geração de resumo com o modelo
+do chat não ocupar a vaga do provedor na frente dos pedidos interativos. Assim o tamanho do prompt (e o
+tempo de prompt eval) fica limitado, qualquer que seja a duração da conversa.
+
+O prefixo do pedido (system prompt, resumo e histórico já enviado) se repete
+byte a byte entre turnos, para o Ollama/llama.cpp reaproveitar o KV cache:
+o histórico só cresce até uma compactação, que corta uma fatia grande de uma vez.
+Perto do limite o resumo já é gerado antes, para a compactação trocar o
+histórico pelo resumo num único corte de prefixo.
+"""
+import asyncio
+from collections import OrderedDict
+from core.database import db
+from core.config import config
+from core.history_manager import history_manager
+from core.generation_scheduler import generation_scheduler, AdmissionError
+from core.stream_parser import ReasoningStreamParser
+from core.tokenizer import tokenizer_service
+from core.constants import (
+    CONTEXT_TOKEN_BUDGET, CONTEXT_CHARS_PER_TOKEN, CONTEXT_COMPACTION_TARGET, CONTEXT_SUMMARY_TRIGGER,
+    CONTEXT_FRAMES_MAX, CONTEXT_SUMMARY_MAX_MESSAGES, CONTEXT_SUMMARY_MESSAGE_TOKENS, CONTEXT_SUMMARY_MAX_TOKENS,
+    TOKENIZER_MESSAGE_OVERHEAD, GenerationPriority
+)
+from core.logger import root_logger as logger
+
+SUMMARY_INSTRUCTIONS = (
+    "Você resume conversas entre um usuário e um assistente. Atualize o resumo anterior com as novas "
+    "mensagens, em português, em no máximo {words} palavras. Mantenha fatos, decisões, nomes, números, "
+    "trechos de código relevantes e o que ficou pendente. Responda apenas com o resumo."
+)
+SUMMARY_HEADER = "Resumo da conversa até aqui:\n"
+TRUNCATION_MARKER = "\n[...]\n"
+
+
+class PromptFrame:
+    """
+    Estado do prompt de uma sessão entre turnos: system prompt congelado, resumo
+    incluído (cobre as `summary_covered` primeiras mensagens) e a âncora a partir
+    da qual o histórico vai sem cortes. Enquanto não houver compactação, o pedido
+    seguinte é o anterior + as mensagens novas.
+    """
+    __slots__ = ("model", "system", "summary", "summary_covered", "anchor", "previous")
+
+    def __init__(self, model, system):
+        self.model = model
+        self.system = system
+        self.summary = None
+        self.summary_covered = 0
+        self.anchor = 0
+        self.previous = []  # Mensagens do último pedido (para medir o prefixo reaproveitado)
+
+    def prefix(self):
+        prefix = []
+        if self.system:
+            prefix.append({"role": "system", "content": self.system})
+        if self.summary:
+            prefix.append({"role": "system", "content": SUMMARY_HEADER + self.summary})
+        return prefix
+
+
+class ContextBuilder:
+    """Monta o contexto dentro do orçamento e agenda o resumo contínuo das mensagens que sobram."""
+
+    def __init__(self):
+        self._frames = OrderedDict()  # session_id -> PromptFrame (LRU)
+        self._lock = asyncio.Lock()
+        self.stats = {"builds": 0, "compactions": 0, "prefix_resets": 0, "truncated_messages": 0,
+                      "summaries": 0, "summary_errors": 0, "summaries_skipped": 0, "context_tokens_max": 0,
+                      "prompt_tokens": 0, "prefix_tokens": 0}
+
+    @staticmethod
+    def count_tokens(model_name, message):
+        """Tokens da mensagem no vocabulário do modelo (com o overhead do template de chat)."""
+        return tokenizer_service.count(model_name, message["content"]) + TOKENIZER_MESSAGE_OVERHEAD
+
+    def budget_for(self, model_name):
+        """Orçamento de tokens de entrada do modelo (setting context_budget_<modelo>)."""
+        return int(db.get_setting(f"context_budget_{model_name}") or CONTEXT_TOKEN_BUDGET)
+
+    def truncate(self, text, tokens, chars_per_token=CONTEXT_CHARS_PER_TOKEN):
+        """Corta o meio de um texto grande, mantendo o começo e o fim."""
+        chars = max(0, int(tokens * chars_per_token) - len(TRUNCATION_MARKER))
+        if len(text) <= chars:
+            return text
+        head = chars * 2 // 3
+        return text[:head] + TRUNCATION_MARKER + text[len(text) - (chars - head):]
+
+    def _fit(self, model_name, message, tokens, room):
+        """Trunca a mensagem até caber em `room` tokens (proporção de caracteres por token do próprio texto)."""
+        content = message["content"]
+        for _ in range(3):
+            chars_per_token = len(content) / max(tokens - TOKENIZER_MESSAGE_OVERHEAD, 1)
+            content = self.truncate(content, max(room - TOKENIZER_MESSAGE_OVERHEAD, 1), chars_per_token * 0.95)
+            message = {"role": message["role"], "content": content}
+            tokens = self.count_tokens(model_name, message)
+            if tokens <= room:
+                break
+        return message, tokens
+
+    async def build(self, session_id, provider_name, model_name, system_prompt, window):
+        """
+        Monta as mensagens do pedido mantendo o prefixo idêntico ao do turno anterior.
+
+        O histórico é só acrescentado a partir da âncora do quadro da sessão; quando
+        passa do orçamento, compacta de uma vez (âncora avança até sobrar
+        CONTEXT_COMPACTION_TARGET do orçamento) em vez de deslizar a cada turno.
+
+        Args:
+            window: Retorno de history_manager.get_context_window (mensagens, total, resumo, coberto)
+
+        Returns:
+            (mensagens para o provedor, {"context_tokens", "prefix_tokens", "compacted"})
+        """
+        # A contagem de tokens (BPE em Python puro) roda numa thread; os quadros são
+        # alterados por uma montagem de cada vez
+        async with self._lock:
+            context, info, summary_target = await asyncio.to_thread(
+                self._build, session_id, model_name, system_prompt, window
+            )
+        if summary_target is not None:
+            self._schedule_summary(session_id, provider_name, summary_target)
+        return context, info
+
+    def _build(self, session_id, model_name, system_prompt, window):
+        """Parte síncrona de `build`; retorna também até onde resumir (ou None)."""
+        messages, total, summary, covered = window
+        budget = self.budget_for(model_name)
+        frame = self._frame(session_id, model_name, system_prompt, total)
+
+        # Resumo novo que cobre até a âncora (preenche a lacuna da última compactação)
+        if summary and frame.summary_covered < covered <= frame.anchor:
+            frame.summary, frame.summary_covered = summary, covered
+            self.stats["prefix_resets"] += 1
+
+        first_ordinal = total - len(messages)
+        kept, used = None, 0
+        if frame.anchor >= first_ordinal:
+            kept = messages[frame.anchor - first_ordinal:]
+            used = self._count_all(model_name, frame.prefix() + kept)
+        compacted = kept is None or used > budget
+        summary_target = None
+        if compacted:
+            kept, used, summary_target = self._compact(frame, model_name, messages, total, summary, covered, budget)
+        elif used > budget * CONTEXT_SUMMARY_TRIGGER and covered <= frame.anchor:
+            # Perto do limite: resume antes, até a âncora que a compactação vai escolher,
+            # para ela trocar histórico por resumo de uma vez (sem lacuna e sem um segundo corte)
+            anchor = self._plan_anchor(model_name, frame.prefix(), messages, first_ordinal, frame.summary_covered, budget)
+            if anchor > frame.anchor:
+                summary_target = anchor
+
+        context = frame.prefix() + kept
+        prefix_tokens = self._shared_prefix_tokens(model_name, frame.previous, context)
+        frame.previous = context
+        self.stats["builds"] += 1
+        self.stats["context_tokens_max"] = max(self.stats["context_tokens_max"], used)
+        self.stats["prefix_tokens"] += prefix_tokens
+        self.stats["prompt_tokens"] += used
+        return context, {"context_tokens": used, "prefix_tokens": prefix_tokens, "compacted": compacted}, summary_target
+
+    def _compact(self, frame, model_name, messages, total, summary, covered, budget):
+        """
+        Avança a âncora: troca o histórico antigo pelo resumo e recomeça o crescimento sem cortes.
+        Retorna (mensagens mantidas, tokens, até onde resumir ou None).
+        """
+        self.stats["compactions"] += 1
+        first_ordinal = total - len(messages)
+
+        # Resumo adiantado (gerado perto do limite) já cobre além da âncora: usa-o se o resto couber
+        if summary and frame.anchor < covered < total and covered >= first_ordinal:
+            frame.summary, frame.summary_covered = summary, covered
+            kept = messages[covered - first_ordinal:]
+            used = self._count_all(model_name, frame.prefix() + kept)
+            if used <= budget:
+                frame.anchor = covered
+                return kept, used, None
+        elif summary and covered > frame.summary_covered:
+            # O resumo gravado entra já, mesmo que não cubra tudo até a nova âncora
+            frame.summary, frame.summary_covered = summary, covered
+
+        prefix = frame.prefix()
+        frame.anchor = self._plan_anchor(model_name, prefix, messages, first_ordinal, frame.summary_covered, budget)
+        kept = messages[frame.anchor - first_ordinal:]
+        used = self._count_all(model_name, prefix + kept)
+        if used > budget:
+            # A mensagem atual sozinha passa do orçamento (ex.: texto colado de 50k caracteres)
+            last, tokens = self._fit(model_name, kept[-1], self.count_tokens(model_name, kept[-1]),
+                                     budget - (used - self.count_tokens(model_name, kept[-1])))
+            kept = kept[:-1] + [last]
+            used = self._count_all(model_name, prefix + kept)
+            self.stats["truncated_messages"] += 1
+
+        # Mensagens entre o resumo e a nova âncora: resume em background até a âncora
+        return kept, used, frame.anchor if frame.anchor > frame.summary_covered else None
+
+    def _plan_anchor(self, model_name, prefix, messages, first_ordinal, floor, budget):
+        """
+        Primeira mensagem (ordinal) de uma compactação: as mais recentes que cabem em
+        CONTEXT_COMPACTION_TARGET do orçamento, nunca antes de `floor` e sempre com a atual.
+        """
+        target = budget * CONTEXT_COMPACTION_TARGET
+        used = self._count_all(model_name, prefix)
+        anchor = first_ordinal + len(messages) - 1
+        for index in range(len(messages) - 1, -1, -1):
+            ordinal = first_ordinal + index
+            if ordinal < floor:
+                break
+            used += self.count_tokens(model_name, messages[index])
+            if used > target and index < len(messages) - 1:
+                break
+            anchor = ordinal
+        return anchor
+
+    def _count_all(self, model_name, messages):
+        return sum(self.count_tokens(model_name, message) for message in messages)
+
+    def _shared_prefix_tokens(self, model_name, previous, context):
+        """Tokens das mensagens iniciais iguais às do pedido anterior (reaproveitáveis do KV cache)."""
+        shared = 0
+        for old, new in zip(previous, context):
+            if old["role"] != new["role"] or old["content"] != new["content"]:
+                break
+            shared += self.count_tokens(model_name, new)
+        return shared
+
+    def _frame(self, session_id, model_name, system_prompt, total):
+        frame = self._frames.get(session_id)
+        # Outro modelo (outro KV cache) ou sessão apagada e recomeçada: novo quadro
+        if frame is None or frame.model != model_name or total < frame.anchor:
+            frame = PromptFrame(model_name, system_prompt)
+            self._frames[session_id] = frame
+        elif frame.system != system_prompt:
+            # System prompt/perfil editado: o prefixo muda uma vez e volta a ficar estável
+            frame.system = system_prompt
+            self.stats["prefix_resets"] += 1
+        self._frames.move_to_end(session_id)
+        while len(self._frames) > CONTEXT_FRAMES_MAX:
+            self._frames.popitem(last=False)
+        return frame
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["prefix_reuse"] = round(stats["prefix_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0
+        return stats
+
+    # === Resumo contínuo ===
+
+    def summary_model(self, provider_name):
+        """Modelo pequeno usado no resumo (setting summary_model_<provedor>); None desliga o resumo."""
+        return db.get_setting(f"summary_model_{provider_name}") or None
+
+    def _schedule_summary(self, session_id, provider_name, target):
+        summary_model = self.summary_model(provider_name)
+        if not summary_model:
+            self.stats["summaries_skipped"] += 1
+            return
+        try:
+            # Sem cliente (sid=None): não recebe eventos e só roda quando sobra vaga no provedor
+            generation_scheduler.submit(
+                None, f"summary:{session_id}", provider_name,
+                lambda: self._summarize(session_id, provider_name, summary_model, target),
+                GenerationPriority.BACKGROUND
+            )
+        except AdmissionError:
+            pass  # Já há um resumo desta sessão em andamento (ou fila cheia): tenta no próximo turno
+
+    async def _summarize(self, session_id, provider_name, summary_model, target):
+        try:
+            _, _, previous, covered = await history_manager.get_context_window(session_id)
+            end = min(target, covered + CONTEXT_SUMMARY_MAX_MESSAGES)
+            if end <= covered:
+                return
+            messages = await history_manager.get_messages_range(session_id, covered, end)
+            if not messages:
+                return
+            end = covered + len(messages)
+
+            transcript = "\n\n".join(
+                f"{'Usuário' if message['role'] == 'user' else 'Assistente'}: "
+                f"{self.truncate(message['content'], CONTEXT_SUMMARY_MESSAGE_TOKENS)}"
+                for message in messages
+            )
+            request = [
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(words=CONTEXT_SUMMARY_MAX_TOKENS * 3 // 4)},
+                {"role": "user", "content": f"Resumo anterior:\n{previous or '(vazio)'}\n\nNovas mensagens:\n{transcript}"}
+            ]
+
+            from core.providers.provider_manager import provider_manager
+            provider = provider_manager.get_provider(provider_name, config.get_api_key(provider_name) or "local")
+            if not provider:
+                return
+            response = await provider.generate_response(summary_model, request, stream=False)
+
+            # Modelos de raciocínio: descarta o bloco <think>
+            parser = ReasoningStreamParser()
+            parser.feed(response.choices[0].message.content or "")
+            parser.finish()
+            summary = self.truncate(parser.answer.strip(), CONTEXT_SUMMARY_MAX_TOKENS * 2)
+            if summary:
+                await history_manager.save_summary(session_id, summary, end)
+                self.stats["summaries"] += 1
+                logger.debug(f"[Context] Resumo da sessão {session_id} cobre {end} mensagens")
+        except Exception as e:
+            self.stats["summary_errors"] += 1
+            logger.warning(f"[Context] Falha ao resumir a sessão {session_id}: {e}")
+
+# Instância global
+context_builder = ContextBuilder()
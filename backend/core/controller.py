@@ -1,13 +1,23 @@
 import asyncio
 import re
 import time
-from core.fsm import fsm, SystemState
 from core.history_manager import history_manager
+from core.generation_scheduler import generation_scheduler, AdmissionError
+from core.chunk_coalescer import stream_settings
+from core.stream_parser import ReasoningStreamParser
+from core.response_cache import response_cache
+from core.semantic_cache import semantic_cache
+from core.context_builder import context_builder
+from core.tokenizer import tokenizer_service
 from core.config import config
-from core.database import db
+from core.prompt_snapshot import prompt_store
+from core.write_behind import write_behind
+from core.quantile_sketch import QuantileSketch
 from core.tts_service import tts_service
 from core.validators import validator, ValidationError
-from core.constants import SUPPORTED_PROVIDERS, STREAM_TIMEOUT
+from core.constants import (
+    SUPPORTED_PROVIDERS, STREAM_TIMEOUT, RESPONSE_CACHE_REPLAY_CHARS_PER_SEC, RESPONSE_CACHE_REPLAY_PIECE_CHARS
+)
 from core.logger import root_logger as logger
 
 class Controller:
@@ -15,14 +25,10 @@ class Controller:
     
     def __init__(self, sio):
         self.sio = sio
-        self._current_task = None
+        self.scheduler = generation_scheduler
 
     async def handle_message(self, sid, data):
-        """Prepara e inicia o processamento de mensagem em background."""
-        if not fsm.is_idle():
-            print(f"[Controller] Sistema ocupado ({fsm.current_state.value}). Ignorando mensagem.")
-            return
-
+        """Prepara e agenda o processamento da mensagem (uma geração por sessão, várias sessões em paralelo)."""
         try:
             session_id = data.get("session_id", "default")
             user_message = data.get("content", "")
@@ -44,47 +50,63 @@ class Controller:
             if session_id != "default":
                 session_id = validator.validate_session_id(session_id)
 
+            priority = validator.validate_priority(data.get("priority"))
+            # Regenerações e testes pedem uma resposta nova mesmo para um pedido já visto
+            bypass_cache = data.get("bypass_cache") is True
+
         except ValidationError as e:
             await self.sio.emit("error", {"message": str(e)}, to=sid)
             return
 
-        # Muda estado imediatamente
-        fsm.change_to(SystemState.PROCESSING)
-
-        # Inicia a Task de Processamento Completo (que poderá ser cancelada)
-        self._current_task = asyncio.create_task(
-            self._process_message_flow(sid, session_id, user_message, provider_name, model_name)
-        )
-        # Opcional: Adicionar callback de conclusão para logging ou limpeza
-        # self._current_task.add_done_callback(...)
+        # Cada sessão gera em sua própria task (cancelável por stop_generation); sem vaga, entra na fila
+        try:
+            self.scheduler.submit(
+                sid, session_id, provider_name,
+                lambda: self._process_message_flow(sid, session_id, user_message, provider_name, model_name, bypass_cache),
+                priority
+            )
+        except AdmissionError as e:
+            await self.sio.emit("error", {"message": str(e), "session_id": session_id}, to=sid)
 
-    async def _process_message_flow(self, sid, session_id, user_message, provider_name, model_name):
+    async def _process_message_flow(self, sid, session_id, user_message, provider_name, model_name, bypass_cache=False):
         """Lógica pesada de geração, isolada para permitir cancelamento."""
+        coalescer = None
+        thinking_coalescer = None
         try:
             # 1. Registrar mensagem e Contexto
             await history_manager.add_message(session_id, "user", user_message)
-            context = await history_manager.get_context(session_id)
+            window = await history_manager.get_context_window(session_id)
             
             # Título (se aplicável)
-            if await history_manager.is_session_persistent(session_id) and len(context) == 1:
+            if window[1] == 1 and await history_manager.is_session_persistent(session_id):
                 from core.title_generator import title_generator
                 title = title_generator.generate(user_message)
                 await history_manager.set_session_title(session_id, title)
                 await self.sio.emit("new_session_title", {"session_id": session_id, "title": title}, to=sid)
 
             # --- Injeção de System Prompt ---
-            system_prompt = config.get_system_prompt('ollama' if 'ollama' in provider_name.lower() else 'lmstudio')
-            user_profile = config.get_user_profile()
-            
-            # Constrói o System Prompt final
-            if user_profile:
-                profile_context = f"\nINFO USUARIO: {user_profile.get('display_name', 'User')}"
-                if user_profile.get('custom_instructions'):
-                     profile_context += f"\nINSTRUCOES: {user_profile.get('custom_instructions')}"
-                system_prompt += profile_context
+            # (snapshot pré-compilado com o perfil; reconstruído só quando prompts/perfil são salvos)
+            snapshot = await prompt_store.current()
+            system_prompt = snapshot.system_prompt(provider_name)
+
+            # Vocabulário do modelo para contagem exata (baixado uma vez, em background)
+            tokenizer_service.prefetch(provider_name, model_name)
+
+            # Mensagens recentes que cabem no orçamento do modelo (+ resumo das antigas)
+            # (o prefixo se repete entre turnos para o servidor reaproveitar o KV cache)
+            context, context_info = await context_builder.build(session_id, provider_name, model_name, system_prompt, window)
+            context_tokens = context_info["context_tokens"]
 
-            if system_prompt:
-                context = [{"role": "system", "content": system_prompt}] + context
+            # Pedido idêntico (mesmo provedor, modelo e mensagens) já respondido: reproduz do cache
+            cache_key = response_cache.make_key(provider_name, model_name, context)
+            if bypass_cache:
+                response_cache.record_bypass()
+            else:
+                cached = await response_cache.get(cache_key)
+                if cached is not None:
+                    coalescer = self._chunk_coalescer(sid, session_id)
+                    await self._replay_cached(sid, session_id, provider_name, model_name, cached, coalescer)
+                    return
 
             # 2. Obter Provedor
             from core.providers.provider_manager import provider_manager
@@ -93,46 +115,122 @@ class Controller:
             provider = provider_manager.get_provider(provider_name, api_key)
             if not provider:
                 raise ValueError(f"Provedor {provider_name} indisponível.")
+
+            # Pergunta quase idêntica já respondida (primeiro turno, mesmo modelo e system prompt)
+            semantic_query = None
+            if not bypass_cache:
+                semantic_query = await semantic_cache.lookup(provider, provider_name, model_name, context)
+                if semantic_query is not None and semantic_query.response is not None:
+                    cached = semantic_query.response
+                    await response_cache.put(cache_key, provider_name, model_name, cached.content, cached.metrics)
+                    coalescer = self._chunk_coalescer(sid, session_id)
+                    await self._replay_cached(sid, session_id, provider_name, model_name, cached, coalescer,
+                                              cache="semantic", similarity=semantic_query.similarity)
+                    return
             
             # Chama o provedor (awaitable) com timeout
+            start_time = time.time()
             response_stream = await provider.generate_response(model_name, context, stream=True)
             
-            full_response = ""
-            token_count = 0
-            first_chunk_time = None
-            is_thinking = False
+            delta_count = 0
+            usage = None  # Uso reportado pelo provedor (último chunk), se o servidor suportar
+            first_token_time = None  # Primeiro delta gerado (inclusive raciocínio oculto)
+            timing = {"first_chunk": None, "last_chunk": None}
+            gap_sketch = QuantileSketch()  # Intervalos entre tokens desta geração
+            # Separa <think>...</think> da resposta, mesmo com a tag partida entre deltas
+            parser = ReasoningStreamParser()
+            # Deltas agrupados em menos frames (janela/limite de bytes conforme o cliente)
+            coalescer = self._chunk_coalescer(sid, session_id)
+            if stream_settings.wants_thinking(sid):
+                thinking_coalescer = self._chunk_coalescer(sid, session_id, "thinking_chunk")
+
+            async def route(segments):
+                for channel, text in segments:
+                    if channel == ReasoningStreamParser.THINKING:
+                        if thinking_coalescer is not None:
+                            await thinking_coalescer.push(text)
+                        continue
+                    now = time.time()
+                    if not timing["first_chunk"]: timing["first_chunk"] = now
+                    if timing["last_chunk"]: gap_sketch.add(now - timing["last_chunk"])
+                    timing["last_chunk"] = now
+                    await coalescer.push(text)
             
             # Timeout para o stream inteiro ou por chunk se preferir. 
             # Aqui aplicamos timeout total de segurança.
             async with asyncio.timeout(STREAM_TIMEOUT):
                 async for chunk in response_stream:
-                    content = chunk.choices[0].delta.content if chunk.choices[0].delta.content else ""
-                    
-                    # Brain Thinking Filter (Tag <think>)
-                    if "<think>" in content: is_thinking = True; content = content.split("<think>")[-1]
-                    if "</think>" in content: is_thinking = False; content = content.split("</think>")[-1]
-                    
-                    if content and not is_thinking:
-                        if not first_chunk_time: first_chunk_time = time.time()
-                        full_response += content
-                        token_count += 1
-                        await self.sio.emit("chat_chunk", {"content": content}, to=sid)
+                    usage = provider.get_metrics(chunk) or usage
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content or ""
+                    if content:
+                        delta_count += 1
+                        if not first_token_time: first_token_time = time.time()
+                        await route(parser.feed(content))
+                await route(parser.finish())
+
+            if thinking_coalescer is not None:
+                await thinking_coalescer.close()
+            await coalescer.close()
+            full_response = parser.answer
 
             # 4. Finalização e Métricas
-            duration = round(time.time() - start_time, 2)
-            tps = round(token_count / (time.time() - first_chunk_time), 1) if first_chunk_time else 0
+            end_time = time.time()
+            duration = round(end_time - start_time, 2)
+            ttft = round(timing["first_chunk"] - start_time, 3) if timing["first_chunk"] else None
+            # Prompt eval até o primeiro token gerado; eval do primeiro ao último
+            prompt_eval_duration = round(first_token_time - start_time, 3) if first_token_time else None
+            eval_duration = round(end_time - first_token_time, 3) if first_token_time else None
+
+            if usage:
+                input_tokens, output_tokens, usage_source = usage["input_tokens"], usage["output_tokens"], "provider"
+            elif tokenizer_service.is_exact(model_name):
+                # Servidor sem stream_options: conta com o vocabulário local (o raciocínio também é gerado)
+                input_tokens, usage_source = context_tokens, "tokenizer"
+                output_tokens = await tokenizer_service.count_async(model_name, parser.reasoning + full_response)
+            else:
+                # Sem vocabulário: estimativa (1 delta ~ 1 token; prompt pela montagem do contexto)
+                input_tokens, output_tokens, usage_source = context_tokens, delta_count, "estimated"
+            tps = round(output_tokens / eval_duration, 1) if eval_duration else 0
+
+            # Tokens processados no prompt eval: o servidor informa o que veio do cache;
+            # senão, estima pelo prefixo repetido do pedido anterior
+            cached_tokens = usage.get("cached_tokens") if usage else None
+            prompt_cache_source = "provider" if cached_tokens is not None else "estimated"
+            if cached_tokens is None:
+                cached_tokens = min(context_info["prefix_tokens"], input_tokens)
+            prompt_eval_tokens = max(input_tokens - cached_tokens, 0)
             
-            metrics = { "tokens": token_count, "tps": tps, "duration": duration }
+            metrics = {
+                "tokens": output_tokens, "input_tokens": input_tokens, "tps": tps, "duration": duration, "ttft": ttft,
+                "prompt_eval_duration": prompt_eval_duration, "eval_duration": eval_duration, "usage": usage_source,
+                **parser.timings(), "context_tokens": context_tokens, "cached_prompt_tokens": cached_tokens,
+                "prompt_eval_tokens": prompt_eval_tokens, "prompt_cache": prompt_cache_source,
+                "compacted": context_info["compacted"], "cache": "bypass" if bypass_cache else "miss"
+            }
+            await response_cache.put(cache_key, provider_name, model_name, full_response, metrics)
+            semantic_cache.store(semantic_query, full_response, metrics)
             
             # Salvar no Histórico
-            await history_manager.add_message(session_id, "assistant", full_response, metadata=metrics)
-            await self.sio.emit("chat_end", { "total_content": full_response, "metrics": metrics }, to=sid)
+            await history_manager.add_message(session_id, "assistant", full_response, metadata={**metrics, "model": model_name})
+            await self.sio.emit("chat_end", {
+                "total_content": full_response, "metrics": metrics, "session_id": session_id,
+                "stream": stream_settings.record(coalescer)
+            }, to=sid)
 
-            # Telemetria (Fire-and-forget)
+            # Telemetria (Fire-and-forget, gravada em lote pela fila write-behind)
             try:
-                db.save_metric(session_id, provider_name, model_name, {
-                    "input_tokens": int(len(str(context))/4), "output_tokens": token_count,
-                    "latency": duration, "status": "success"
+                write_behind.add_metric(session_id, provider_name, model_name, {
+                    "input_tokens": input_tokens, "output_tokens": output_tokens,
+                    "latency": duration, "status": "success", "cache": metrics["cache"]
+                })
+                ttft_sketch = QuantileSketch()
+                ttft_sketch.add(ttft)
+                duration_sketch = QuantileSketch()
+                duration_sketch.add(end_time - start_time)
+                write_behind.add_latency_sketches(provider_name, model_name, {
+                    "ttft": ttft_sketch, "duration": duration_sketch, "inter_token": gap_sketch
                 })
             except Exception as e:
                 logger.debug(f"Erro ao salvar métricas: {e}")
@@ -141,27 +239,66 @@ class Controller:
             await tts_service.auto_speak_if_enabled(full_response)
             
         except asyncio.CancelledError:
-            logger.info("Geração cancelada pelo usuário.")
-            await self.sio.emit("error", {"message": "Geração cancelada."}, to=sid)
+            logger.info(f"Geração da sessão {session_id} cancelada pelo usuário.")
+            await self.sio.emit("error", {"message": "Geração cancelada.", "session_id": session_id}, to=sid)
         except asyncio.TimeoutError:
             logger.error("Timeout na geração da resposta.")
-            await self.sio.emit("error", {"message": "Tempo limite de resposta excedido."}, to=sid)
+            await self.sio.emit("error", {"message": "Tempo limite de resposta excedido.", "session_id": session_id}, to=sid)
         except Exception as e:
             logger.error(f"Erro no fluxo de mensagem: {e}")
             import traceback
             traceback.print_exc()
-            await self.sio.emit("error", {"message": f"Erro interno: {str(e)}"}, to=sid)
+            await self.sio.emit("error", {"message": f"Erro interno: {str(e)}", "session_id": session_id}, to=sid)
         finally:
-             if fsm.current_state != SystemState.IDLE:
-                fsm.change_to(SystemState.IDLE)
-             self._current_task = None
-
-    async def stop_generation(self, sid):
-        """Cancela a tarefa atual se existir."""
-        if self._current_task and not self._current_task.done():
-            self._current_task.cancel()
-            
-            fsm.change_to(SystemState.IDLE)
-            await self.sio.emit("generation_stopped", {}, to=sid)
-        else:
+            for pending in (coalescer, thinking_coalescer):
+                if pending is not None:
+                    pending.cancel()
+
+    def _chunk_coalescer(self, sid, session_id, event="chat_chunk"):
+        """Agrupador dos deltas de `event` para o cliente (janela/limite de bytes conforme o cliente)."""
+        payload = {"session_id": session_id}
+        return stream_settings.coalescer_for(
+            sid, event, payload,
+            lambda text: self.sio.emit(event, {"content": text, **payload}, to=sid)
+        )
+
+    async def _replay_cached(self, sid, session_id, provider_name, model_name, cached, coalescer,
+                             cache="hit", similarity=None):
+        """
+        Reproduz uma resposta do cache pelo mesmo caminho do streaming (chat_chunk agrupado
+        e chat_end), na velocidade RESPONSE_CACHE_REPLAY_CHARS_PER_SEC.
+        `cache` identifica a camada ("hit" exato ou "semantic", com a similaridade).
+        """
+        start_time = time.time()
+        content = cached.content
+        for offset in range(0, len(content), RESPONSE_CACHE_REPLAY_PIECE_CHARS):
+            piece = content[offset:offset + RESPONSE_CACHE_REPLAY_PIECE_CHARS]
+            await coalescer.push(piece)
+            if RESPONSE_CACHE_REPLAY_CHARS_PER_SEC:
+                await asyncio.sleep(len(piece) / RESPONSE_CACHE_REPLAY_CHARS_PER_SEC)
+        await coalescer.close()
+
+        # Tokens e TPS da geração original; tempos desta reprodução
+        metrics = {
+            **cached.metrics, "duration": round(time.time() - start_time, 2), "ttft": 0.0, "cache": cache
+        }
+        if similarity is not None:
+            metrics["similarity"] = similarity
+        await history_manager.add_message(session_id, "assistant", content, metadata={**metrics, "model": model_name})
+        await self.sio.emit("chat_end", {
+            "total_content": content, "metrics": metrics, "session_id": session_id,
+            "stream": stream_settings.record(coalescer)
+        }, to=sid)
+        # Nos rollups conta só como acerto (taxa do dashboard), fora de requests e da latência média
+        write_behind.add_metric(session_id, provider_name, model_name, {
+            "input_tokens": 0, "output_tokens": 0, "latency": metrics["duration"], "status": "success", "cache": cache
+        })
+        await tts_service.auto_speak_if_enabled(content)
+
+    async def stop_generation(self, sid, session_id=None):
+        """Cancela a geração da sessão informada (ou todas as deste cliente, sem session_id)."""
+        cancelled = self.scheduler.cancel(sid, session_id)
+        if not cancelled:
             print("[Controller] Nenhuma task ativa para cancelar.")
+        for cancelled_session in cancelled:
+            await self.sio.emit("generation_stopped", {"session_id": cancelled_session}, to=sid)
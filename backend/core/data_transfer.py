@@ -0,0 +1,303 @@
+"""
+Exportação/Importação de Dados - CriativosPro
+Move sessões, mensagens e métricas entre máquinas em NDJSON (um registro JSON
+por linha, opcionalmente .gz). Leitura e escrita são em streaming: a memória
+usada não depende do tamanho do histórico.
+
+Uso pela linha de comando (a partir de backend/):
+    python -m core.data_transfer export caminho.ndjson.gz
+    python -m core.data_transfer import caminho.ndjson.gz
+"""
+import gzip
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from core.database import db
+from core.history_manager import history_manager
+from core.migrations import SCHEMA_VERSION
+from core.constants import TRANSFER_BATCH_ROWS, TRANSFER_PROGRESS_INTERVAL
+
+# Identificação do arquivo (primeira linha)
+TRANSFER_FORMAT = "criativospro-export"
+TRANSFER_FORMAT_VERSION = 1
+
+
+class DataTransfer:
+    """Exporta e importa o histórico em NDJSON sem carregar o banco em memória."""
+
+    def __init__(self):
+        self.exports_dir = os.path.join(os.path.dirname(db.db_path), 'exports')
+        # Uma transferência por vez (a importação depende do estado do banco no início)
+        self._lock = threading.Lock()
+
+    def default_export_path(self):
+        """Caminho padrão de exportação: <APPDATA>/CriativosPro/exports/criativospro-<data>.ndjson.gz"""
+        os.makedirs(self.exports_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.exports_dir, f"criativospro-{stamp}.ndjson.gz")
+
+    def _acquire(self):
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Já existe uma exportação/importação em andamento.")
+
+    # === Exportação ===
+
+    def export_to(self, path, progress=None):
+        """
+        Grava sessões, mensagens (inclusive as do arquivo comprimido) e métricas brutas em `path`.
+        Tudo é lido em um único snapshot (transação de leitura do WAL), então o arquivo
+        é consistente mesmo com o chat, o arquivamento e a poda rodando em paralelo.
+        O arquivo final só aparece quando a escrita termina (grava em `.part` e renomeia).
+
+        Args:
+            path: Destino (.ndjson/.jsonl, com .gz para comprimir)
+            progress: Callback opcional chamado com um dict de contadores
+
+        Returns:
+            dict com as contagens exportadas e o tamanho do arquivo
+        """
+        self._acquire()
+        counts = {"sessions": 0, "messages": 0, "metrics": 0}
+        partial = path + ".part"
+        try:
+            conn = db.pool.connection()
+            cursor = conn.cursor()
+            conn.execute("BEGIN")
+            try:
+                with self._open(partial, "w", self._is_gzip(path)) as out:
+                    out.write(self._dump({
+                        "type": "header", "format": TRANSFER_FORMAT, "version": TRANSFER_FORMAT_VERSION,
+                        "schema_version": SCHEMA_VERSION, "exported_at": datetime.now().isoformat(timespec="seconds")
+                    }))
+                    reporter = self._reporter(progress)
+                    sources = (
+                        ("session", "sessions", history_manager.iter_export_sessions(cursor)),
+                        ("message", "messages", history_manager.iter_export_messages(cursor)),
+                        ("metric", "metrics", db.iter_export_metrics(cursor)),
+                    )
+                    for record_type, counter, records in sources:
+                        for record in records:
+                            record["type"] = record_type
+                            out.write(self._dump(record))
+                            counts[counter] += 1
+                            reporter(counts)
+            finally:
+                cursor.close()
+                conn.rollback()
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            self._lock.release()
+
+        counts["bytes"] = os.path.getsize(path)
+        print(f"[Transfer] Exportação concluída em {path}: {counts}")
+        return counts
+
+    # === Importação ===
+
+    def import_from(self, path, progress=None, batch=TRANSFER_BATCH_ROWS):
+        """
+        Importa um arquivo gerado por `export_to`. Os registros são agrupados em lotes
+        gravados com executemany, um lote por transação curta.
+
+        Sessões que já existem no banco (tabela de sessões, histórico ou arquivo) são
+        ignoradas por inteiro, com suas mensagens e métricas: importar o mesmo arquivo
+        duas vezes não duplica nada. As mensagens recebem ids novos, na ordem do arquivo.
+
+        Cada sessão criada fica em `import_pending` até a importação terminar. Se um lote
+        falhar, os anteriores continuam gravados; importar o arquivo de novo retoma essas
+        sessões pulando as mensagens e métricas já gravadas (os lotes seguem a ordem do
+        arquivo, então elas são sempre as primeiras de cada sessão).
+
+        Returns:
+            dict com as contagens importadas, ignoradas e linhas inválidas
+        """
+        self._acquire()
+        counts = {"sessions": 0, "messages": 0, "metrics": 0, "skipped_sessions": 0,
+                  "resumed_sessions": 0, "invalid": 0}
+        decisions = {}  # session_id -> importar? (decidido na primeira vez que a sessão aparece)
+        resume = {}  # session_id -> registros por tipo já gravados por uma importação interrompida
+        try:
+            total = os.path.getsize(path)
+            with open(path, "rb") as raw, self._open(raw, "r", self._is_gzip(path)) as source:
+                self._read_header(source)
+                reporter = self._reporter(progress)
+                pending = []
+                for line in source:
+                    pending.append(line)
+                    if len(pending) >= batch:
+                        self._import_batch(pending, decisions, resume, counts)
+                        pending.clear()
+                        counts["progress"] = round(raw.tell() / total, 4) if total else 1.0
+                        reporter(counts)
+                if pending:
+                    self._import_batch(pending, decisions, resume, counts)
+            self._finish_pending(decisions)
+        finally:
+            self._lock.release()
+
+        counts.pop("progress", None)
+        print(f"[Transfer] Importação concluída de {path}: {counts}")
+        return counts
+
+    def _read_header(self, source):
+        line = source.readline()
+        try:
+            header = json.loads(line)
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("format") != TRANSFER_FORMAT:
+            raise ValueError("Arquivo não é uma exportação do CriativosPro.")
+        if header.get("version", 0) > TRANSFER_FORMAT_VERSION:
+            raise ValueError(f"Versão do arquivo ({header.get('version')}) mais nova que a suportada.")
+        return header
+
+    def _import_batch(self, lines, decisions, resume, counts):
+        """Decodifica um lote de linhas e grava tudo em uma transação."""
+        sessions, messages, metrics = [], [], []
+        with db.pool.transaction() as conn:
+            cursor = conn.cursor()
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                    record_type = record["type"]
+                    session_id = record["id"] if record_type == "session" else record.get("session_id")
+                except (ValueError, KeyError, TypeError):
+                    counts["invalid"] += 1
+                    continue
+
+                if not isinstance(session_id, str) or not self._should_import(cursor, session_id, decisions, resume, counts):
+                    continue
+                # Já gravado por uma importação interrompida deste arquivo
+                done = resume.get(session_id)
+                if done and done.get(record_type):
+                    done[record_type] -= 1
+                    continue
+
+                if record_type == "session":
+                    sessions.append((
+                        session_id, record.get("title"), record.get("created_at"), record.get("is_persistent", 1),
+                        record.get("message_count", 0), record.get("total_tokens", 0),
+                        record.get("last_model"), record.get("last_activity")
+                    ))
+                elif record_type == "message":
+                    messages.append((
+                        session_id, record.get("role"), record.get("content"),
+                        record.get("timestamp"), record.get("metadata")
+                    ))
+                elif record_type == "metric":
+                    metrics.append((
+                        *db.metric_row(session_id, record.get("provider"), record.get("model"), record),
+                        record.get("timestamp")
+                    ))
+                else:
+                    counts["invalid"] += 1
+
+            # Decisões já tomadas acima, antes de qualquer insert do lote
+            cursor.executemany('INSERT OR IGNORE INTO import_pending (session_id) VALUES (?)',
+                               ((row[0],) for row in sessions))
+            cursor.executemany('''
+                INSERT OR IGNORE INTO sessions (id, title, created_at, is_persistent,
+                                                message_count, total_tokens, last_model, last_activity)
+                VALUES (?, ?, IFNULL(?, CURRENT_TIMESTAMP), ?, ?, ?, ?, IFNULL(?, CURRENT_TIMESTAMP))
+            ''', sessions)
+            cursor.executemany('''
+                INSERT INTO history (session_id, role, content, timestamp, metadata)
+                VALUES (?, ?, ?, IFNULL(?, CURRENT_TIMESTAMP), ?)
+            ''', messages)
+            if metrics:
+                db.import_metrics(cursor, metrics)
+
+        counts["sessions"] += len(sessions)
+        counts["messages"] += len(messages)
+        counts["metrics"] += len(metrics)
+
+    def _should_import(self, cursor, session_id, decisions, resume, counts):
+        decision = decisions.get(session_id)
+        if decision is None:
+            cursor.execute('''
+                SELECT EXISTS (SELECT 1 FROM import_pending WHERE session_id = :id),
+                       EXISTS (SELECT 1 FROM sessions WHERE id = :id)
+                    OR EXISTS (SELECT 1 FROM history WHERE session_id = :id)
+                    OR EXISTS (SELECT 1 FROM history_archive WHERE session_id = :id)
+            ''', {"id": session_id})
+            interrupted, exists = cursor.fetchone()
+            if interrupted:
+                cursor.execute('''
+                    SELECT (SELECT COUNT(*) FROM history WHERE session_id = :id),
+                           (SELECT COUNT(*) FROM metrics WHERE session_id = :id)
+                ''', {"id": session_id})
+                messages, metrics = cursor.fetchone()
+                resume[session_id] = {"session": 1, "message": messages, "metric": metrics}
+                counts["resumed_sessions"] += 1
+            decision = decisions[session_id] = interrupted or not exists
+            if not decision:
+                counts["skipped_sessions"] += 1
+        return decision
+
+    def _finish_pending(self, decisions):
+        """Importação concluída: as sessões que ela criou deixam de ser retomáveis."""
+        with db.pool.transaction() as conn:
+            conn.executemany('DELETE FROM import_pending WHERE session_id = ?',
+                             ((session_id,) for session_id, imported in decisions.items() if imported))
+
+    # === Utilitários ===
+
+    @staticmethod
+    def _is_gzip(path):
+        return path.lower().endswith(".gz")
+
+    @staticmethod
+    def _open(target, mode, compressed):
+        """Abre `target` (caminho ou arquivo binário já aberto) como texto UTF-8, com gzip se `compressed`."""
+        if compressed:
+            return gzip.open(target, mode + "t", encoding="utf-8")
+        if isinstance(target, str):
+            return open(target, mode, encoding="utf-8")
+        return io.TextIOWrapper(target, encoding="utf-8")
+
+    @staticmethod
+    def _dump(record):
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    @staticmethod
+    def _reporter(progress):
+        """Chama `progress` com uma cópia dos contadores no máximo a cada TRANSFER_PROGRESS_INTERVAL."""
+        last = [time.monotonic()]
+
+        def report(counts):
+            if progress is None:
+                return
+            now = time.monotonic()
+            if now - last[0] >= TRANSFER_PROGRESS_INTERVAL:
+                last[0] = now
+                progress(dict(counts))
+        return report
+
+# Instância global
+data_transfer = DataTransfer()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Exporta/importa o histórico do CriativosPro em NDJSON.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", help="Arquivo .ndjson/.jsonl (com .gz para comprimir)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            data_transfer.export_to(os.path.abspath(args.path) if args.path else data_transfer.default_export_path())
+        else:
+            if not args.path:
+                parser.error("informe o arquivo a importar")
+            data_transfer.import_from(os.path.abspath(args.path))
+    finally:
+        db.close()
@@ -1,6 +1,37 @@
-import sqlite3
 import os
+import time
 from cryptography.fernet import Fernet
+from core.connection_manager import ConnectionManager
+from core.migrations import apply_migrations, METRIC_ROLLUPS
+from core.quantile_sketch import QuantileSketch
+from core.logger import root_logger as logger
+from core.constants import (
+    METRICS_RAW_RETENTION_DAYS, METRICS_HOURLY_RETENTION_DAYS, METRICS_PRUNE_BATCH, VACUUM_STEP_PAGES,
+    TRANSFER_BATCH_ROWS
+)
+
+# Upsert incremental de um rollup; `bucket` é a expressão SQL do bucket de tempo
+ROLLUP_UPSERT = '''
+    INSERT INTO {table} (bucket, provider, model, requests, errors, input_tokens, output_tokens, latency_sum, cost,
+                         cache_hits, cache_misses)
+    VALUES ({bucket}, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(bucket, provider, model) DO UPDATE SET
+        requests = requests + excluded.requests,
+        errors = errors + excluded.errors,
+        input_tokens = input_tokens + excluded.input_tokens,
+        output_tokens = output_tokens + excluded.output_tokens,
+        latency_sum = latency_sum + excluded.latency_sum,
+        cost = cost + excluded.cost,
+        cache_hits = cache_hits + excluded.cache_hits,
+        cache_misses = cache_misses + excluded.cache_misses
+'''
+
+# Camadas do cache de respostas que contam como acerto (exato e semântico) e como erro
+CACHE_HITS = ('hit', 'semantic')
+CACHE_MISSES = ('miss',)
+
+# Marcador para diferenciar "não está no cache" de "valor None em cache"
+_MISSING = object()
 
 class DatabaseManager:
     def __init__(self, db_name="criativospro.db", key_name="security.key"):
@@ -17,8 +48,24 @@ class DatabaseManager:
 
         self.key = self._load_or_generate_key()
         self.cipher = Fernet(self.key)
+        self.pool = ConnectionManager(self.db_path)
         self._init_db()
 
+        # Cache de settings em memória (valores já descriptografados). Depois do aquecimento ele
+        # espelha a tabela inteira (set_setting é write-through), então uma chave ausente não existe
+        self._settings_cache = {}
+        self._settings_unreadable = set()  # chaves que falharam ao descriptografar no boot
+        self.settings_cache_stats = {"hits": 0, "misses": 0}
+        self._warm_settings_cache()
+
+    async def run(self, func, *args, **kwargs):
+        """Executa uma operação síncrona de banco no executor dedicado (fora do event loop)."""
+        return await self.pool.run(func, *args, **kwargs)
+
+    def close(self):
+        """Fecha as conexões persistentes. Chamado no shutdown do backend."""
+        self.pool.close()
+
     def _load_or_generate_key(self):
         """Carrega a chave de segurança ou gera uma nova no primeiro boot."""
         if os.path.exists(self.key_path):
@@ -31,159 +78,93 @@ class DatabaseManager:
             return key
 
     def _init_db(self):
-        """Inicializa as tabelas do banco de dados se não existirem."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Tabela de Configurações (Configurações globais e API Keys criptografadas)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    is_encrypted INTEGER DEFAULT 0
-                )
-            ''')
-            
-            # Tabela de Histórico de Conversas
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT,
-                    role TEXT,
-                    content TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    metadata TEXT
-                )
-            ''')
-            
-            # Tabela de Licenças (Proteção Antipirataria)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS licenses (
-                    license_key TEXT PRIMARY KEY,
-                    status TEXT,
-                    activated_at DATETIME,
-                    hardware_id TEXT
-                )
-            ''')
-            
-            # Tabela de Configuração de Modelos (Fase 2)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS models_config (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    provider TEXT NOT NULL,
-                    model_name TEXT NOT NULL,
-                    is_active INTEGER DEFAULT 1,
-                    display_name TEXT,
-                    UNIQUE(provider, model_name)
-                )
-            ''')
-            
-            # Tabela de Prompts de Sistema (Fase 2)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS system_prompts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    prompt_type TEXT UNIQUE NOT NULL,
-                    content TEXT NOT NULL,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Inserir prompts padrão se não existirem
-            cursor.execute('''
-                INSERT OR IGNORE INTO system_prompts (prompt_type, content) VALUES 
-                ('ollama', 'Você é o CriativosPro, um assistente local otimizado. Respeite rigorosamente a gramática e pontuação do Português Brasileiro.'),
-                ('lmstudio', 'Você é o CriativosPro, um assistente local otimizado. Use Markdown para destacar títulos e partes importantes.')
-            ''')
-            
-            # Tabela de Perfil do Usuário (Fase 2)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_profile (
-                    id INTEGER PRIMARY KEY CHECK (id = 1),
-                    display_name TEXT,
-                    email TEXT,
-                    gender TEXT,
-                    birthdate TEXT,
-                    custom_instructions TEXT
-                )
-            ''')
-            
-            # Inserir perfil padrão se não existir
-            cursor.execute('''
-                INSERT OR IGNORE INTO user_profile (id, display_name, custom_instructions) 
-                VALUES (1, 'Usuário', '')
-            ''')
-            
-            # Tabela de Métricas (Fase 4 - Dashboard)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT,
-                    provider TEXT,
-                    model TEXT,
-                    input_tokens INTEGER DEFAULT 0,
-                    output_tokens INTEGER DEFAULT 0,
-                    latency REAL,
-                    status TEXT,
-                    cost REAL DEFAULT 0.0,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # --- Índices de Performance ---
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_session ON history(session_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_session ON metrics(session_id)')
+        """Leva o esquema à versão atual (no boot a quente, só lê o user_version)."""
+        apply_migrations(self.pool.connection())
+
+    def _warm_settings_cache(self):
+        """Carrega a tabela settings (pequena) no cache já no boot."""
+        with self.pool.transaction() as conn:
+            rows = conn.execute('SELECT key, value, is_encrypted FROM settings').fetchall()
+        for key, value, is_encrypted in rows:
+            try:
+                self._settings_cache[key] = self._decode_setting(value, is_encrypted)
+            except Exception as e:
+                # Mantém fora do cache; get_setting lerá do disco e reportará o erro
+                self._settings_unreadable.add(key)
+                logger.warning(f"[Database] Falha ao carregar setting '{key}' no cache: {e}")
 
-            conn.commit()
+    def _decode_setting(self, value, is_encrypted):
+        if is_encrypted and value is not None:
+            return self.cipher.decrypt(value.encode()).decode()
+        return value
 
     def set_setting(self, key, value, encrypt=False):
         """Salva uma configuração, opcionalmente criptografando o valor."""
+        plain_value = value
         if encrypt:
             value = self.cipher.encrypt(value.encode()).decode()
             is_encrypted = 1
         else:
             is_encrypted = 0
             
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO settings (key, value, is_encrypted)
                 VALUES (?, ?, ?)
             ''', (key, value, is_encrypted))
-            conn.commit()
+
+        # Write-through: o cache só é atualizado depois do commit
+        self._settings_cache[key] = plain_value
+        self._settings_unreadable.discard(key)
 
     def get_setting(self, key, default=None):
-        """Recupera uma configuração, descriptografando se necessário."""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Recupera uma configuração, descriptografando se necessário (memoizado em memória).
+        Não toca o SQLite (é chamado no event loop), exceto para chaves que falharam no boot.
+        """
+        cached = self._settings_cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            self.settings_cache_stats["hits"] += 1
+            return default if cached is None else cached
+        if key not in self._settings_unreadable:
+            # O cache espelha a tabela: chave fora dele não existe
+            self.settings_cache_stats["hits"] += 1
+            return default
+
+        self.settings_cache_stats["misses"] += 1
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT value, is_encrypted FROM settings WHERE key = ?', (key,))
             row = cursor.fetchone()
-            
-            if row:
-                value, is_encrypted = row
-                if is_encrypted:
-                    return self.cipher.decrypt(value.encode()).decode()
-                return value
-            return default
+
+        # Chaves inexistentes também ficam em cache (None) para não voltar ao disco
+        value = self._decode_setting(*row) if row else None
+        self._settings_cache[key] = value
+        return default if value is None else value
+
+    def get_settings_cache_stats(self):
+        """Retorna os contadores de hit/miss do cache de settings."""
+        stats = dict(self.settings_cache_stats)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / total, 4) if total else 0.0
+        return stats
 
     # === Gerenciamento de Modelos (Fase 2) ===
     
     def sync_models(self, provider, models_list):
         """Sincroniza modelos de um provedor. Adiciona novos, mantém status dos existentes."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             for model_name in models_list:
                 cursor.execute('''
                     INSERT OR IGNORE INTO models_config (provider, model_name, display_name)
                     VALUES (?, ?, ?)
                 ''', (provider, model_name, model_name))
-            conn.commit()
     
     def get_active_models(self, provider=None):
         """Retorna apenas os modelos ativos. Se provider for None, retorna todos."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        with self.pool.rows() as cursor:
             if provider:
                 cursor.execute('''
                     SELECT * FROM models_config 
@@ -195,9 +176,7 @@ class DatabaseManager:
     
     def get_all_models(self, provider=None):
         """Retorna todos os modelos (ativos e inativos)."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        with self.pool.rows() as cursor:
             if provider:
                 cursor.execute('SELECT * FROM models_config WHERE provider = ?', (provider,))
             else:
@@ -206,31 +185,29 @@ class DatabaseManager:
     
     def toggle_model(self, provider, model_name, is_active):
         """Ativa ou desativa um modelo específico."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE models_config 
                 SET is_active = ? 
                 WHERE provider = ? AND model_name = ?
             ''', (1 if is_active else 0, provider, model_name))
-            conn.commit()
     
     def toggle_provider(self, provider, is_active):
         """Ativa ou desativa todos os modelos de um provedor."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE models_config 
                 SET is_active = ? 
                 WHERE provider = ?
             ''', (1 if is_active else 0, provider))
-            conn.commit()
     
     # === Gerenciamento de Prompts (Fase 2) ===
     
     def get_prompt(self, prompt_type):
         """Retorna o prompt de sistema para o tipo especificado."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT content FROM system_prompts WHERE prompt_type = ?', (prompt_type,))
             row = cursor.fetchone()
@@ -238,19 +215,16 @@ class DatabaseManager:
     
     def save_prompt(self, prompt_type, content):
         """Salva ou atualiza um prompt de sistema."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO system_prompts (prompt_type, content, updated_at)
                 VALUES (?, ?, CURRENT_TIMESTAMP)
             ''', (prompt_type, content))
-            conn.commit()
     
     def get_all_prompts(self):
         """Retorna todos os prompts de sistema."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        with self.pool.rows() as cursor:
             cursor.execute('SELECT * FROM system_prompts')
             return {row['prompt_type']: row['content'] for row in cursor.fetchall()}
     
@@ -258,16 +232,14 @@ class DatabaseManager:
     
     def get_user_profile(self):
         """Retorna o perfil do usuário."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        with self.pool.rows() as cursor:
             cursor.execute('SELECT * FROM user_profile WHERE id = 1')
             row = cursor.fetchone()
             return dict(row) if row else {}
     
     def save_user_profile(self, profile_data):
         """Salva ou atualiza o perfil do usuário."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO user_profile (id, display_name, email, gender, birthdate, custom_instructions)
@@ -279,43 +251,211 @@ class DatabaseManager:
                 profile_data.get('birthdate', ''),
                 profile_data.get('custom_instructions', '')
             ))
-            conn.commit()
 
     # === Fase 4: Telemetria e Dashboard ===
 
+    @staticmethod
+    def metric_row(session_id, provider, model, metrics_data):
+        """Monta a tupla de uma métrica na ordem das colunas da tabela metrics."""
+        return (
+            session_id,
+            provider,
+            model,
+            metrics_data.get('input_tokens', 0),
+            metrics_data.get('output_tokens', 0),
+            metrics_data.get('latency', 0.0),
+            metrics_data.get('status', 'unknown'),
+            metrics_data.get('cost', 0.0),
+            metrics_data.get('cache')  # hit, semantic, miss, bypass (None: sem cache)
+        )
+
+    def insert_metrics(self, cursor, rows):
+        """Grava métricas brutas e atualiza os rollups na transação do chamador."""
+        cursor.executemany('''
+            INSERT INTO metrics (session_id, provider, model, input_tokens, output_tokens, latency, status, cost, cache)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+        # Pré-agrega o lote por provedor/modelo: um upsert por grupo e por rollup
+        groups = {}
+        for _, provider, model, input_tokens, output_tokens, latency, status, cost, cache in rows:
+            group = groups.setdefault((provider or '', model or ''), [0, 0, 0, 0, 0.0, 0.0, 0, 0])
+            for index, value in enumerate(self._rollup_values(input_tokens, output_tokens, latency, status, cost, cache)):
+                group[index] += value
+
+        params = [(provider, model, *values) for (provider, model), values in groups.items()]
+        for table, bucket_format in METRIC_ROLLUPS:
+            cursor.executemany(
+                ROLLUP_UPSERT.format(table=table, bucket=f"strftime('{bucket_format}', 'now')"), params
+            )
+
+    @staticmethod
+    def _rollup_values(input_tokens, output_tokens, latency, status, cost, cache):
+        """
+        Contribuição de uma métrica para o rollup (requests, errors, input_tokens, output_tokens,
+        latency_sum, cost, cache_hits, cache_misses). A reprodução de uma resposta em cache não é
+        um pedido ao modelo: conta só como acerto, fora de requests e da latência média.
+        """
+        if cache in CACHE_HITS:
+            return 0, 0, 0, 0, 0.0, 0.0, 1, 0
+        return (1, 0 if status == 'success' else 1, input_tokens or 0, output_tokens or 0,
+                latency or 0.0, cost or 0.0, 0, int(cache in CACHE_MISSES))
+
+    def import_metrics(self, cursor, rows):
+        """
+        Grava métricas importadas preservando o timestamp original (`metric_row` + timestamp);
+        cada linha soma no bucket do rollup correspondente à sua data.
+        """
+        cursor.executemany('''
+            INSERT INTO metrics (session_id, provider, model, input_tokens, output_tokens, latency, status, cost, cache, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+        params = [
+            (timestamp, provider or '', model or '',
+             *self._rollup_values(input_tokens, output_tokens, latency, status, cost, cache))
+            for _, provider, model, input_tokens, output_tokens, latency, status, cost, cache, timestamp in rows
+        ]
+        for table, bucket_format in METRIC_ROLLUPS:
+            cursor.executemany(ROLLUP_UPSERT.format(table=table, bucket=f"strftime('{bucket_format}', ?)"), params)
+
+    def iter_export_metrics(self, cursor, batch=TRANSFER_BATCH_ROWS):
+        """Gera as métricas brutas (dicts) lidas em lotes pelo cursor do chamador."""
+        cursor.execute('''
+            SELECT session_id, provider, model, input_tokens, output_tokens, latency, status, cost, cache, timestamp
+            FROM metrics ORDER BY id
+        ''')
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def merge_latency_sketches(self, cursor, sketches):
+        """Mescla sketches de latência `{(provider, model, métrica): QuantileSketch}` no bucket do dia."""
+        bucket = time.strftime('%Y-%m-%d', time.gmtime())
+        for (provider, model, metric), sketch in sketches.items():
+            key = (bucket, provider or '', model or '', metric)
+            cursor.execute('''
+                SELECT sketch FROM metrics_sketches
+                WHERE bucket = ? AND provider = ? AND model = ? AND metric = ?
+            ''', key)
+            row = cursor.fetchone()
+            merged = QuantileSketch.from_json(row[0]).merge(sketch) if row else sketch
+            cursor.execute('''
+                INSERT OR REPLACE INTO metrics_sketches (bucket, provider, model, metric, sketch)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (*key, merged.to_json()))
+
+    def get_latency_percentiles(self):
+        """p50/p90/p99 de ttft, duração e intervalo entre tokens (geral e por modelo), a partir dos sketches."""
+        overall = {}
+        by_model = {}
+        with self.pool.transaction() as conn:
+            rows = conn.execute('SELECT provider, model, metric, sketch FROM metrics_sketches').fetchall()
+        for provider, model, metric, raw in rows:
+            sketch = QuantileSketch.from_json(raw)
+            model_sketches = by_model.setdefault((provider, model), {})
+            if metric in model_sketches:
+                model_sketches[metric].merge(sketch)
+            else:
+                model_sketches[metric] = sketch
+            overall.setdefault(metric, QuantileSketch(sketch.relative_accuracy)).merge(sketch)
+
+        return {
+            "overall": {metric: sketch.summary() for metric, sketch in overall.items()},
+            "models": [
+                {"provider": provider, "model": model, **{metric: sketch.summary() for metric, sketch in sketches.items()}}
+                for (provider, model), sketches in by_model.items()
+            ]
+        }
+
     def save_metric(self, session_id, provider, model, metrics_data):
         """Salva métricas de uma geração de IA."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO metrics (session_id, provider, model, input_tokens, output_tokens, latency, status, cost)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                session_id,
-                provider,
-                model,
-                metrics_data.get('input_tokens', 0),
-                metrics_data.get('output_tokens', 0),
-                metrics_data.get('latency', 0.0),
-                metrics_data.get('status', 'unknown'),
-                metrics_data.get('cost', 0.0)
-            ))
-            conn.commit()
+        with self.pool.transaction() as conn:
+            self.insert_metrics(conn.cursor(), [self.metric_row(session_id, provider, model, metrics_data)])
+
+    def prune_metrics(self, raw_days=METRICS_RAW_RETENTION_DAYS, hourly_days=METRICS_HOURLY_RETENTION_DAYS):
+        """
+        Política de retenção: métricas brutas e rollups horários antigos são apagados
+        (já estão agregados no rollup diário, mantido para sempre).
+        A poda é feita em lotes curtos para não segurar o lock de escrita.
+        """
+        removed = {"raw": 0, "hourly": 0}
+        while True:
+            with self.pool.transaction() as conn:
+                deleted = conn.execute('''
+                    DELETE FROM metrics WHERE id IN (
+                        SELECT id FROM metrics WHERE timestamp < datetime('now', ?) LIMIT ?
+                    )
+                ''', (f'-{raw_days} days', METRICS_PRUNE_BATCH)).rowcount
+            removed["raw"] += deleted
+            if deleted < METRICS_PRUNE_BATCH:
+                break
+
+        with self.pool.transaction() as conn:
+            removed["hourly"] = conn.execute('''
+                DELETE FROM metrics_hourly WHERE bucket < strftime('%Y-%m-%d %H:00:00', 'now', ?)
+            ''', (f'-{hourly_days} days',)).rowcount
+        return removed
             
+    def incremental_vacuum(self, pages=VACUUM_STEP_PAGES):
+        """
+        Devolve ao sistema até `pages` páginas livres do arquivo (passo curto, não
+        bloqueia escritores por muito tempo). Retorna quantas páginas livres restam.
+        Bancos ainda sem auto_vacuum incremental são ignorados (ver `convert_to_incremental_vacuum`).
+        """
+        conn = self.pool.connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        # executescript roda o PRAGMA até o fim; via execute() o sqlite3 dá um único passo (1 página)
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def convert_to_incremental_vacuum(self):
+        """
+        Converte um banco criado antes do modo incremental (VACUUM completo, reescreve o arquivo).
+        Só roda a pedido do usuário: bloqueia as escritas durante toda a reescrita.
+        """
+        conn = self.pool.connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return self.get_storage_stats()
+        before = self.get_storage_stats()["db_bytes"]
+        logger.info("[Database] Convertendo para auto_vacuum incremental (VACUUM completo)...")
+        start = time.perf_counter()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        stats = self.get_storage_stats()
+        logger.info(f"[Database] Conversão concluída em {time.perf_counter() - start:.1f}s "
+                    f"({before / 1e6:.1f} MB -> {stats['db_bytes'] / 1e6:.1f} MB)")
+        return stats
+
+    def get_storage_stats(self):
+        """Tamanho do arquivo do banco e espaço livre ainda não devolvido ao disco."""
+        conn = self.pool.connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "db_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+            "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+            "incremental_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        }
+
     def get_dashboard_stats(self):
-        """Recupera estatísticas agregadas para o dashboard."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        """Recupera estatísticas agregadas para o dashboard (a partir do rollup diário)."""
+        with self.pool.rows() as cursor:
             
             # Totais Gerais
             cursor.execute('''
                 SELECT 
-                    COUNT(*) as total_requests,
+                    SUM(requests) as total_requests,
                     SUM(input_tokens) + SUM(output_tokens) as total_tokens,
-                    AVG(latency) as avg_latency,
-                    SUM(cost) as total_cost
-                FROM metrics
+                    SUM(latency_sum) / SUM(requests) as avg_latency,
+                    SUM(cost) as total_cost,
+                    SUM(cache_hits) as cache_hits,
+                    SUM(cache_misses) as cache_misses
+                FROM metrics_daily
             ''')
             row = cursor.fetchone()
             # Tratar caso de tabela vazia (retorna None ou valores None)
@@ -323,20 +463,26 @@ class DatabaseManager:
                 "total_requests": row["total_requests"] if row and row["total_requests"] else 0,
                 "total_tokens": row["total_tokens"] if row and row["total_tokens"] else 0,
                 "avg_latency": row["avg_latency"] if row and row["avg_latency"] else 0.0,
-                "total_cost": row["total_cost"] if row and row["total_cost"] else 0.0
+                "total_cost": row["total_cost"] if row and row["total_cost"] else 0.0,
+                "cache_hits": row["cache_hits"] if row and row["cache_hits"] else 0,
+                "cache_misses": row["cache_misses"] if row and row["cache_misses"] else 0
             }
+            lookups = totals["cache_hits"] + totals["cache_misses"]
+            totals["cache_hit_ratio"] = round(totals["cache_hits"] / lookups, 4) if lookups else 0.0
             
             # Estatísticas por Provedor
             cursor.execute('''
-                SELECT provider, COUNT(*) as count, AVG(latency) as latency
-                FROM metrics
+                SELECT provider, SUM(requests) as count, SUM(latency_sum) / SUM(requests) as latency
+                FROM metrics_daily
                 GROUP BY provider
+                HAVING SUM(requests) > 0
             ''')
             providers = [dict(row) for row in cursor.fetchall()]
             
             return {
                 "totals": totals,
-                "providers": providers
+                "providers": providers,
+                "latency_percentiles": self.get_latency_percentiles()
             }
 
 # Instância global para uso no backend
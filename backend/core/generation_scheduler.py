@@ -0,0 +1,291 @@
+"""
+Agendador de Gerações - CriativosPro
+Executa gerações de várias sessões ao mesmo tempo, limitadas por um teto
+global (MAX_CONCURRENT_SESSIONS) e por um teto por provedor.
+
+Pedidos que não cabem nos tetos esperam em uma fila de admissão limitada:
+  - classes de prioridade (interativo > lote > background);
+  - dentro de cada classe, rodízio entre clientes (sid), para um cliente com
+    muitos pedidos não atrasar os demais;
+  - cada pedido tem prazo; os que vencem na fila são descartados com aviso.
+Nenhum pedido é descartado em silêncio: o cliente recebe `queued`,
+`queue_position`, `generation_status` e, se for o caso, um erro.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from core.fsm import fsm, SystemState
+from core.constants import (
+    MAX_CONCURRENT_SESSIONS, PROVIDER_MAX_CONCURRENT, ADMISSION_QUEUE_MAX, ADMISSION_QUEUE_MAX_PER_CLIENT,
+    ADMISSION_DEADLINES, GenerationStatus, GenerationPriority
+)
+from core.logger import root_logger as logger
+
+
+class AdmissionError(Exception):
+    """Pedido recusado pela fila de admissão (sessão ocupada ou fila cheia)."""
+    pass
+
+
+class SessionGeneration:
+    """Pedido de geração de uma sessão (na fila ou em execução)."""
+    __slots__ = ("session_id", "sid", "provider", "priority", "job", "status",
+                 "position", "enqueued_at", "deadline", "task")
+
+    def __init__(self, session_id, sid, provider, priority, job):
+        self.session_id = session_id
+        self.sid = sid
+        self.provider = provider
+        self.priority = priority
+        self.job = job
+        self.status = GenerationStatus.QUEUED
+        self.position = None
+        self.enqueued_at = time.monotonic()
+        self.deadline = None  # TimerHandle que descarta o pedido se ainda estiver na fila
+        self.task = None
+
+
+class GenerationScheduler:
+    """Uma geração por sessão; sessões diferentes rodam em paralelo até os tetos."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_SESSIONS, provider_limits=PROVIDER_MAX_CONCURRENT,
+                 max_queued=ADMISSION_QUEUE_MAX, max_queued_per_client=ADMISSION_QUEUE_MAX_PER_CLIENT,
+                 deadlines=ADMISSION_DEADLINES):
+        self.max_concurrent = max_concurrent
+        self.provider_limits = provider_limits
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.deadlines = deadlines
+        # prioridade -> OrderedDict(sid -> deque de pedidos); a ordem dos sids é o rodízio
+        self._queues = {priority: OrderedDict() for priority in GenerationPriority.ORDER}
+        self._queued = {}    # session_id -> SessionGeneration na fila
+        self._running = {}   # session_id -> SessionGeneration em execução
+        self._provider_running = {}
+        self._on_event = None
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "expired": 0, "queue_wait_max": 0.0}
+
+    def set_on_event(self, callback):
+        """Registra a coroutine `callback(sid, evento, payload)` usada para avisar o cliente."""
+        self._on_event = callback
+
+    # === Consulta ===
+
+    def is_busy(self, session_id):
+        return session_id in self._running or session_id in self._queued
+
+    def status_of(self, session_id):
+        generation = self._running.get(session_id) or self._queued.get(session_id)
+        return generation.status if generation else GenerationStatus.IDLE
+
+    def sessions_of(self, sid):
+        """Pedidos deste cliente na fila ou em execução ({session_id: status})."""
+        return {
+            generation.session_id: generation.status
+            for generation in (*self._running.values(), *self._queued.values()) if generation.sid == sid
+        }
+
+    # === Admissão ===
+
+    def submit(self, sid, session_id, provider, job, priority=GenerationPriority.INTERACTIVE):
+        """
+        Admite `job()` (coroutine function) para a sessão: executa já se houver vaga,
+        senão entra na fila com prazo de `deadlines[priority]` segundos.
+
+        Returns:
+            Status do pedido (GenerationStatus.GENERATING ou QUEUED)
+
+        Raises:
+            AdmissionError: Se a sessão já tiver um pedido ou a fila estiver cheia
+        """
+        if self.is_busy(session_id):
+            self.stats["rejected"] += 1
+            raise AdmissionError("Esta conversa ainda está gerando uma resposta.")
+
+        generation = SessionGeneration(session_id, sid, provider, priority, job)
+        if not self._queued and self._has_capacity(provider):
+            self._start(generation)
+            return generation.status
+
+        if len(self._queued) >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise AdmissionError("Servidor ocupado: a fila de respostas está cheia. Tente novamente em instantes.")
+        if sum(len(clients.get(sid, ())) for clients in self._queues.values()) >= self.max_queued_per_client:
+            self.stats["rejected"] += 1
+            raise AdmissionError("Muitas respostas na fila para este cliente. Aguarde as anteriores.")
+
+        loop = asyncio.get_running_loop()
+        generation.deadline = loop.call_later(self.deadlines[priority], self._expire, generation)
+        self._queues[priority].setdefault(sid, deque()).append(generation)
+        self._queued[session_id] = generation
+        self.stats["queued"] += 1
+        self._emit(sid, "generation_status", {"session_id": session_id, "status": generation.status})
+        # Pode haver vaga para o novo pedido mesmo com fila (outro provedor livre)
+        self._dispatch()
+        if generation.status == GenerationStatus.QUEUED:
+            self._publish_positions(new=generation)
+        self._refresh_fsm()
+        return generation.status
+
+    def _has_capacity(self, provider):
+        return (
+            len(self._running) < self.max_concurrent
+            and self._provider_running.get(provider, 0) < self.provider_limits.get(provider, 1)
+        )
+
+    def _dispatch(self):
+        """
+        Inicia os pedidos da fila enquanto houver vaga: classes em ordem de prioridade e,
+        em cada classe, rodízio entre clientes. Um pedido cujo provedor está lotado não
+        bloqueia os de outros provedores (nem os de classes menores).
+        """
+        started = False
+        while len(self._running) < self.max_concurrent:
+            generation = self._next_eligible()
+            if generation is None:
+                break
+            self._dequeue(generation)
+            self._start(generation)
+            started = True
+        if started:
+            self._publish_positions()
+
+    def _next_eligible(self):
+        for priority in GenerationPriority.ORDER:
+            clients = self._queues[priority]
+            for sid, client_queue in clients.items():
+                # Primeiro pedido do cliente com provedor livre (sessões são independentes)
+                for generation in client_queue:
+                    if self._has_capacity(generation.provider):
+                        clients.move_to_end(sid)  # vai para o fim do rodízio
+                        return generation
+        return None
+
+    def _dequeue(self, generation):
+        clients = self._queues[generation.priority]
+        client_queue = clients[generation.sid]
+        client_queue.remove(generation)
+        if not client_queue:
+            del clients[generation.sid]
+        del self._queued[generation.session_id]
+        if generation.deadline is not None:
+            generation.deadline.cancel()
+        waited = time.monotonic() - generation.enqueued_at
+        self.stats["queue_wait_max"] = max(self.stats["queue_wait_max"], round(waited, 3))
+
+    def _start(self, generation):
+        generation.status = GenerationStatus.GENERATING
+        generation.position = None
+        self._running[generation.session_id] = generation
+        self._provider_running[generation.provider] = self._provider_running.get(generation.provider, 0) + 1
+        self.stats["admitted"] += 1
+        generation.task = asyncio.create_task(generation.job())
+        # Limpeza no callback: uma task cancelada antes de começar nunca chega a um `finally`
+        generation.task.add_done_callback(lambda _: self._finish(generation))
+        self._refresh_fsm()
+        self._emit(generation.sid, "generation_status", {"session_id": generation.session_id, "status": generation.status})
+
+    def _finish(self, generation):
+        if self._running.get(generation.session_id) is generation:
+            del self._running[generation.session_id]
+            self._provider_running[generation.provider] -= 1
+        generation.status = GenerationStatus.IDLE
+        self._emit(generation.sid, "generation_status", {"session_id": generation.session_id, "status": generation.status})
+        self._dispatch()
+        self._refresh_fsm()
+
+    def _expire(self, generation):
+        """Prazo vencido na fila: descarta o pedido e avisa o cliente."""
+        if self._queued.get(generation.session_id) is not generation:
+            return
+        generation.deadline = None
+        self._dequeue(generation)
+        generation.status = GenerationStatus.IDLE
+        self.stats["expired"] += 1
+        logger.warning(f"[Scheduler] Pedido da sessão {generation.session_id} expirou na fila")
+        self._emit(generation.sid, "error", {
+            "session_id": generation.session_id,
+            "message": "A resposta esperou demais na fila e foi descartada. Envie novamente."
+        })
+        self._emit(generation.sid, "generation_status", {"session_id": generation.session_id, "status": generation.status})
+        self._publish_positions()
+        self._refresh_fsm()
+
+    def _publish_positions(self, new=None):
+        """
+        Recalcula a posição (1 = próximo) de cada pedido na ordem em que seria
+        despachado e avisa só os clientes cuja posição mudou.
+        """
+        position = 0
+        for priority in GenerationPriority.ORDER:
+            client_queues = list(self._queues[priority].values())
+            depth = max((len(client_queue) for client_queue in client_queues), default=0)
+            for index in range(depth):
+                for client_queue in client_queues:
+                    if index >= len(client_queue):
+                        continue
+                    position += 1
+                    generation = client_queue[index]
+                    if generation is new:
+                        generation.position = position
+                        self._emit(generation.sid, "queued", {
+                            "session_id": generation.session_id, "position": position,
+                            "priority": GenerationPriority.NAMES[priority]
+                        })
+                    elif generation.position != position:
+                        generation.position = position
+                        self._emit(generation.sid, "queue_position", {
+                            "session_id": generation.session_id, "position": position
+                        })
+
+    # === Cancelamento ===
+
+    def cancel(self, sid, session_id=None):
+        """
+        Cancela o pedido de `session_id` (apenas se feito por `sid`), esteja na fila ou
+        em execução; sem session_id, cancela todos os do cliente. Retorna as sessões canceladas.
+        """
+        cancelled = []
+        for generation in list(self._queued.values()):
+            if generation.sid == sid and session_id in (None, generation.session_id):
+                self._dequeue(generation)
+                generation.status = GenerationStatus.IDLE
+                self._emit(sid, "generation_status", {"session_id": generation.session_id, "status": generation.status})
+                cancelled.append(generation.session_id)
+        if cancelled:
+            self._publish_positions()
+            self._refresh_fsm()
+
+        for generation in list(self._running.values()):
+            if generation.sid == sid and session_id in (None, generation.session_id) and not generation.task.done():
+                generation.task.cancel()
+                cancelled.append(generation.session_id)
+        return cancelled
+
+    async def close(self):
+        """Descarta a fila e cancela as gerações em execução (shutdown)."""
+        for generation in list(self._queued.values()):
+            self._dequeue(generation)
+        tasks = [g.task for g in self._running.values() if not g.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # === Notificações ===
+
+    def _emit(self, sid, event, payload):
+        # Pedidos internos (background) não têm cliente para avisar
+        if self._on_event is None or sid is None:
+            return
+        asyncio.ensure_future(self._notify(sid, event, payload))
+
+    async def _notify(self, sid, event, payload):
+        try:
+            await self._on_event(sid, event, payload)
+        except Exception as e:
+            logger.error(f"[Scheduler] Falha ao enviar '{event}' para {sid}: {e}")
+
+    def _refresh_fsm(self):
+        fsm.change_to(SystemState.PROCESSING if self._running or self._queued else SystemState.IDLE)
+
+# Instância global
+generation_scheduler = GenerationScheduler()
@@ -0,0 +1,245 @@
+"""
+Arquivo Frio do Histórico - CriativosPro
+Sessões sem atividade há mais de `archive_after_days` saem da tabela `history`
+e passam a ocupar um único blob zlib (com dicionário treinado) em
+`history_archive`. A leitura descomprime de forma transparente e uma sessão
+arquivada volta para a tabela quente assim que é reaberta. Os termos das
+mensagens arquivadas continuam no índice FTS5, então a busca as encontra.
+"""
+import json
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from core.database import db
+from core.constants import (
+    ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SESSIONS, ARCHIVE_COMPRESSION_LEVEL,
+    ARCHIVE_DICT_SIZE, ARCHIVE_DICT_SAMPLE_MESSAGES, ARCHIVE_DICT_MIN_MESSAGES
+)
+
+# Colunas de `history` guardadas no blob, nesta ordem
+ARCHIVE_COLUMNS = "id, role, content, timestamp, metadata"
+
+
+def train_dictionary(samples, size=ARCHIVE_DICT_SIZE):
+    """
+    Monta um dicionário zlib (preset dictionary do deflate) a partir de mensagens
+    de exemplo. Palavras e pares de palavras recorrentes são ordenados pelo ganho
+    estimado (frequência x tamanho) e os melhores ficam no fim, onde o deflate
+    os alcança com as menores distâncias.
+    """
+    counts = Counter()
+    for text in samples:
+        words = text.split()
+        counts.update(words)
+        counts.update(" ".join(pair) for pair in zip(words, words[1:]))
+
+    picked, used = [], 0
+    for fragment, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 2:
+            break
+        encoded = fragment.encode("utf-8")
+        if used + len(encoded) + 1 > size:
+            continue
+        picked.append(encoded)
+        used += len(encoded) + 1
+    return b" ".join(reversed(picked))
+
+
+class HistoryArchive:
+    """Move sessões ociosas para o arquivo comprimido e as lê/restaura sob demanda."""
+
+    def __init__(self):
+        self._dictionaries = {}  # id -> bytes (imutáveis depois de gravados)
+        self._lock = threading.Lock()
+        self.stats = {"archived_sessions": 0, "restored_sessions": 0, "bytes_in": 0, "bytes_out": 0}
+
+    # === Dicionário ===
+
+    def _dictionary(self, cursor, dict_id):
+        if dict_id is None:
+            return None
+        with self._lock:
+            dictionary = self._dictionaries.get(dict_id)
+        if dictionary is None:
+            cursor.execute('SELECT dictionary FROM archive_dictionaries WHERE id = ?', (dict_id,))
+            dictionary = cursor.fetchone()[0]
+            with self._lock:
+                self._dictionaries[dict_id] = dictionary
+        return dictionary
+
+    def _current_dictionary(self, cursor):
+        """Retorna (id, bytes) do dicionário mais recente, treinando um na primeira execução."""
+        cursor.execute('SELECT id FROM archive_dictionaries ORDER BY id DESC LIMIT 1')
+        row = cursor.fetchone()
+        if row:
+            return row[0], self._dictionary(cursor, row[0])
+
+        cursor.execute(f'''
+            SELECT json_array({ARCHIVE_COLUMNS}) FROM history ORDER BY id DESC LIMIT ?
+        ''', (ARCHIVE_DICT_SAMPLE_MESSAGES,))
+        samples = [row[0] for row in cursor.fetchall()]
+        if len(samples) < ARCHIVE_DICT_MIN_MESSAGES:
+            return None, None
+        dictionary = train_dictionary(samples)
+        if not dictionary:
+            return None, None
+        cursor.execute('INSERT INTO archive_dictionaries (dictionary) VALUES (?)', (dictionary,))
+        print(f"[Archive] Dicionário de compressão treinado ({len(dictionary)} bytes)")
+        return cursor.lastrowid, dictionary
+
+    # === Codificação ===
+
+    def _encode(self, rows, dictionary):
+        payload = json.dumps([list(row) for row in rows], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if dictionary:
+            compressor = zlib.compressobj(ARCHIVE_COMPRESSION_LEVEL, zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(ARCHIVE_COMPRESSION_LEVEL)
+        blob = compressor.compress(payload) + compressor.flush()
+        self.stats["bytes_in"] += len(payload)
+        self.stats["bytes_out"] += len(blob)
+        return blob
+
+    def _decode(self, cursor, dict_id, blob):
+        dictionary = self._dictionary(cursor, dict_id)
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return json.loads(decompressor.decompress(blob) + decompressor.flush())
+
+    # === Arquivamento ===
+
+    def archive_idle_sessions(self, max_age_days=None, batch=ARCHIVE_BATCH_SESSIONS):
+        """
+        Arquiva as sessões sem atividade (mensagem nova ou reabertura) há mais de `max_age_days`.
+        Cada lote de sessões roda em uma transação curta.
+
+        Returns:
+            dict com sessões e mensagens arquivadas
+        """
+        days = max_age_days or int(db.get_setting("archive_after_days") or ARCHIVE_AFTER_DAYS)
+        with db.pool.rows() as cursor:
+            # Ociosidade pela linha da sessão (última mensagem ou última reabertura), sem
+            # agregar o histórico; `restored_at` impede que uma sessão reaberta volte ao
+            # arquivo no ciclo seguinte só porque as mensagens dela são antigas
+            cursor.execute('''
+                SELECT s.id FROM sessions s
+                WHERE MAX(IFNULL(s.last_activity, s.created_at), IFNULL(s.restored_at, '')) < datetime('now', ?)
+                  AND EXISTS (SELECT 1 FROM history h WHERE h.session_id = s.id)
+            ''', (f'-{days} days',))
+            candidates = [row[0] for row in cursor.fetchall()]
+
+        archived = {"sessions": 0, "messages": 0}
+        for start in range(0, len(candidates), batch):
+            with db.pool.transaction() as conn:
+                cursor = conn.cursor()
+                dict_id, dictionary = self._current_dictionary(cursor)
+                for session_id in candidates[start:start + batch]:
+                    archived["messages"] += self._archive_session(cursor, session_id, dict_id, dictionary)
+                    archived["sessions"] += 1
+
+        self.stats["archived_sessions"] += archived["sessions"]
+        return archived
+
+    def _archive_session(self, cursor, session_id, dict_id, dictionary):
+        cursor.execute(f'''
+            SELECT {ARCHIVE_COLUMNS} FROM history WHERE session_id = ? ORDER BY id
+        ''', (session_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+
+        # Sessão já arquivada que recebeu mensagens e voltou a ficar ociosa: junta os blocos
+        cursor.execute('SELECT dict_id, payload FROM history_archive WHERE session_id = ?', (session_id,))
+        previous = cursor.fetchone()
+        if previous:
+            rows = self._decode(cursor, previous[0], previous[1]) + rows
+
+        cursor.execute('''
+            INSERT OR REPLACE INTO history_archive (session_id, dict_id, message_count, payload)
+            VALUES (?, ?, ?, ?)
+        ''', (session_id, dict_id, len(rows), self._encode(rows, dictionary)))
+        cursor.executemany('INSERT OR IGNORE INTO history_archive_ids (id, session_id) VALUES (?, ?)',
+                           ((row[0], session_id) for row in rows))
+        # Os termos continuam no FTS5: a busca segue achando a sessão arquivada
+        with self._fts_hold(cursor, session_id):
+            cursor.execute('DELETE FROM history WHERE session_id = ?', (session_id,))
+        return len(rows)
+
+    @contextmanager
+    def _fts_hold(self, cursor, session_id):
+        """Suspende os triggers do FTS5 para a sessão enquanto as linhas saem/voltam de `history`."""
+        cursor.execute('INSERT OR IGNORE INTO history_fts_hold (session_id) VALUES (?)', (session_id,))
+        try:
+            yield
+        finally:
+            cursor.execute('DELETE FROM history_fts_hold WHERE session_id = ?', (session_id,))
+
+    # === Leitura ===
+
+    def load_messages(self, cursor, session_id):
+        """Linhas (id, role, content, timestamp, metadata) arquivadas da sessão, ou lista vazia."""
+        cursor.execute('SELECT dict_id, payload FROM history_archive WHERE session_id = ?', (session_id,))
+        row = cursor.fetchone()
+        return self._decode(cursor, row[0], row[1]) if row else []
+
+    def restore_session(self, session_id):
+        """
+        Devolve uma sessão arquivada para a tabela quente (com os ids originais),
+        para que paginação, contexto e busca voltem a enxergá-la.
+        Retorna o número de mensagens restauradas (0 se não estava arquivada).
+        """
+        conn = db.pool.connection()
+        if conn.execute('SELECT 1 FROM history_archive WHERE session_id = ?', (session_id,)).fetchone() is None:
+            return 0
+
+        with db.pool.transaction() as conn:
+            cursor = conn.cursor()
+            rows = self.load_messages(cursor, session_id)
+            # Os termos nunca saíram do FTS5; reinseri-los duplicaria o índice
+            with self._fts_hold(cursor, session_id):
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO history (id, session_id, role, content, timestamp, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', ((row[0], session_id, *row[1:]) for row in rows))
+            cursor.execute('DELETE FROM history_archive_ids WHERE session_id = ?', (session_id,))
+            cursor.execute('DELETE FROM history_archive WHERE session_id = ?', (session_id,))
+            cursor.execute('UPDATE sessions SET restored_at = CURRENT_TIMESTAMP WHERE id = ?', (session_id,))
+        self.stats["restored_sessions"] += 1
+        print(f"[Archive] Sessão {session_id} restaurada ({len(rows)} mensagens)")
+        return len(rows)
+
+    def iter_messages(self, cursor):
+        """
+        Gera as mensagens arquivadas como dicts (session_id, role, content, timestamp, metadata),
+        descomprimindo um blob por vez para a memória não crescer com o tamanho do arquivo.
+        """
+        blobs = cursor.connection.cursor()
+        try:
+            # O cursor do sqlite3 busca uma linha por vez: só um blob fica em memória
+            blobs.execute('SELECT session_id, dict_id, payload FROM history_archive ORDER BY session_id')
+            for session_id, dict_id, payload in blobs:
+                for _, role, content, timestamp, metadata in self._decode(cursor, dict_id, payload):
+                    yield {
+                        "session_id": session_id, "role": role, "content": content,
+                        "timestamp": timestamp, "metadata": metadata
+                    }
+        finally:
+            blobs.close()
+
+    def delete_session(self, cursor, session_id):
+        rows = self.load_messages(cursor, session_id)
+        if rows:
+            # External content: o FTS5 só remove os termos recebendo o conteúdo original
+            try:
+                cursor.executemany(
+                    "INSERT INTO history_fts(history_fts, rowid, content) VALUES ('delete', ?, ?)",
+                    ((row[0], row[2]) for row in rows)
+                )
+            except sqlite3.OperationalError:
+                pass  # SQLite sem FTS5: não há índice para limpar
+        cursor.execute('DELETE FROM history_archive_ids WHERE session_id = ?', (session_id,))
+        cursor.execute('DELETE FROM history_archive WHERE session_id = ?', (session_id,))
+
+# Instância global
+history_archive = HistoryArchive()
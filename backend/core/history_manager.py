@@ -1,146 +1,194 @@
 import json
-import json
+import re
 import sqlite3
-import asyncio
+import threading
+from collections import OrderedDict, deque
 from core.database import db
+from core.write_behind import write_behind
+from core.history_archive import history_archive
+from core.constants import (
+    CONTEXT_CACHE_MAX_BYTES, CONTEXT_MAX_MESSAGES, HISTORY_PAGE_SIZE, SESSIONS_PAGE_SIZE, SEARCH_RESULTS_LIMIT,
+    TRANSFER_BATCH_ROWS
+)
 import uuid
 from datetime import datetime
 
+class ContextMessage:
+    """Mensagem compacta mantida no ring buffer de contexto."""
+    __slots__ = ("role", "content")
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+
+    def as_dict(self):
+        return {"role": self.role, "content": self.content}
+
+class SessionContext:
+    """
+    Ring buffer com as últimas `context_limit` mensagens de uma sessão, o total de
+    mensagens da sessão e o resumo das mais antigas (que cobre as `covered` primeiras).
+    """
+    __slots__ = ("messages", "size", "total", "summary", "covered")
+
+    def __init__(self, limit, messages=(), total=0, summary=None, covered=0):
+        self.messages = deque(maxlen=limit)
+        self.size = 0
+        self.total = total - len(messages)
+        self.summary = summary
+        self.covered = covered
+        for message in messages:
+            self.append(message)
+
+    def append(self, message):
+        if len(self.messages) == self.messages.maxlen:
+            self.size -= len(self.messages[0].content)
+        self.messages.append(message)
+        self.size += len(message.content)
+        self.total += 1
+
 class HistoryManager:
     """Gerencia o armazenamento e recuperação do histórico de conversas."""
     
+    # Termos da busca: "frase entre aspas" ou palavra (com * opcional para prefixo)
+    SEARCH_TERM_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
     # Lista negra de saudações que não devem iniciar uma sessão persistente
     IGNORED_GREETINGS = [
         "oi", "ola", "olá", "bom dia", "boa tarde", "boa noite", 
         "teste", "hello", "hi", "hey", "testando"
     ]
 
-    def __init__(self, context_limit=10):
+    def __init__(self, context_limit=CONTEXT_MAX_MESSAGES, context_cache_bytes=CONTEXT_CACHE_MAX_BYTES):
         self.context_limit = context_limit
-        self._ensure_sessions_table()
+        # Cache LRU de contexto por sessão (session_id -> SessionContext)
+        self._context_cache = OrderedDict()
+        self._context_cache_size = 0
+        self._context_cache_bytes = context_cache_bytes
+        self._cache_lock = threading.Lock()
+        write_behind.set_session_handler(self._check_smart_persistence)
 
-    def _ensure_sessions_table(self):
-        """Garante que a tabela de sessões existe e atualiza esquema se necessário."""
-        try:
-            with sqlite3.connect(db.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS sessions (
-                        id TEXT PRIMARY KEY,
-                        title TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_persistent BOOLEAN DEFAULT 0
-                    )
-                ''')
-                
-                # Migração: Garante que a coluna existe em bancos antigos
-                try:
-                    cursor.execute("ALTER TABLE sessions ADD COLUMN is_persistent BOOLEAN DEFAULT 0")
-                except sqlite3.OperationalError:
-                    pass  # Coluna já existe
-                
-                conn.commit()
-        except Exception as e:
-            print(f"[History] Erro ao inicializar tabela sessions: {e}")
+    SESSION_LIST_FIELDS = "id, title, created_at, last_activity, message_count, total_tokens, last_model"
+    SESSION_EXPORT_FIELDS = f"{SESSION_LIST_FIELDS}, is_persistent"
 
     async def is_session_persistent(self, session_id):
-        return await asyncio.to_thread(self._is_session_persistent_sync, session_id)
+        # Read-your-writes: a regra de persistência só roda quando a mensagem é gravada
+        if write_behind.has_pending(session_id):
+            await write_behind.flush()
+        return await db.run(self._is_session_persistent_sync, session_id)
 
     def _is_session_persistent_sync(self, session_id):
         """Verifica se a sessão está marcada como persistente."""
-        with sqlite3.connect(db.db_path) as conn:
+        with db.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT is_persistent FROM sessions WHERE id = ?', (session_id,))
             row = cursor.fetchone()
             return bool(row[0]) if row else False
 
     async def add_message(self, session_id, role, content, metadata=None):
-        await asyncio.to_thread(self._add_message_sync, session_id, role, content, metadata)
-
-    def _add_message_sync(self, session_id, role, content, metadata=None):
-        """Salva uma nova mensagem no banco de dados e verifica persistência."""
-        
-        # 1. Salvar na tabela de histórico (mensagens)
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO history (session_id, role, content, metadata)
-                VALUES (?, ?, ?, ?)
-            ''', (session_id, role, content, json.dumps(metadata) if metadata else None))
-            conn.commit()
-
-        # 2. Verificar regra de Histórico Inteligente (Smart History)
-        self._check_smart_persistence(session_id, content)
+        """
+        Enfileira a mensagem na fila write-behind. O insert no histórico e a
+        regra de Histórico Inteligente rodam juntos no próximo flush em lote.
+        """
+        with self._cache_lock:
+            write_behind.add_message(session_id, role, content, metadata)
+            # Atualiza o contexto em memória apenas se a sessão já estiver carregada
+            buffer = self._context_cache.get(session_id)
+            if buffer is not None:
+                self._context_cache_size -= buffer.size
+                buffer.append(ContextMessage(role, content))
+                self._context_cache_size += buffer.size
+                self._context_cache.move_to_end(session_id)
+                self._evict_context_cache()
 
-    def _check_smart_persistence(self, session_id, content):
+    def _check_smart_persistence(self, cursor, session_id, role, content, metadata):
         """
         Aplica regras para decidir se a sessão deve aparecer na lista de recentes.
         Regra: Conteúdo > 250 caracteres E não ser saudação.
+        Executado dentro da transação de flush da fila write-behind, logo após o insert da mensagem.
+
+        Returns:
+            "added" se a sessão foi criada, "updated" se o resumo de uma sessão salva mudou, ou None
         """
-        # Se for muito curto, ignora (exceto se a sessão JÁ estiver salva)
-        if len(content) < 10 and self._is_session_saved(session_id):
-            return
+        # Sessão já salva: só atualiza o resumo (contagem, tokens, modelo, atividade)
+        if self._touch_session(cursor, session_id, metadata):
+            return "updated"
 
         # Limpeza básica
         clean_content = content.lower().strip()
         
         # Regra 1: Ignorar se for apenas saudação
         if clean_content in self.IGNORED_GREETINGS:
-            return
+            return None
 
         # Regra 2: Comprimento > 250 caracteres (ou regra acumulativa futura)
         # O usuário pediu "mais de 250 caracteres".
         # Vamos ser um pouco flexíveis: Se a mensagem for longa ONDE importa (resposta do bot ou prompt complexo)
-        is_relevant_length = len(content) > 250
-
-        # Se a sessão JÁ existe, atualizamos timestamp. Se não, criamos SÓ se for relevante.
-        if self._is_session_saved(session_id):
-            self._touch_session(session_id)
-        elif is_relevant_length:
+        if len(content) > 250:
             # Sessão nova qualificada -> Salvar!
             title = self._generate_simple_title(content)
-            self._create_session(session_id, title)
+            self._create_session(cursor, session_id, title)
+            return "added"
+        return None
 
-    def _is_session_saved(self, session_id):
-        """Verifica se a sessão já está na tabela sessions."""
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT 1 FROM sessions WHERE id = ?', (session_id,))
-            return cursor.fetchone() is not None
-
-    def _create_session(self, session_id, title):
-        """Cria uma nova entrada na tabela sessions."""
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO sessions (id, title, created_at, is_persistent)
-                VALUES (?, ?, CURRENT_TIMESTAMP, 1)
-            ''', (session_id, title))
-            conn.commit()
-            print(f"[History] Sessão {session_id} persistida: '{title}'")
+    def _create_session(self, cursor, session_id, title):
+        """
+        Cria a entrada na tabela sessions com o resumo calculado a partir do histórico já gravado.
+        Se a sessão existir, só o título muda (o resumo é preservado).
+        """
+        cursor.execute('''
+            INSERT INTO sessions (id, title, created_at, is_persistent,
+                                  message_count, total_tokens, last_model, last_activity)
+            SELECT :id, :title, CURRENT_TIMESTAMP, 1,
+                   COUNT(*),
+                   IFNULL(SUM(CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.tokens') END), 0),
+                   (SELECT json_extract(metadata, '$.model') FROM history
+                    WHERE session_id = :id AND json_valid(metadata) AND json_extract(metadata, '$.model') IS NOT NULL
+                    ORDER BY id DESC LIMIT 1),
+                   CURRENT_TIMESTAMP
+            FROM history WHERE session_id = :id
+            ON CONFLICT(id) DO UPDATE SET title = excluded.title, is_persistent = 1
+        ''', {"id": session_id, "title": title})
+        print(f"[History] Sessão {session_id} persistida: '{title}'")
 
     async def set_session_title(self, session_id, title):
-        await asyncio.to_thread(self._set_session_title_sync, session_id, title)
+        await db.run(self._set_session_title_sync, session_id, title)
 
     def _set_session_title_sync(self, session_id, title):
         """Define ou atualiza o título da sessão."""
-        self._create_session(session_id, title)
+        with db.pool.transaction() as conn:
+            self._create_session(conn.cursor(), session_id, title)
 
-    def _touch_session(self, session_id):
-        """Atualiza o timestamp da sessão para ela subir na lista."""
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('UPDATE sessions SET created_at = CURRENT_TIMESTAMP WHERE id = ?', (session_id,))
-            conn.commit()
+    def _touch_session(self, cursor, session_id, metadata):
+        """
+        Atualiza o resumo da sessão e a sobe na lista.
+        Retorna False se a sessão ainda não estiver salva (nenhuma linha afetada).
+        """
+        tokens, model = 0, None
+        if metadata:
+            try:
+                meta = json.loads(metadata)
+                tokens = int(meta.get("tokens") or 0)
+                model = meta.get("model")
+            except (ValueError, TypeError, AttributeError):
+                pass
+        cursor.execute('''
+            UPDATE sessions SET
+                message_count = message_count + 1,
+                total_tokens = total_tokens + ?,
+                last_model = IFNULL(?, last_model),
+                last_activity = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (tokens, model, session_id))
+        return cursor.rowcount > 0
 
     async def get_full_history(self, session_id):
-        return await asyncio.to_thread(self._get_full_history_sync, session_id)
+        return await db.run(self._get_full_history_sync, session_id)
 
     def _get_full_history_sync(self, session_id):
-        """Retorna todas as mensagens da sessão para exibição."""
-        with sqlite3.connect(db.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        """Retorna todas as mensagens da sessão para exibição (inclui as do arquivo comprimido)."""
+        with write_behind.consistent_read(), db.pool.rows() as cursor:
+            archived = history_archive.load_messages(cursor, session_id)
             # Ordenar por id (autoincrement) ou timestamp se existir. O schema original não mostrou timestamp create, assumindo padrão.
             # Se não tiver timestamp na tabela history, ORDER BY rowid.
             # Mas vamos tentar timestamp.
@@ -153,72 +201,357 @@ class HistoryManager:
                  # Fallback se não tiver order by id
                  cursor.execute('SELECT role, content, metadata FROM history WHERE session_id = ?', (session_id,))
             
-            messages = []
-            for row in cursor.fetchall():
-                msg = {
-                    "role": row["role"],
-                    "content": row["content"],
-                    "isUser": row["role"] == "user"
-                }
-                if row["metadata"]:
-                    try:
-                        meta = json.loads(row["metadata"])
-                        # Mapear metadados úteis para o frontend
-                        if isinstance(meta, dict):
-                            if 'timestamp' in meta: msg['timestamp'] = meta['timestamp']
-                            # Recuperar métricas se existirem
-                            msg['metrics'] = {k: v for k, v in meta.items() if k in ['tokens', 'tps', 'duration']}
-                    except: pass
-                messages.append(msg)
+            rows = cursor.fetchall()
+            messages = [self._format_message(role, content, metadata) for _, role, content, _, metadata in archived]
+            messages.extend(self._format_message(row["role"], row["content"], row["metadata"]) for row in rows)
+            # Mensagens ainda na fila write-behind entram no fim (read-your-writes)
+            pending = write_behind.pending_messages(session_id)
+            messages.extend(self._format_message(role, content, metadata) for _, role, content, metadata in pending)
             return messages
 
+    async def get_history_page(self, session_id, before_id=None, limit=HISTORY_PAGE_SIZE):
+        return await db.run(self._get_history_page_sync, session_id, before_id, limit)
+
+    def _get_history_page_sync(self, session_id, before_id=None, limit=HISTORY_PAGE_SIZE):
+        """
+        Retorna uma página do histórico (keyset pelo history.id), da mais nova para a mais antiga.
+        A primeira página (before_id=None) inclui as mensagens ainda pendentes na fila write-behind.
+
+        Returns:
+            dict com `messages` (ordem cronológica), `cursor` (id mais antigo da página) e `has_more`
+        """
+        if before_id is None:
+            # Sessão reaberta deixa de ser fria: volta para a tabela quente
+            history_archive.restore_session(session_id)
+        with write_behind.consistent_read(), db.pool.rows() as cursor:
+            if before_id is None:
+                cursor.execute('''
+                    SELECT id, role, content, metadata FROM history
+                    WHERE session_id = ? ORDER BY id DESC LIMIT ?
+                ''', (session_id, limit + 1))
+            else:
+                cursor.execute('''
+                    SELECT id, role, content, metadata FROM history
+                    WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+                ''', (session_id, before_id, limit + 1))
+            rows = cursor.fetchall()
+
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            messages = [self._format_message(row["role"], row["content"], row["metadata"]) for row in reversed(rows)]
+            if before_id is None:
+                pending = write_behind.pending_messages(session_id)
+                messages.extend(self._format_message(role, content, metadata) for _, role, content, metadata in pending)
+
+            return {
+                "messages": messages,
+                "cursor": rows[-1]["id"] if rows else None,
+                "has_more": has_more
+            }
+
+    def _format_message(self, role, content, metadata):
+        """Converte uma linha do histórico no formato esperado pelo frontend."""
+        msg = {
+            "role": role,
+            "content": content,
+            "isUser": role == "user"
+        }
+        if metadata:
+            try:
+                meta = json.loads(metadata)
+                # Mapear metadados úteis para o frontend
+                if isinstance(meta, dict):
+                    if 'timestamp' in meta: msg['timestamp'] = meta['timestamp']
+                    # Recuperar métricas se existirem
+                    msg['metrics'] = {k: v for k, v in meta.items() if k in ['tokens', 'tps', 'duration', 'ttft']}
+            except: pass
+        return msg
+
     def _generate_simple_title(self, content):
         """Gera um título simples baseado nas primeiras palavras."""
         words = content.split()
         return " ".join(words[:5]) + "..." if len(words) > 5 else content
 
     async def get_context(self, session_id):
-        return await asyncio.to_thread(self._get_context_sync, session_id)
+        """Recupera as últimas mensagens para enviar como contexto à IA (ring buffer em memória)."""
+        return (await self.get_context_window(session_id))[0]
+
+    async def get_context_window(self, session_id):
+        """
+        Recupera a janela de contexto da sessão (ring buffer em memória).
+
+        Returns:
+            (mensagens recentes, total de mensagens da sessão, resumo ou None,
+             quantas das primeiras mensagens o resumo cobre)
+        """
+        with self._cache_lock:
+            buffer = self._context_cache.get(session_id)
+            if buffer is not None:
+                self._context_cache.move_to_end(session_id)
+                return self._window(buffer)
+        return await db.run(self._get_context_sync, session_id)
+
+    @staticmethod
+    def _window(buffer):
+        return [m.as_dict() for m in buffer.messages], buffer.total, buffer.summary, buffer.covered
 
     def _get_context_sync(self, session_id):
-        """Recupera as últimas mensagens para enviar como contexto à IA."""
-        with sqlite3.connect(db.db_path) as conn:
+        """Preenche o ring buffer da sessão a partir do SQLite (primeiro acesso)."""
+        history_archive.restore_session(session_id)
+        with write_behind.consistent_read(), db.pool.transaction() as conn:
             cursor = conn.cursor()
+            # Ordena pelo id (autoincrement): o timestamp tem resolução de 1s
             cursor.execute('''
                 SELECT role, content FROM history
                 WHERE session_id = ?
-                ORDER BY timestamp DESC
+                ORDER BY id DESC
                 LIMIT ?
             ''', (session_id, self.context_limit))
             rows = cursor.fetchall()
-            messages = [{"role": role, "content": content} for role, content in reversed(rows)]
-            return messages
+            cursor.execute('SELECT COUNT(*) FROM history WHERE session_id = ?', (session_id,))
+            total = cursor.fetchone()[0]
+            cursor.execute('SELECT summary, covered FROM context_summaries WHERE session_id = ?', (session_id,))
+            summary, covered = cursor.fetchone() or (None, 0)
+
+            with self._cache_lock:
+                buffer = self._context_cache.get(session_id)
+                if buffer is None:
+                    messages = [ContextMessage(role, content) for role, content in reversed(rows)]
+                    # Inclui as mensagens ainda não gravadas pela fila write-behind
+                    pending = [ContextMessage(role, content) for _, role, content, _ in write_behind.pending_messages(session_id)]
+                    messages.extend(pending)
+                    buffer = SessionContext(self.context_limit, messages, total + len(pending), summary, covered)
+                    self._context_cache[session_id] = buffer
+                    self._context_cache_size += buffer.size
+                    self._evict_context_cache()
+                return self._window(buffer)
+
+    async def get_messages_range(self, session_id, start, end):
+        """Mensagens da sessão da posição `start` até `end` (exclusivo), em ordem cronológica."""
+        if write_behind.has_pending(session_id):
+            await write_behind.flush()
+        return await db.run(self._get_messages_range_sync, session_id, start, end)
+
+    def _get_messages_range_sync(self, session_id, start, end):
+        cursor = db.pool.connection().execute('''
+            SELECT role, content FROM history
+            WHERE session_id = ?
+            ORDER BY id
+            LIMIT ? OFFSET ?
+        ''', (session_id, max(0, end - start), start))
+        return [{"role": role, "content": content} for role, content in cursor.fetchall()]
+
+    async def save_summary(self, session_id, summary, covered):
+        """Grava o resumo das `covered` primeiras mensagens da sessão."""
+        await db.run(self._save_summary_sync, session_id, summary, covered)
+
+    def _save_summary_sync(self, session_id, summary, covered):
+        with db.pool.transaction() as conn:
+            conn.execute('''
+                INSERT INTO context_summaries (session_id, summary, covered, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    summary = excluded.summary, covered = excluded.covered, updated_at = excluded.updated_at
+                WHERE excluded.covered > context_summaries.covered
+            ''', (session_id, summary, covered))
+        with self._cache_lock:
+            buffer = self._context_cache.get(session_id)
+            if buffer is not None and covered > buffer.covered:
+                buffer.summary, buffer.covered = summary, covered
+
+    def _evict_context_cache(self):
+        """Remove as sessões menos usadas até caber no limite de memória (chamar com _cache_lock)."""
+        while self._context_cache_size > self._context_cache_bytes and len(self._context_cache) > 1:
+            _, evicted = self._context_cache.popitem(last=False)
+            self._context_cache_size -= evicted.size
+
+    def _invalidate_context(self, session_id):
+        with self._cache_lock:
+            buffer = self._context_cache.pop(session_id, None)
+            if buffer is not None:
+                self._context_cache_size -= buffer.size
+
+    async def search_history(self, query, limit=SEARCH_RESULTS_LIMIT):
+        # Mensagens ainda na fila também precisam aparecer na busca
+        await write_behind.flush()
+        return await db.run(self._search_history_sync, query, limit)
+
+    def _build_fts_query(self, query):
+        """
+        Converte o texto do usuário em uma expressão FTS5 segura.
+        Frases entre aspas viram phrase queries e `termo*` vira busca por prefixo;
+        o restante é citado para não quebrar a sintaxe do MATCH.
+        """
+        terms = []
+        for phrase, word in self.SEARCH_TERM_PATTERN.findall(query):
+            if phrase:
+                terms.append(f'"{phrase}"')
+                continue
+            is_prefix = word.endswith('*')
+            word = word.rstrip('*').replace('"', '')
+            if word:
+                terms.append(f'"{word}"*' if is_prefix else f'"{word}"')
+        return " ".join(terms)
+
+    def _search_history_sync(self, query, limit=SEARCH_RESULTS_LIMIT):
+        """
+        Busca full-text no histórico, ordenada por relevância (bm25), com trechos destacados.
+        O bm25 ranqueia todas as ocorrências; `ORDER BY rank LIMIT` fica dentro do FTS5, que
+        mantém só os `limit` melhores, e os joins e o snippet() rodam apenas para eles.
+        """
+        fts_query = self._build_fts_query(query)
+        if not fts_query:
+            return []
+
+        with db.pool.rows() as cursor:
+            try:
+                # Mensagens arquivadas continuam no índice, mas não em `history`: a sessão vem de
+                # history_archive_ids e o trecho é montado depois (snippet() exige a linha de conteúdo)
+                cursor.execute('''
+                    SELECT history_fts.rowid AS id, IFNULL(h.session_id, a.session_id) AS session_id,
+                           h.role, s.title,
+                           CASE WHEN h.id IS NOT NULL
+                                THEN snippet(history_fts, 0, '[', ']', '…', 16) END AS snippet,
+                           history_fts.rank AS rank
+                    FROM history_fts
+                    LEFT JOIN history h ON h.id = history_fts.rowid
+                    LEFT JOIN history_archive_ids a ON h.id IS NULL AND a.id = history_fts.rowid
+                    LEFT JOIN sessions s ON s.id = IFNULL(h.session_id, a.session_id)
+                    WHERE history_fts MATCH :query
+                    ORDER BY history_fts.rank
+                    LIMIT :limit
+                ''', {"query": fts_query, "limit": limit})
+            except sqlite3.OperationalError as e:
+                # Tabela FTS ausente (SQLite sem FTS5) ou expressão rejeitada
+                print(f"[History] Erro na busca: {e}")
+                return []
+            results = [dict(row) for row in cursor.fetchall()]
+            self._fill_archived_hits(cursor, results, query)
+            return [hit for hit in results if hit["session_id"] is not None]
+
+    def _fill_archived_hits(self, cursor, results, query):
+        """Completa papel e trecho dos resultados que estão no arquivo comprimido (um blob por sessão)."""
+        terms = [term.lower() for phrase, word in self.SEARCH_TERM_PATTERN.findall(query)
+                 for term in (phrase or word.rstrip('*')).split() if term]
+        archived = {}
+        for hit in results:
+            if hit["snippet"] is not None or hit["session_id"] is None:
+                continue
+            session_id = hit["session_id"]
+            if session_id not in archived:
+                archived[session_id] = {row[0]: row for row in history_archive.load_messages(cursor, session_id)}
+            row = archived[session_id].get(hit["id"])
+            if row is not None:
+                hit["role"], hit["snippet"] = row[1], self._plain_snippet(row[2] or "", terms)
+
+    @staticmethod
+    def _plain_snippet(content, terms, size=16):
+        """Equivalente simplificado do snippet() do FTS5: janela de `size` palavras com os termos entre colchetes."""
+        words = content.split()
+        matches = [i for i, word in enumerate(words)
+                   if any(word.strip('.,;:!?()"\'').lower().startswith(term) for term in terms)]
+        start = max(0, min(matches[0] - size // 4, len(words) - size)) if matches else 0
+        window = [f"[{word}]" if i in matches else word for i, word in enumerate(words[start:start + size], start)]
+        return ("…" if start else "") + " ".join(window) + ("…" if start + size < len(words) else "")
 
     async def clear_session(self, session_id):
-        await asyncio.to_thread(self._clear_session_sync, session_id)
+        await db.run(self._clear_session_sync, session_id)
 
     def _clear_session_sync(self, session_id):
         """Remove o histórico de uma sessão específica."""
-        with sqlite3.connect(db.db_path) as conn:
+        write_behind.drop_session(session_id)
+        self._invalidate_context(session_id)
+        with db.pool.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM history WHERE session_id = ?', (session_id,))
+            cursor.execute('DELETE FROM context_summaries WHERE session_id = ?', (session_id,))
+            history_archive.delete_session(cursor, session_id)
             # Também remove da tabela de sessões
             cursor.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
-            conn.commit()
 
-    async def get_all_sessions(self):
-        return await asyncio.to_thread(self._get_all_sessions_sync)
+    async def get_sessions_page(self, cursor=None, limit=SESSIONS_PAGE_SIZE):
+        return await db.run(self._get_sessions_page_sync, cursor, limit)
 
-    def _get_all_sessions_sync(self):
-        """Retorna a lista de todas as sessões salvas."""
-        with sqlite3.connect(db.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+    def _get_sessions_page_sync(self, cursor=None, limit=SESSIONS_PAGE_SIZE):
+        """
+        Retorna uma página da lista de sessões (keyset por last_activity, id), da mais recente para a mais antiga.
+
+        Args:
+            cursor: [last_activity, id] da última sessão da página anterior, ou None para a primeira
+
+        Returns:
+            dict com `sessions`, `cursor` (para a próxima página) e `has_more`
+        """
+        with db.pool.rows() as rows_cursor:
             try:
-                cursor.execute('SELECT * FROM sessions ORDER BY created_at DESC')
-                return [dict(row) for row in cursor.fetchall()]
+                if cursor is None:
+                    rows_cursor.execute(f'''
+                        SELECT {self.SESSION_LIST_FIELDS} FROM sessions
+                        ORDER BY last_activity DESC, id DESC LIMIT ?
+                    ''', (limit + 1,))
+                else:
+                    rows_cursor.execute(f'''
+                        SELECT {self.SESSION_LIST_FIELDS} FROM sessions
+                        WHERE (last_activity, id) < (?, ?)
+                        ORDER BY last_activity DESC, id DESC LIMIT ?
+                    ''', (cursor[0], cursor[1], limit + 1))
+                rows = rows_cursor.fetchall()
             except sqlite3.OperationalError:
-                return []
+                return {"sessions": [], "cursor": None, "has_more": False}
+
+        has_more = len(rows) > limit
+        sessions = [dict(row) for row in rows[:limit]]
+        last = sessions[-1] if sessions else None
+        return {
+            "sessions": sessions,
+            "cursor": [last["last_activity"], last["id"]] if last else None,
+            "has_more": has_more
+        }
+
+    async def get_sessions(self, session_ids):
+        return await db.run(self._get_sessions_sync, session_ids)
+
+    def _get_sessions_sync(self, session_ids):
+        """Retorna o resumo das sessões pedidas (usado nos eventos incrementais da barra lateral)."""
+        if not session_ids:
+            return []
+        placeholders = ",".join("?" * len(session_ids))
+        with db.pool.rows() as cursor:
+            cursor.execute(
+                f"SELECT {self.SESSION_LIST_FIELDS} FROM sessions WHERE id IN ({placeholders})",
+                list(session_ids)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    # === Exportação ===
+
+    def iter_export_sessions(self, cursor, batch=TRANSFER_BATCH_ROWS):
+        """Gera as sessões salvas (dicts) lidas em lotes pelo cursor do chamador."""
+        cursor.execute(f'SELECT {self.SESSION_EXPORT_FIELDS} FROM sessions ORDER BY id')
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def iter_export_messages(self, cursor, batch=TRANSFER_BATCH_ROWS):
+        """
+        Gera todas as mensagens (dicts sem o id local): primeiro as do arquivo comprimido,
+        uma sessão por vez, depois a tabela quente em ordem de id. Dentro de cada sessão
+        a ordem cronológica é preservada (o arquivo só guarda mensagens mais antigas).
+        """
+        yield from history_archive.iter_messages(cursor)
+
+        cursor.execute('SELECT session_id, role, content, timestamp, metadata FROM history ORDER BY id')
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
 
 # Instância global
 history_manager = HistoryManager()
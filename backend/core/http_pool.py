@@ -0,0 +1,69 @@
+"""
+Pool de Conexões HTTP - CriativosPro
+Um único `httpx.AsyncClient` por servidor (esquema + host + porta), com
+keep-alive, compartilhado por todas as instâncias de provedor, varreduras de
+modelos e downloads de vocabulário. Sem ele, cada `Provider` criava um
+`AsyncOpenAI` com pool próprio e cada varredura abria conexões TCP novas.
+
+O Ollama em `/v1` (API OpenAI) e em `/api/show` (tokenizador) usa o mesmo
+cliente. Os clientes são fechados no encerramento do backend.
+"""
+from urllib.parse import urlsplit
+from core.constants import (
+    STREAM_TIMEOUT, CONNECTION_TIMEOUT,
+    HTTP_POOL_MAX_CONNECTIONS, HTTP_POOL_MAX_KEEPALIVE, HTTP_POOL_KEEPALIVE_EXPIRY
+)
+from core.logger import root_logger as logger
+
+
+def origin_of(url):
+    """Servidor de uma URL: 'http://localhost:11434/v1' -> 'http://localhost:11434'."""
+    parts = urlsplit(url if "://" in url else f"http://{url}")
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+class HttpClientPool:
+    """Clientes HTTP assíncronos reutilizáveis, um por servidor."""
+
+    def __init__(self):
+        self._clients = {}  # origem -> httpx.AsyncClient
+        self.stats = {"clients_created": 0, "reused": 0}
+
+    def get(self, url):
+        """Cliente compartilhado do servidor de `url` (criado no primeiro uso)."""
+        origin = origin_of(url)
+        client = self._clients.get(origin)
+        if client is not None and not client.is_closed:
+            self.stats["reused"] += 1
+            return client
+
+        import httpx
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(STREAM_TIMEOUT, connect=CONNECTION_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY
+            )
+        )
+        self._clients[origin] = client
+        self.stats["clients_created"] += 1
+        logger.info(f"[HttpPool] Cliente HTTP criado para {origin}")
+        return client
+
+    async def close(self):
+        """Fecha todos os clientes (encerramento do backend)."""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"[HttpPool] Erro ao fechar cliente HTTP: {e}")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["servers"] = sorted(self._clients)
+        return stats
+
+# Instância global
+http_pool = HttpClientPool()
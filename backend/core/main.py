@@ -2,18 +2,35 @@ import socketio
 from aiohttp import web
 from core.controller import Controller
 from core.fsm import fsm
+from core.generation_scheduler import generation_scheduler
+from core.chunk_coalescer import stream_settings
+from core.response_cache import response_cache
+from core.semantic_cache import semantic_cache
+from core.context_builder import context_builder
+from core.tokenizer import tokenizer_service
+from core.prompt_snapshot import prompt_store
 from core.central_brain import central_brain
 import asyncio
 import os
+import sqlite3
 
 from core.config import config
 from core.history_manager import history_manager
+from core.history_archive import history_archive
+from core.data_transfer import data_transfer
+from core.backup_manager import backup_manager
 from core.providers.provider_manager import provider_manager
+from core.http_pool import http_pool
 from core.database import db
+from core.write_behind import write_behind
+from core.maintenance import maintenance
 from core.tts_service import tts_service
 from core.logger import root_logger as logger
 from core.rate_limiter import rate_limiter
-from core.constants import BACKEND_HOST, BACKEND_PORT, SUPPORTED_PROVIDERS, AUDIO_DIR
+from core.constants import (
+    BACKEND_HOST, BACKEND_PORT, SUPPORTED_PROVIDERS, AUDIO_DIR, METRICS_RETENTION_INTERVAL,
+    ARCHIVE_INTERVAL, VACUUM_STEP_PAUSE, BACKUP_INTERVAL, RESPONSE_CACHE_PRUNE_INTERVAL
+)
 from core.validators import validator, ValidationError
 
 # 1. Configuração do Socket.IO
@@ -43,20 +60,23 @@ async def connect(sid, environ):
     # 1. Enviar status e modelos
     await sio.emit("system_status", {"status": fsm.current_state.value}, to=sid)
     await sio.emit("models_data", {"providers": central_brain.get_all_models()}, to=sid)
-    
+    # Gerações deste cliente ainda em andamento (reconexão)
+    for session_id, status in generation_scheduler.sessions_of(sid).items():
+        await sio.emit("generation_status", {"session_id": session_id, "status": status}, to=sid)
 
 
 @sio.event
 async def disconnect(sid):
     logger.info(f"Cliente desconectado: {sid}")
     rate_limiter.clear(sid)
+    stream_settings.clear(sid)
 
 @sio.event
 async def save_api_keys(sid, data):
     """Persiste configurações dos provedores locais (se necessário)."""
     for provider, key in data.items():
         if provider in SUPPORTED_PROVIDERS and key:
-            config.set_api_key(provider, key)
+            await db.run(config.set_api_key, provider, key)
     
     await central_brain.scan_providers()
     await sio.emit("models_data", {"providers": central_brain.get_all_models()}, to=sid)
@@ -64,9 +84,18 @@ async def save_api_keys(sid, data):
 
 @sio.event
 async def get_sessions(sid, data=None):
-    """Retorna a lista de todas as sessões de chat."""
-    sessions = await history_manager.get_all_sessions()
-    await sio.emit("sessions_list", {"sessions": sessions}, to=sid)
+    """
+    Envia uma página da lista de sessões. Sem cursor: primeira página (`sessions_list`);
+    com cursor: página seguinte (`sessions_page`), anexada pelo frontend.
+    """
+    cursor = (data or {}).get('cursor')
+    if cursor is not None and not (
+        isinstance(cursor, list) and len(cursor) == 2 and all(isinstance(v, str) for v in cursor)
+    ):
+        return
+
+    page = await history_manager.get_sessions_page(cursor)
+    await sio.emit("sessions_list" if cursor is None else "sessions_page", page, to=sid)
 
 @sio.event
 async def delete_session(sid, data):
@@ -74,21 +103,107 @@ async def delete_session(sid, data):
     session_id = data.get('session_id')
     if session_id:
         await history_manager.clear_session(session_id)
-        # Retorna lista atualizada
-        sessions = await history_manager.get_all_sessions()
-        await sio.emit("sessions_list", {"sessions": sessions}, to=sid)
+        # Evento incremental para todas as janelas (sem reenviar a lista inteira)
+        await sio.emit("session_removed", {"session_id": session_id})
+
+async def broadcast_session_changes(changes):
+    """Propaga para a barra lateral as sessões criadas/atualizadas no último flush da fila."""
+    for session in await history_manager.get_sessions(list(changes)):
+        event = "session_added" if changes[session["id"]] == "added" else "session_updated"
+        await sio.emit(event, {"session": session})
+
+write_behind.set_session_listener(broadcast_session_changes)
 
 @sio.event
 async def load_session(sid, data):
-    """Carrega o histórico de uma sessão."""
+    """Carrega a página mais recente do histórico de uma sessão."""
     session_id = data.get('session_id')
     if session_id:
-        messages = await history_manager.get_full_history(session_id)
+        page = await history_manager.get_history_page(session_id)
         await sio.emit("session_loaded", {
             "session_id": session_id,
-            "messages": messages
+            **page
         }, to=sid)
 
+@sio.event
+async def load_older_messages(sid, data):
+    """Envia a página anterior ao cursor recebido (rolagem para cima no chat)."""
+    session_id = data.get('session_id')
+    cursor = data.get('cursor')
+    if session_id and isinstance(cursor, int):
+        page = await history_manager.get_history_page(session_id, before_id=cursor)
+        await sio.emit("session_page", {
+            "session_id": session_id,
+            **page
+        }, to=sid)
+
+@sio.event
+async def search_history(sid, data):
+    """Busca full-text nas conversas salvas."""
+    try:
+        query = validator.validate_search_query(data.get('query'))
+    except ValidationError as e:
+        await sio.emit("search_error", {"message": str(e)}, to=sid)
+        return
+
+    results = await history_manager.search_history(query)
+    await sio.emit("search_results", {"query": query, "results": results}, to=sid)
+
+def _progress_emitter(event, sid):
+    """Callback de progresso chamado na thread da transferência; emite no event loop."""
+    loop = asyncio.get_running_loop()
+    return lambda counts: asyncio.run_coroutine_threadsafe(sio.emit(event, counts, to=sid), loop)
+
+@sio.event
+async def export_data(sid, data=None):
+    """Exporta sessões, mensagens e métricas para NDJSON (padrão: .ndjson.gz na pasta de exportações)."""
+    try:
+        path = (data or {}).get('path') or data_transfer.default_export_path()
+        path = validator.validate_transfer_path(path)
+        # Mensagens ainda na fila write-behind também entram no arquivo
+        await write_behind.flush()
+        # Fora do executor do banco: a exportação é longa e não pode ocupar as threads do chat
+        result = await asyncio.to_thread(data_transfer.export_to, path, _progress_emitter("export_progress", sid))
+        await sio.emit("export_done", {"path": path, **result}, to=sid)
+    except (ValidationError, RuntimeError, OSError, sqlite3.Error) as e:
+        logger.error(f"export_data: {e}")
+        await sio.emit("transfer_error", {"operation": "export", "message": str(e)}, to=sid)
+
+@sio.event
+async def import_data(sid, data):
+    """Importa um arquivo gerado por `export_data`; sessões já existentes são ignoradas."""
+    try:
+        path = validator.validate_transfer_path((data or {}).get('path'), must_exist=True)
+        result = await asyncio.to_thread(data_transfer.import_from, path, _progress_emitter("import_progress", sid))
+        await sio.emit("import_done", {"path": path, **result}, to=sid)
+    except (ValidationError, RuntimeError, OSError, ValueError, EOFError, sqlite3.Error) as e:
+        # sqlite3.Error: violação de restrição ou banco bloqueado (o lote falho sofre rollback; os anteriores ficam)
+        logger.error(f"import_data: {e}")
+        await sio.emit("transfer_error", {"operation": "import", "message": str(e)}, to=sid)
+        return
+
+    if result["sessions"]:
+        # Recarrega a barra lateral de todas as janelas com as sessões importadas
+        await sio.emit("sessions_list", await history_manager.get_sessions_page())
+
+@sio.event
+async def convert_storage(sid, data=None):
+    """
+    Converte o banco para auto_vacuum incremental (VACUUM completo, a pedido do usuário).
+    Bancos criados antes desse modo não devolvem ao disco o espaço liberado pelo arquivamento.
+    """
+    if not (data or {}).get('confirm'):
+        await sio.emit("storage_error", {"message": "Confirme a conversão: o banco fica bloqueado durante a reescrita."}, to=sid)
+        return
+    try:
+        await write_behind.flush()
+        # Thread própria: a reescrita é longa e não pode ocupar o executor do banco
+        stats = await asyncio.to_thread(db.convert_to_incremental_vacuum)
+        await sio.emit("storage_converted", stats, to=sid)
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"convert_storage: {e}")
+        await sio.emit("storage_error", {"message": str(e)}, to=sid)
+
 @sio.event
 async def send_message(sid, data):
     if not rate_limiter.is_allowed(sid):
@@ -97,9 +212,26 @@ async def send_message(sid, data):
         return
     await controller.handle_message(sid, data)
 
+@sio.event
+async def set_stream_options(sid, data):
+    """
+    Ajusta o agrupamento de chat_chunk deste cliente (`window_ms` = 0 envia cada delta)
+    e se o raciocínio do modelo deve ser enviado em `thinking_chunk` (`thinking`).
+    """
+    try:
+        # Campos ausentes mantêm o valor atual do cliente (ex.: só {"thinking": true})
+        options = validator.validate_stream_options(data, stream_settings.client_options(sid))
+    except ValidationError as e:
+        await sio.emit("error", {"message": str(e)}, to=sid)
+        return
+    stream_settings.set_client_options(sid, **options)
+    await sio.emit("stream_options", options, to=sid)
+
 @sio.event
 async def stop_generation(sid, data=None):
-    await controller.stop_generation(sid)
+    """Para a geração de uma sessão (`session_id`) ou, sem ele, todas as deste cliente."""
+    session_id = (data or {}).get('session_id')
+    await controller.stop_generation(sid, session_id if isinstance(session_id, str) else None)
 
 @sio.event
 async def get_models(sid, data=None):
@@ -141,10 +273,10 @@ async def sync_provider_models(sid, data):
             return
         
         # Sincronizar no banco
-        config.sync_models(provider_name, models)
+        await db.run(config.sync_models, provider_name, models)
         
         # Retornar modelos atualizados
-        all_models = config.get_all_models(provider_name)
+        all_models = await db.run(config.get_all_models, provider_name)
         await sio.emit("models_synced", {"provider": provider_name, "models": all_models}, to=sid)
     except Exception as e:
         logger.error(f"sync_provider_models: {e}")
@@ -157,7 +289,7 @@ async def toggle_model(sid, data):
     model_name = data.get('model_name')
     is_active = data.get('is_active', True)
     
-    config.toggle_model(provider, model_name, is_active)
+    await db.run(config.toggle_model, provider, model_name, is_active)
     await sio.emit("model_toggled", {"success": True}, to=sid)
     
     # Re-escanear modelos ativos
@@ -170,7 +302,7 @@ async def toggle_provider(sid, data):
     provider = data.get('provider')
     is_active = data.get('is_active', True)
     
-    config.toggle_provider(provider, is_active)
+    await db.run(config.toggle_provider, provider, is_active)
     await sio.emit("provider_toggled", {"success": True}, to=sid)
     
     # Re-escanear modelos ativos
@@ -181,7 +313,7 @@ async def toggle_provider(sid, data):
 async def get_all_models_config(sid, data):
     """Retorna todos os modelos (ativos e inativos) para configuração."""
     provider = data.get('provider')
-    models = config.get_all_models(provider)
+    models = await db.run(config.get_all_models, provider)
     await sio.emit("all_models_config", {"models": models}, to=sid)
 
 @sio.event
@@ -191,7 +323,9 @@ async def save_system_prompts(sid, data):
         prompts = data.get('prompts', {})
         logger.info(f"Salvando prompts de sistema")
         for prompt_type, content in prompts.items():
-            config.save_prompt(prompt_type, content)
+            await db.run(config.save_prompt, prompt_type, content)
+        # Próximas mensagens já usam os prompts novos (troca atômica do snapshot)
+        await prompt_store.reload()
         logger.info("Prompts salvos com sucesso")
         await sio.emit("prompts_saved", {"success": True}, to=sid)
     except Exception as e:
@@ -203,7 +337,7 @@ async def save_system_prompts(sid, data):
 @sio.event
 async def load_system_prompts(sid, data):
     """Carrega todos os prompts de sistema."""
-    prompts = config.get_all_prompts()
+    prompts = await db.run(config.get_all_prompts)
     await sio.emit("prompts_loaded", {"prompts": prompts}, to=sid)
 
 @sio.event
@@ -212,7 +346,8 @@ async def save_user_profile(sid, data):
     try:
         profile = data.get('profile', {})
         logger.info(f"Salvando perfil do usuário")
-        config.save_user_profile(profile)
+        await db.run(config.save_user_profile, profile)
+        await prompt_store.reload()
         logger.info("Perfil salvo com sucesso")
         await sio.emit("profile_saved", {"success": True}, to=sid)
     except Exception as e:
@@ -225,7 +360,7 @@ async def save_user_profile(sid, data):
 async def load_user_profile(sid, data):
     """Carrega o perfil do usuário."""
     try:
-        profile = config.get_user_profile()
+        profile = await db.run(config.get_user_profile)
         logger.info(f"Perfil carregado")
         await sio.emit("profile_loaded", {"profile": profile}, to=sid)
     except Exception as e:
@@ -240,11 +375,14 @@ async def save_provider_settings(sid, data):
         settings = data.get('settings', {})
         
         if 'api_key' in settings:
-            config.set_api_key(provider, settings['api_key'])
+            await db.run(config.set_api_key, provider, settings['api_key'])
             
         if 'base_url' in settings:
             # Salva base_url como uma configuração padrão
-            db.set_setting(f"base_url_{provider}", settings['base_url'])
+            await db.run(db.set_setting, f"base_url_{provider}", settings['base_url'])
+
+        # Instância em cache aponta para a URL antiga; a varredura abaixo cria outra
+        provider_manager.reset(provider)
             
         # Re-escanear para aplicar mudanças (ex: nova URL pode trazer novos modelos)
         await central_brain.scan_providers()
@@ -273,7 +411,15 @@ async def load_provider_settings(sid, data):
 @sio.event
 async def get_dashboard_data(sid, data):
     """Retorna dados de métricas para o dashboard."""
-    stats = db.get_dashboard_stats()
+    stats = await db.run(db.get_dashboard_stats)
+    stats["settings_cache"] = db.get_settings_cache_stats()
+    stats["scheduler"] = dict(generation_scheduler.stats)
+    stats["streaming"] = stream_settings.get_stats()
+    stats["response_cache"] = response_cache.get_stats()
+    stats["semantic_cache"] = semantic_cache.get_stats()
+    stats["context"] = context_builder.get_stats()
+    stats["http"] = http_pool.get_stats()
+    stats["tokenizer"] = tokenizer_service.get_stats()
     await sio.emit("dashboard_data", stats, to=sid)
 
 @sio.event
@@ -310,15 +456,69 @@ def on_fsm_change(new_state):
 
 fsm.set_on_change(on_fsm_change)
 
+async def on_generation_event(sid, event, payload):
+    """Status, posição na fila e descartes das gerações, enviados ao cliente dono do pedido."""
+    await sio.emit(event, payload, to=sid)
+
+generation_scheduler.set_on_event(on_generation_event)
+
+# --- Ciclo de Vida ---
+
+async def prune_metrics_job():
+    return await db.run(db.prune_metrics)
+
+maintenance.add_job("retenção de métricas", METRICS_RETENTION_INTERVAL, prune_metrics_job, initial_delay=60)
+
+async def archive_history_job():
+    return await db.run(history_archive.archive_idle_sessions)
+
+async def vacuum_job():
+    """Devolve ao disco as páginas liberadas (poda, arquivamento) em passos curtos."""
+    while await db.run(db.incremental_vacuum) > 0:
+        await asyncio.sleep(VACUUM_STEP_PAUSE)
+    return await db.run(db.get_storage_stats)
+
+maintenance.add_job("arquivamento do histórico", ARCHIVE_INTERVAL, archive_history_job, initial_delay=120)
+maintenance.add_job("VACUUM incremental", ARCHIVE_INTERVAL, vacuum_job, initial_delay=300)
+
+async def response_cache_job():
+    return await db.run(response_cache.prune_expired)
+
+maintenance.add_job("expiração do cache de respostas", RESPONSE_CACHE_PRUNE_INTERVAL, response_cache_job, initial_delay=180)
+
+async def backup_job():
+    # Thread própria: o backup dorme entre os passos e não pode prender o executor do banco
+    return await asyncio.to_thread(backup_manager.create_backup)
+
+maintenance.add_job("backup do banco", BACKUP_INTERVAL, backup_job, initial_delay=600)
+
+async def on_startup(app):
+    """Descobre os modelos locais e inicia as tarefas de manutenção em background."""
+    # Varredura no loop do servidor: os clientes HTTP compartilhados (http_pool) ficam presos
+    # ao loop em que foram criados, então não podem nascer num loop temporário
+    await central_brain.scan_providers()
+    await prompt_store.reload()
+    # Modelos com vocabulário já baixado contam tokens exatos desde o primeiro pedido
+    await tokenizer_service.load_index()
+    maintenance.start()
+
+async def on_shutdown(app):
+    """Libera os recursos do backend no encerramento."""
+    await maintenance.stop()
+    backup_manager.cancel()
+    await generation_scheduler.close()
+    # Conexões keep-alive com Ollama/LM Studio
+    await http_pool.close()
+    # Grava o que ainda estiver na fila write-behind antes de fechar as conexões
+    await write_behind.close()
+    db.close()
+
+app.on_startup.append(on_startup)
+app.on_shutdown.append(on_shutdown)
+
 if __name__ == '__main__':
     logger.info("==========================================")
     logger.info("    CRIATIVOSPRO BACKEND - INICIADO      ")
     logger.info("==========================================")
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(central_brain.scan_providers())
-    
-    loop.run_until_complete(central_brain.scan_providers())
-    
+
     web.run_app(app, host=BACKEND_HOST, port=BACKEND_PORT)
@@ -0,0 +1,52 @@
+"""
+Agendador de Manutenção - CriativosPro
+Executa tarefas periódicas em background (retenção de métricas, etc.)
+sem bloquear o event loop do servidor.
+"""
+import asyncio
+from core.logger import root_logger as logger
+
+
+class MaintenanceScheduler:
+    """Registra jobs assíncronos e os executa em intervalos fixos."""
+
+    def __init__(self):
+        self._jobs = []   # (nome, intervalo, coroutine function, atraso inicial)
+        self._tasks = []
+
+    def add_job(self, name, interval, func, initial_delay=None):
+        """
+        Registra um job periódico.
+
+        Args:
+            name: Nome usado nos logs
+            interval: Segundos entre execuções
+            func: Função assíncrona sem argumentos
+            initial_delay: Atraso da primeira execução (padrão: o próprio intervalo)
+        """
+        self._jobs.append((name, interval, func, interval if initial_delay is None else initial_delay))
+
+    def start(self):
+        """Inicia todos os jobs registrados no event loop atual."""
+        for name, interval, func, initial_delay in self._jobs:
+            self._tasks.append(asyncio.create_task(self._run(name, interval, func, initial_delay)))
+
+    async def _run(self, name, interval, func, initial_delay):
+        await asyncio.sleep(initial_delay)
+        while True:
+            try:
+                result = await func()
+                logger.debug(f"[Maintenance] {name} concluído: {result}")
+            except Exception as e:
+                logger.error(f"[Maintenance] Falha em {name}: {e}")
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        """Cancela os jobs em execução (chamado no shutdown)."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+# Instância global
+maintenance = MaintenanceScheduler()
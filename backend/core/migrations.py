@@ -0,0 +1,455 @@
+"""
+Migrações de Esquema - CriativosPro
+Migrações versionadas pelo `PRAGMA user_version`: cada uma roda uma única vez,
+em ordem, dentro da própria transação. Em um boot a quente (banco já na versão
+atual) nenhum DDL é executado.
+
+Bancos anteriores ao controle de versão (user_version = 0) já podem ter parte
+do esquema, por isso as migrações são idempotentes.
+"""
+import json
+import sqlite3
+import zlib
+
+# Tabelas de rollup de métricas e o formato do bucket de tempo (UTC, como CURRENT_TIMESTAMP)
+METRIC_ROLLUPS = (
+    ("metrics_hourly", "%Y-%m-%d %H:00:00"),
+    ("metrics_daily", "%Y-%m-%d"),
+)
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def _add_column(cursor, table, column, definition):
+    """Adiciona a coluna se ainda não existir. Retorna True se ela foi criada."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if any(row[1] == column for row in cursor.fetchall()):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def _base_schema(cursor):
+    # Tabela de Configurações (Configurações globais e API Keys criptografadas)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            is_encrypted INTEGER DEFAULT 0
+        )
+    ''')
+
+    # Tabela de Histórico de Conversas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            role TEXT,
+            content TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT
+        )
+    ''')
+
+    # Tabela de Licenças (Proteção Antipirataria)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS licenses (
+            license_key TEXT PRIMARY KEY,
+            status TEXT,
+            activated_at DATETIME,
+            hardware_id TEXT
+        )
+    ''')
+
+    # Tabela de Configuração de Modelos (Fase 2)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS models_config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            provider TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            display_name TEXT,
+            UNIQUE(provider, model_name)
+        )
+    ''')
+
+    # Tabela de Prompts de Sistema (Fase 2)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_prompts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prompt_type TEXT UNIQUE NOT NULL,
+            content TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Inserir prompts padrão se não existirem
+    cursor.execute('''
+        INSERT OR IGNORE INTO system_prompts (prompt_type, content) VALUES
+        ('ollama', 'Você é o CriativosPro, um assistente local otimizado. Respeite rigorosamente a gramática e pontuação do Português Brasileiro.'),
+        ('lmstudio', 'Você é o CriativosPro, um assistente local otimizado. Use Markdown para destacar títulos e partes importantes.')
+    ''')
+
+    # Tabela de Perfil do Usuário (Fase 2)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_profile (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            display_name TEXT,
+            email TEXT,
+            gender TEXT,
+            birthdate TEXT,
+            custom_instructions TEXT
+        )
+    ''')
+
+    # Inserir perfil padrão se não existir
+    cursor.execute('''
+        INSERT OR IGNORE INTO user_profile (id, display_name, custom_instructions)
+        VALUES (1, 'Usuário', '')
+    ''')
+
+    # Tabela de Métricas (Fase 4 - Dashboard)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            provider TEXT,
+            model TEXT,
+            input_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            latency REAL,
+            status TEXT,
+            cost REAL DEFAULT 0.0,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # --- Índices de Performance ---
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_session ON history(session_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_session ON metrics(session_id)')
+
+
+def _sessions_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_persistent BOOLEAN DEFAULT 0
+        )
+    ''')
+    # Bancos antigos criaram a tabela sem a coluna
+    _add_column(cursor, "sessions", "is_persistent", "BOOLEAN DEFAULT 0")
+
+
+def _history_keyset_index(cursor):
+    # Paginação por cursor (keyset) do histórico de uma sessão
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_session_id ON history(session_id, id)')
+
+
+def _history_fts(cursor):
+    """
+    Cria o índice FTS5 (external content) do histórico e os triggers que o
+    mantêm sincronizado. Em bancos antigos o índice é reconstruído uma vez.
+    """
+    if _table_exists(cursor, "history_fts"):
+        return
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE history_fts USING fts5(
+                content,
+                content='history',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"[Database] FTS5 indisponível, busca no histórico desativada: {e}")
+        return
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+            INSERT INTO history_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF content ON history BEGIN
+            INSERT INTO history_fts(history_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO history_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    cursor.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+
+
+def _metric_rollups(cursor):
+    """
+    Cria as tabelas de rollup (hora/dia por provedor e modelo), atualizadas
+    incrementalmente a cada métrica gravada. Na criação, agrega o histórico existente.
+    """
+    # Retenção de métricas brutas (poda por data)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp)')
+
+    for table, bucket_format in METRIC_ROLLUPS:
+        if _table_exists(cursor, table):
+            continue
+        cursor.execute(f'''
+            CREATE TABLE {table} (
+                bucket TEXT NOT NULL,
+                provider TEXT NOT NULL DEFAULT '',
+                model TEXT NOT NULL DEFAULT '',
+                requests INTEGER DEFAULT 0,
+                errors INTEGER DEFAULT 0,
+                input_tokens INTEGER DEFAULT 0,
+                output_tokens INTEGER DEFAULT 0,
+                latency_sum REAL DEFAULT 0.0,
+                cost REAL DEFAULT 0.0,
+                PRIMARY KEY (bucket, provider, model)
+            )
+        ''')
+        cursor.execute(f'''
+            INSERT INTO {table}
+            SELECT strftime('{bucket_format}', timestamp), COALESCE(provider, ''), COALESCE(model, ''),
+                   COUNT(*), SUM(status != 'success'), SUM(input_tokens), SUM(output_tokens),
+                   TOTAL(latency), TOTAL(cost)
+            FROM metrics
+            GROUP BY 1, 2, 3
+        ''')
+
+    # Sketches de percentis de latência (ttft, duração, intervalo entre tokens) por dia
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metrics_sketches (
+            bucket TEXT NOT NULL,
+            provider TEXT NOT NULL DEFAULT '',
+            model TEXT NOT NULL DEFAULT '',
+            metric TEXT NOT NULL,
+            sketch TEXT NOT NULL,
+            PRIMARY KEY (bucket, provider, model, metric)
+        )
+    ''')
+
+
+def _session_summaries(cursor):
+    """Colunas de resumo mantidas na própria linha da sessão (evita agregar o histórico na listagem)."""
+    added = False
+    for column, definition in (
+        ("message_count", "INTEGER DEFAULT 0"),
+        ("total_tokens", "INTEGER DEFAULT 0"),
+        ("last_model", "TEXT"),
+        ("last_activity", "TIMESTAMP"),
+    ):
+        added = _add_column(cursor, "sessions", column, definition) or added
+
+    if added:
+        # Preenche o resumo das sessões criadas antes das colunas existirem
+        cursor.execute('''
+            UPDATE sessions SET
+                message_count = (SELECT COUNT(*) FROM history h WHERE h.session_id = sessions.id),
+                total_tokens = (
+                    SELECT IFNULL(SUM(json_extract(h.metadata, '$.tokens')), 0)
+                    FROM history h WHERE h.session_id = sessions.id AND json_valid(h.metadata)
+                ),
+                last_activity = IFNULL(last_activity, created_at)
+        ''')
+
+    # Índice da ordenação da barra lateral (keyset por last_activity, id)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_activity ON sessions(last_activity, id)')
+
+
+def _performance_indexes(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions(created_at)')
+    # Consultas de métricas brutas por provedor/modelo em um período
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_provider_model ON metrics(provider, model, timestamp)')
+    # Redundante com o prefixo de idx_history_session_id; só custava escrita
+    cursor.execute('DROP INDEX IF EXISTS idx_history_session')
+
+
+def _history_archive(cursor):
+    """Arquivo frio: uma linha (blob zlib com todas as mensagens) por sessão ociosa."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_dictionaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dictionary BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history_archive (
+            session_id TEXT PRIMARY KEY,
+            dict_id INTEGER REFERENCES archive_dictionaries(id),
+            message_count INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _response_cache(cursor):
+    """Camada em disco do cache de respostas (chave = hash do pedido completo)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            content TEXT NOT NULL,
+            metrics TEXT,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_hit REAL NOT NULL,
+            hits INTEGER DEFAULT 0
+        )
+    ''')
+    # Despejo por tamanho (menos usadas primeiro) e expiração por TTL
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_last_hit ON response_cache(last_hit)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache(created_at)')
+
+
+def _context_summaries(cursor):
+    """Resumo contínuo das mensagens antigas de cada sessão (as `covered` primeiras)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS context_summaries (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            covered INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _cache_metrics(cursor):
+    """Camada de cache que atendeu cada pedido e contadores de acerto/erro nos rollups."""
+    _add_column(cursor, "metrics", "cache", "TEXT")
+    for table, _ in METRIC_ROLLUPS:
+        _add_column(cursor, table, "cache_hits", "INTEGER DEFAULT 0")
+        _add_column(cursor, table, "cache_misses", "INTEGER DEFAULT 0")
+
+
+def _archive_search(cursor):
+    """
+    Mantém as mensagens arquivadas no índice de busca. Arquivamento e restauração
+    marcam a sessão em `history_fts_hold` para os triggers não mexerem no FTS5
+    (a linha sai/volta de `history`, mas os termos ficam); `history_archive_ids`
+    liga cada rowid arquivado à sua sessão. `sessions.restored_at` evita que uma
+    sessão recém-reaberta volte ao arquivo no ciclo seguinte.
+    """
+    _add_column(cursor, "sessions", "restored_at", "TIMESTAMP")
+    cursor.execute('CREATE TABLE IF NOT EXISTS history_fts_hold (session_id TEXT PRIMARY KEY)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history_archive_ids (
+            id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_archive_ids_session ON history_archive_ids(session_id)')
+    if not _table_exists(cursor, "history_fts"):
+        return
+
+    cursor.execute('DROP TRIGGER IF EXISTS history_fts_insert')
+    cursor.execute('DROP TRIGGER IF EXISTS history_fts_delete')
+    cursor.execute('''
+        CREATE TRIGGER history_fts_insert AFTER INSERT ON history
+        WHEN NOT EXISTS (SELECT 1 FROM history_fts_hold WHERE session_id = new.session_id) BEGIN
+            INSERT INTO history_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER history_fts_delete AFTER DELETE ON history
+        WHEN NOT EXISTS (SELECT 1 FROM history_fts_hold WHERE session_id = old.session_id) BEGIN
+            INSERT INTO history_fts(history_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    ''')
+
+    # Sessões arquivadas antes desta versão perderam os termos: devolve-os ao índice
+    cursor.execute('SELECT id, dictionary FROM archive_dictionaries')
+    dictionaries = dict(cursor.fetchall())
+    blobs = cursor.connection.cursor()
+    try:
+        blobs.execute('SELECT session_id, dict_id, payload FROM history_archive')
+        for session_id, dict_id, payload in blobs:
+            dictionary = dictionaries.get(dict_id)
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            rows = json.loads(decompressor.decompress(payload) + decompressor.flush())
+            cursor.executemany('INSERT OR IGNORE INTO history_archive_ids (id, session_id) VALUES (?, ?)',
+                               ((row[0], session_id) for row in rows))
+            cursor.executemany('INSERT INTO history_fts(rowid, content) VALUES (?, ?)',
+                               ((row[0], row[2]) for row in rows))
+    finally:
+        blobs.close()
+
+
+def _import_pending(cursor):
+    """Sessões criadas por uma importação que ainda não terminou (retomadas na próxima tentativa)."""
+    cursor.execute('CREATE TABLE IF NOT EXISTS import_pending (session_id TEXT PRIMARY KEY)')
+
+
+def _cache_hits_out_of_requests(cursor):
+    """Tira dos rollups os acertos do cache já contados como pedidos (requests e latency_sum)."""
+    for table, bucket_format in METRIC_ROLLUPS:
+        cursor.execute(f'''
+            UPDATE {table} SET requests = requests - hits.n, latency_sum = latency_sum - hits.latency
+            FROM (
+                SELECT strftime('{bucket_format}', timestamp) AS bucket, IFNULL(provider, '') AS provider,
+                       IFNULL(model, '') AS model, COUNT(*) AS n, IFNULL(SUM(latency), 0) AS latency
+                FROM metrics WHERE cache IN ('hit', 'semantic')
+                GROUP BY 1, 2, 3
+            ) AS hits
+            WHERE {table}.bucket = hits.bucket AND {table}.provider = hits.provider AND {table}.model = hits.model
+        ''')
+
+
+# (versão, descrição, função). Nunca reordene nem altere uma migração já publicada:
+# mudanças de esquema entram sempre como uma nova versão no fim da lista.
+MIGRATIONS = (
+    (1, "esquema base", _base_schema),
+    (2, "tabela sessions", _sessions_table),
+    (3, "índice keyset do histórico", _history_keyset_index),
+    (4, "busca FTS5 no histórico", _history_fts),
+    (5, "rollups e sketches de métricas", _metric_rollups),
+    (6, "resumo das sessões", _session_summaries),
+    (7, "índices de performance", _performance_indexes),
+    (8, "arquivo comprimido do histórico", _history_archive),
+    (9, "cache de respostas", _response_cache),
+    (10, "resumo contínuo do contexto", _context_summaries),
+    (11, "acertos do cache nas métricas", _cache_metrics),
+    (12, "busca no histórico arquivado", _archive_search),
+    (13, "importações interrompidas", _import_pending),
+    (14, "acertos do cache fora das médias", _cache_hits_out_of_requests),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def apply_migrations(conn):
+    """
+    Aplica as migrações pendentes em ordem. Cada uma roda em sua transação
+    junto com a atualização do `user_version`, então uma falha no meio não
+    deixa o banco marcado com uma versão que não foi aplicada por completo.
+
+    Returns:
+        Lista das versões aplicadas (vazia em um boot a quente)
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current >= SCHEMA_VERSION:
+        return []
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {version}")
+        print(f"[Database] Migração {version} aplicada: {description}")
+        applied.append(version)
+    return applied
@@ -0,0 +1,76 @@
+"""
+Snapshot de Prompts - CriativosPro
+System prompt final de cada provedor (prompt do tipo + perfil do usuário) já
+montado em memória, para o controller não consultar o SQLite nem concatenar
+strings a cada mensagem.
+
+O snapshot é imutável: `save_system_prompts` e `save_user_profile` montam um
+novo e trocam a referência de uma vez (atribuição única), então quem está no
+meio de uma geração continua com o snapshot antigo, inteiro.
+"""
+import asyncio
+from types import MappingProxyType
+from core.database import db
+from core.config import config
+
+
+def prompt_type_for(provider_name):
+    """Tipo de prompt (tabela system_prompts) usado por um provedor."""
+    return 'ollama' if 'ollama' in provider_name.lower() else 'lmstudio'
+
+
+def profile_block(profile):
+    """Trecho do perfil do usuário anexado a todos os system prompts."""
+    if not profile:
+        return ""
+    block = f"\nINFO USUARIO: {profile.get('display_name', 'User')}"
+    if profile.get('custom_instructions'):
+        block += f"\nINSTRUCOES: {profile.get('custom_instructions')}"
+    return block
+
+
+class PromptSnapshot:
+    """System prompts já compilados por tipo de provedor. Não muda depois de criado."""
+    __slots__ = ("version", "prompts", "profile")
+
+    def __init__(self, version, prompts, profile):
+        block = profile_block(profile)
+        self.version = version
+        self.profile = block
+        self.prompts = MappingProxyType({prompt_type: (content or "") + block for prompt_type, content in prompts.items()})
+
+    def system_prompt(self, provider_name):
+        # Sem prompt cadastrado para o tipo, o perfil do usuário segue sozinho
+        return self.prompts.get(prompt_type_for(provider_name), self.profile)
+
+
+class PromptStore:
+    """Guarda o snapshot atual e o reconstrói quando prompts ou perfil são salvos."""
+
+    def __init__(self):
+        self.snapshot = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self.stats = {"rebuilds": 0}
+
+    async def reload(self):
+        """Lê prompts e perfil do banco, compila e troca o snapshot atual."""
+        async with self._lock:
+            prompts = await db.run(config.get_all_prompts)
+            profile = await db.run(config.get_user_profile)
+            self._version += 1
+            self.snapshot = PromptSnapshot(self._version, prompts, profile)
+            self.stats["rebuilds"] += 1
+            return self.snapshot
+
+    async def current(self):
+        """Snapshot atual (carregado na primeira chamada se o startup ainda não o montou)."""
+        return self.snapshot or await self.reload()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["version"] = self.snapshot.version if self.snapshot else 0
+        return stats
+
+# Instância global
+prompt_store = PromptStore()
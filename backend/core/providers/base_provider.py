@@ -20,7 +20,31 @@ class BaseProvider(ABC):
         """
         pass
 
+    async def embed(self, model: str, texts: list):
+        """
+        Gera os vetores de `texts` (endpoint /v1/embeddings).
+        Provedores sem suporte a embeddings levantam NotImplementedError.
+        """
+        raise NotImplementedError(f"{type(self).__name__} não gera embeddings")
+
     @abstractmethod
     def get_metrics(self, response):
-        """Extrai tokens, latência e outras métricas da resposta da API."""
+        """
+        Extrai as métricas de uso reportadas pela API (resposta completa ou chunk do stream).
+        Retorna None quando a resposta não traz `usage` (chunks intermediários ou servidor antigo).
+        """
         pass
+
+    @staticmethod
+    def usage_metrics(usage):
+        """Converte o `usage` compatível com OpenAI (prompt/completion tokens) no formato de métricas."""
+        if usage is None:
+            return None
+        # Servidores que reaproveitam o KV cache (llama.cpp, LM Studio) informam os tokens do prefixo em cache
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "input_tokens": usage.prompt_tokens or 0,
+            "output_tokens": usage.completion_tokens or 0,
+            "cached_tokens": getattr(details, "cached_tokens", None) if details else None,
+            "cost": 0.0
+        }
@@ -1,6 +1,7 @@
-from core.providers.lmstudio.provider import Provider
+from core.providers.provider_manager import provider_manager
 
 async def create_brain(api_key: str):
     """Inicializa e retorna os modelos do LM Studio."""
-    provider = Provider(api_key)
-    return await provider.list_models()
+    # Instância do gerenciador (cliente HTTP compartilhado), não um Provider novo por varredura
+    provider = provider_manager.get_provider('lmstudio', api_key)
+    return await provider.list_models() if provider else None
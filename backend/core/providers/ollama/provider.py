@@ -1,4 +1,5 @@
 from core.providers.base_provider import BaseProvider
+from core.http_pool import http_pool
 from openai import AsyncOpenAI
 
 class Provider(BaseProvider):
@@ -21,6 +22,7 @@ class Provider(BaseProvider):
         
         self.client = AsyncOpenAI(
             base_url=base_url,
+            http_client=http_pool.get(base_url),  # conexões reaproveitadas entre instâncias e varreduras
             api_key="ollama", # Key dummy
         )
 
@@ -39,18 +41,22 @@ class Provider(BaseProvider):
             return await self.client.chat.completions.create(
                 model=model,
                 messages=messages,
-                stream=stream
+                stream=stream,
+                # Pede o uso real de tokens no último chunk do stream
+                **({"stream_options": {"include_usage": True}} if stream else {})
             )
         except Exception as e:
             print(f"[Ollama] Erro na geração: {e}")
             raise e
 
+    async def embed(self, model: str, texts: list):
+        try:
+            response = await self.client.embeddings.create(model=model, input=texts)
+            return [item.embedding for item in response.data]
+        except Exception as e:
+            print(f"[Ollama] Erro ao gerar embeddings: {e}")
+            raise e
+
     def get_metrics(self, response):
-        """Extrai tokens e custo da resposta."""
-        # Ollama local não tem custo, apenas uso de tokens se disponível no chunk final
-        return {
-            "input_tokens": 0,
-            "output_tokens": 0,
-            "cost": 0.0,
-            "latency": 0.0
-        }
+        """Tokens de prompt e de geração reportados pelo Ollama (local, sem custo)."""
+        return self.usage_metrics(getattr(response, "usage", None))
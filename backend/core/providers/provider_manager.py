@@ -35,5 +35,9 @@ class ProviderManager:
             traceback.print_exc()
             return None
 
+    def reset(self, provider_name: str):
+        """Descarta a instância em cache (ex.: URL alterada); a próxima chamada cria outra."""
+        self.providers.pop(provider_name, None)
+
 # Instância global
 provider_manager = ProviderManager()
@@ -0,0 +1,95 @@
+"""
+Sketch de Quantis - CriativosPro
+Histograma logarítmico (estilo DDSketch/HDR) com erro relativo garantido,
+mesclável e serializável, usado para percentis de latência sem varrer linhas.
+"""
+import json
+import math
+from core.constants import SKETCH_RELATIVE_ACCURACY
+
+# Valores abaixo disso (em segundos) contam como zero
+MIN_TRACKABLE_VALUE = 1e-6
+
+
+class QuantileSketch:
+    """
+    Cada valor positivo cai no bucket ceil(log_gamma(v)). Qualquer quantil
+    estimado fica a no máximo `relative_accuracy` do valor real, e dois
+    sketches com a mesma precisão se mesclam somando os contadores.
+    """
+    __slots__ = ("relative_accuracy", "_gamma", "_log_gamma", "bins", "zero_count", "count", "total")
+
+    def __init__(self, relative_accuracy=SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value, count=1):
+        if value is None:
+            return
+        if value < MIN_TRACKABLE_VALUE:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Sketches com precisões diferentes não podem ser mesclados")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def quantile(self, q):
+        """Retorna o quantil `q` (0..1) estimado, ou None se o sketch estiver vazio."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        running = self.zero_count
+        if rank < running:
+            return 0.0
+        for index in sorted(self.bins):
+            running += self.bins[index]
+            if running > rank:
+                # Ponto médio (em erro relativo) do bucket
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.bins) / (self._gamma + 1)
+
+    def summary(self, digits=4):
+        """Percentis usados no dashboard."""
+        def fmt(value):
+            return round(value, digits) if value is not None else None
+        return {
+            "p50": fmt(self.quantile(0.50)),
+            "p90": fmt(self.quantile(0.90)),
+            "p99": fmt(self.quantile(0.99)),
+            "count": self.count
+        }
+
+    def to_json(self):
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "z": self.zero_count,
+            "n": self.count,
+            "t": self.total,
+            "b": self.bins
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        sketch = cls(data["a"])
+        sketch.zero_count = data["z"]
+        sketch.count = data["n"]
+        sketch.total = data["t"]
+        sketch.bins = {int(index): count for index, count in data["b"].items()}
+        return sketch
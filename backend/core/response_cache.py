@@ -0,0 +1,190 @@
+"""
+Cache de Respostas - CriativosPro
+Guarda respostas completas indexadas pelo hash do pedido (provedor, modelo,
+mensagens enviadas - inclusive o system prompt - e parâmetros de amostragem).
+Um pedido idêntico é respondido sem chamar o modelo.
+
+Duas camadas:
+  - memória: LRU limitada pelo tamanho do texto;
+  - disco (tabela `response_cache`): limitada em bytes, despeja as menos
+    usadas e descarta entradas mais antigas que o TTL.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from core.database import db
+from core.constants import RESPONSE_CACHE_MEMORY_BYTES, RESPONSE_CACHE_DISK_BYTES, RESPONSE_CACHE_TTL
+
+
+class CachedResponse:
+    """Resposta guardada: texto final e métricas da geração original."""
+    __slots__ = ("content", "metrics", "created_at")
+
+    def __init__(self, content, metrics, created_at):
+        self.content = content
+        self.metrics = metrics
+        self.created_at = created_at
+
+    @property
+    def size(self):
+        return len(self.content)
+
+
+class ResponseCache:
+    """LRU em memória na frente de uma camada SQLite com TTL e limite de tamanho."""
+
+    def __init__(self, memory_bytes=RESPONSE_CACHE_MEMORY_BYTES, disk_bytes=RESPONSE_CACHE_DISK_BYTES,
+                 ttl=RESPONSE_CACHE_TTL):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        # Camada em memória: usada só no event loop
+        self._memory = OrderedDict()  # key -> CachedResponse
+        self._memory_size = 0
+        # Tamanho da camada em disco (calculado na primeira escrita); escrito pelas threads do banco
+        self._disk_size = None
+        self._disk_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0,
+                      "stores": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(provider, model, messages, params=None):
+        """Hash estável do pedido completo (a ordem das chaves dos dicts não importa)."""
+        request = {"provider": provider, "model": model, "messages": messages, "params": params or {}}
+        encoded = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    # === Leitura ===
+
+    async def get(self, key):
+        """Retorna a CachedResponse da chave (memória, depois disco) ou None."""
+        cached = self._memory.get(key)
+        if cached is not None:
+            if time.time() - cached.created_at < self.ttl:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return cached
+            self._forget(key)
+
+        cached = await db.run(self._load, key)
+        if cached is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        self._remember(key, cached)
+        return cached
+
+    def _load(self, key):
+        now = time.time()
+        with db.pool.transaction() as conn:
+            row = conn.execute(
+                'SELECT content, metrics, created_at, size FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            content, metrics, created_at, size = row
+            if now - created_at >= self.ttl:
+                conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                self._adjust_disk_size(-size)
+                self.stats["expired"] += 1
+                return None
+            conn.execute('UPDATE response_cache SET last_hit = ?, hits = hits + 1 WHERE key = ?', (now, key))
+        return CachedResponse(content, json.loads(metrics) if metrics else {}, created_at)
+
+    def record_bypass(self):
+        self.stats["bypassed"] += 1
+
+    # === Escrita ===
+
+    async def put(self, key, provider, model, content, metrics):
+        """Guarda uma resposta completa nas duas camadas."""
+        if not content:
+            return
+        cached = CachedResponse(content, metrics, time.time())
+        self._remember(key, cached)
+        self.stats["stores"] += 1
+        await db.run(self._store, key, provider, model, cached)
+
+    def _store(self, key, provider, model, cached):
+        size = len(cached.content.encode("utf-8"))
+        with db.pool.transaction() as conn:
+            self._ensure_disk_size(conn)
+            previous = conn.execute('SELECT size FROM response_cache WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                '''INSERT OR REPLACE INTO response_cache
+                   (key, provider, model, content, metrics, size, created_at, last_hit, hits)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)''',
+                (key, provider, model, cached.content, json.dumps(cached.metrics), size,
+                 cached.created_at, cached.created_at)
+            )
+            self._adjust_disk_size(size - (previous[0] if previous else 0))
+            self._evict_disk(conn)
+
+    def _evict_disk(self, conn):
+        """Remove as entradas menos usadas até a camada em disco caber no limite."""
+        if self._disk_size <= self.disk_bytes:
+            return
+        freed, victims = 0, []
+        excess = self._disk_size - self.disk_bytes
+        for key, size in conn.execute('SELECT key, size FROM response_cache ORDER BY last_hit'):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM response_cache WHERE key = ?', victims)
+        self._adjust_disk_size(-freed)
+        self.stats["evictions"] += len(victims)
+
+    def prune_expired(self):
+        """Apaga do disco as entradas vencidas (job de manutenção). Retorna quantas saíram."""
+        with db.pool.transaction() as conn:
+            cursor = conn.execute('DELETE FROM response_cache WHERE created_at < ?', (time.time() - self.ttl,))
+            removed = cursor.rowcount
+            if removed:
+                with self._disk_lock:
+                    self._disk_size = None  # Recalculado na próxima escrita
+        self.stats["expired"] += removed
+        return removed
+
+    def _ensure_disk_size(self, conn):
+        with self._disk_lock:
+            if self._disk_size is None:
+                self._disk_size = int(conn.execute('SELECT TOTAL(size) FROM response_cache').fetchone()[0])
+
+    def _adjust_disk_size(self, delta):
+        with self._disk_lock:
+            if self._disk_size is not None:
+                self._disk_size += delta
+
+    # === Camada em memória ===
+
+    def _remember(self, key, cached):
+        self._forget(key)
+        if cached.size > self.memory_bytes:
+            return
+        self._memory[key] = cached
+        self._memory_size += cached.size
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= evicted.size
+
+    def _forget(self, key):
+        cached = self._memory.pop(key, None)
+        if cached is not None:
+            self._memory_size -= cached.size
+
+    def get_stats(self):
+        """Contadores de acerto/erro e a taxa de acerto (memória + disco)."""
+        stats = dict(self.stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hit_ratio"] = round(hits / total, 4) if total else 0.0
+        stats["memory_entries"] = len(self._memory)
+        stats["memory_bytes"] = self._memory_size
+        stats["disk_bytes"] = self._disk_size
+        return stats
+
+# Instância global
+response_cache = ResponseCache()
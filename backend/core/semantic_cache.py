@@ -0,0 +1,196 @@
+"""
+Cache Semântico - CriativosPro
+Segunda camada do cache de respostas: perguntas quase idênticas ("como
+instalo o python?" / "como instalar python") reaproveitam a resposta já
+gerada, sem chamar o modelo.
+
+A última mensagem do usuário é convertida em vetor pelo endpoint
+`/v1/embeddings` do próprio provedor e comparada (cosseno) com as perguntas
+anteriores do mesmo provedor/modelo. Acima do limiar, a resposta guardada é
+devolvida. Só vale para o primeiro turno de uma conversa: com histórico, a
+mesma pergunta pode ter outra resposta.
+
+Desligado por padrão: só consulta provedores com um modelo de embeddings
+configurado (setting `embedding_model_<provedor>`, ex.: "nomic-embed-text" no
+Ollama), para não somar uma ida ao `/v1/embeddings` a cada primeiro turno.
+
+Os vetores ficam normalizados em `array('f')` (float32 contíguo); o índice de
+cada modelo é limitado e despeja as perguntas menos usadas.
+"""
+import asyncio
+import hashlib
+import math
+import operator
+import time
+from array import array
+from collections import OrderedDict
+from core.database import db
+from core.response_cache import CachedResponse
+from core.constants import (
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_PER_MODEL,
+    SEMANTIC_CACHE_RETRY_AFTER, RESPONSE_CACHE_TTL
+)
+from core.logger import root_logger as logger
+
+
+def normalize(vector):
+    """Vetor float32 de norma 1 (o produto escalar passa a ser o cosseno)."""
+    norm = math.sqrt(sum(value * value for value in vector))
+    if not norm:
+        return None
+    return array("f", (value / norm for value in vector))
+
+
+class SemanticEntry:
+    __slots__ = ("vector", "scope", "prompt", "response")
+
+    def __init__(self, vector, scope, prompt, response):
+        self.vector = vector
+        self.scope = scope
+        self.prompt = prompt
+        self.response = response
+
+
+class SemanticQuery:
+    """Pergunta já convertida em vetor; guardada para indexar a resposta depois da geração."""
+    __slots__ = ("index_key", "scope", "prompt", "vector", "response", "similarity")
+
+    def __init__(self, index_key, scope, prompt, vector):
+        self.index_key = index_key
+        self.scope = scope
+        self.prompt = prompt
+        self.vector = vector
+        self.response = None    # CachedResponse do vizinho mais próximo, se passou do limiar
+        self.similarity = None
+
+
+class SemanticCache:
+    """Índice vetorial em memória por provedor/modelo."""
+
+    def __init__(self, max_per_model=SEMANTIC_CACHE_MAX_PER_MODEL, ttl=RESPONSE_CACHE_TTL):
+        self.max_per_model = max_per_model
+        self.ttl = ttl
+        self._indexes = {}         # (provedor, modelo) -> OrderedDict(id -> SemanticEntry), em ordem LRU
+        self._next_id = 0
+        self._disabled_until = {}  # provedor -> instante em que o /v1/embeddings volta a ser tentado
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                      "embedding_errors": 0, "embedding_time": 0.0}
+
+    def threshold(self):
+        return float(db.get_setting("semantic_cache_threshold") or SEMANTIC_CACHE_THRESHOLD)
+
+    def embedding_model(self, provider_name):
+        """Modelo de embeddings do provedor; None (cache desligado) se não configurado."""
+        return db.get_setting(f"embedding_model_{provider_name}") or None
+
+    # === Consulta ===
+
+    async def lookup(self, provider, provider_name, model_name, context):
+        """
+        Busca uma resposta para a última pergunta do contexto.
+
+        Returns:
+            SemanticQuery (com `response` preenchido em caso de acerto) ou None se o
+            pedido não é elegível ou o provedor não gera embeddings
+        """
+        prompt, scope = self._eligible(context)
+        embedding_model = self.embedding_model(provider_name)
+        if prompt is None or not SEMANTIC_CACHE_ENABLED or not embedding_model:
+            return None
+        if time.monotonic() < self._disabled_until.get(provider_name, 0):
+            return None
+
+        start = time.perf_counter()
+        try:
+            vectors = await provider.embed(embedding_model, [prompt])
+        except Exception as e:
+            # Sem modelo de embeddings carregado: não tenta de novo a cada mensagem
+            self.stats["embedding_errors"] += 1
+            self._disabled_until[provider_name] = time.monotonic() + SEMANTIC_CACHE_RETRY_AFTER
+            logger.warning(f"[SemanticCache] Embeddings indisponíveis em {provider_name} ({embedding_model}): {e}")
+            return None
+        self.stats["embedding_time"] += time.perf_counter() - start
+
+        vector = normalize(vectors[0]) if vectors else None
+        if vector is None:
+            return None
+
+        query = SemanticQuery((provider_name, model_name), scope, prompt, vector)
+        self.stats["lookups"] += 1
+        entry, similarity = await self._nearest(query)
+        if entry is not None and similarity >= self.threshold():
+            query.response = entry.response
+            query.similarity = round(similarity, 4)
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+        return query
+
+    @staticmethod
+    def _eligible(context):
+        """Primeiro turno: só system prompt (opcional) e a pergunta. Retorna (pergunta, escopo)."""
+        if not context or context[-1]["role"] != "user":
+            return None, None
+        earlier = context[:-1]
+        if any(message["role"] != "system" for message in earlier):
+            return None, None
+        # Respostas só valem para o mesmo system prompt
+        scope = hashlib.sha256("\n".join(message["content"] for message in earlier).encode("utf-8")).hexdigest()
+        return context[-1]["content"], scope
+
+    async def _nearest(self, query):
+        index = self._indexes.get(query.index_key)
+        if not index:
+            return None, 0.0
+        # Produtos escalares numa thread (até SEMANTIC_CACHE_MAX_PER_MODEL vetores); o índice
+        # só é alterado aqui no event loop
+        expired, best_id, best_similarity = await asyncio.to_thread(
+            self._scan, list(index.items()), query, time.time() - self.ttl
+        )
+        for entry_id in expired:
+            index.pop(entry_id, None)
+        best = index.get(best_id) if best_id is not None else None
+        if best is not None:
+            index.move_to_end(best_id)
+        return best, best_similarity
+
+    @staticmethod
+    def _scan(entries, query, oldest):
+        """Retorna (ids expirados, id mais similar, similaridade)."""
+        expired, best_id, best_similarity = [], None, -1.0
+        for entry_id, entry in entries:
+            if entry.response.created_at <= oldest:
+                expired.append(entry_id)
+                continue
+            if entry.scope != query.scope or len(entry.vector) != len(query.vector):
+                continue
+            similarity = sum(map(operator.mul, entry.vector, query.vector))
+            if similarity > best_similarity:
+                best_id, best_similarity = entry_id, similarity
+        return expired, best_id, best_similarity
+
+    # === Escrita ===
+
+    def store(self, query, content, metrics):
+        """Indexa a resposta gerada para a pergunta da consulta (após um erro de cache)."""
+        if query is None or query.response is not None or not content:
+            return
+        index = self._indexes.setdefault(query.index_key, OrderedDict())
+        self._next_id += 1
+        index[self._next_id] = SemanticEntry(
+            query.vector, query.scope, query.prompt, CachedResponse(content, metrics, time.time())
+        )
+        self.stats["stores"] += 1
+        while len(index) > self.max_per_model:
+            index.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["hit_ratio"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["embedding_time"] = round(stats["embedding_time"], 3)
+        stats["entries"] = {f"{provider}/{model}": len(index) for (provider, model), index in self._indexes.items()}
+        return stats
+
+# Instância global
+semantic_cache = SemanticCache()
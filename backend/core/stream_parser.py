@@ -0,0 +1,118 @@
+"""
+Parser Incremental do Streaming - CriativosPro
+Separa, delta a delta, o raciocínio (`<think>...</think>`) da resposta.
+
+É uma máquina de estados: em cada estado só interessa uma tag (a de abertura
+fora do raciocínio, a de fechamento dentro dele). Um final de delta que pode
+ser o começo da tag (ex.: "<thi") fica retido até o próximo delta, então tags
+partidas entre chunks são reconhecidas. O texto de cada canal é acumulado em
+lista e unido uma única vez no fim.
+"""
+import time
+from core.constants import STREAM_THINK_OPEN_TAG, STREAM_THINK_CLOSE_TAG
+
+
+class ReasoningStreamParser:
+    """Divide um stream de texto nos canais de resposta e de raciocínio."""
+
+    ANSWER = "answer"
+    THINKING = "thinking"
+
+    def __init__(self, open_tag=STREAM_THINK_OPEN_TAG, close_tag=STREAM_THINK_CLOSE_TAG):
+        self.open_tag = open_tag
+        self.close_tag = close_tag
+        self.thinking = False
+        self._pending = ""  # Final do delta anterior que pode ser o começo de uma tag
+        self._parts = {self.ANSWER: [], self.THINKING: []}
+        # Tempos (monotonic) para separar tempo de raciocínio e de resposta
+        self._thinking_since = None
+        self._thinking_total = 0.0
+        self._answer_started = None
+        self._finished_at = None
+
+    def feed(self, text):
+        """
+        Processa um delta.
+
+        Returns:
+            Lista de (canal, texto) na ordem do stream, sem as tags
+        """
+        if not text:
+            return []
+        if self._pending:
+            text = self._pending + text
+            self._pending = ""
+
+        segments = []
+        position = 0
+        while position < len(text):
+            tag = self.close_tag if self.thinking else self.open_tag
+            index = text.find(tag, position)
+            if index == -1:
+                end = self._partial_tag_start(text, position, tag)
+                self._pending = text[end:]
+                self._emit(segments, text[position:end])
+                break
+            self._emit(segments, text[position:index])
+            self._toggle()
+            position = index + len(tag)
+        return segments
+
+    def finish(self):
+        """Encerra o stream: o que estava retido não era tag e vai para o canal atual."""
+        segments = []
+        pending, self._pending = self._pending, ""
+        self._emit(segments, pending)
+        now = time.monotonic()
+        if self._thinking_since is not None:
+            self._thinking_total += now - self._thinking_since
+            self._thinking_since = None
+        self._finished_at = now
+        return segments
+
+    @staticmethod
+    def _partial_tag_start(text, position, tag):
+        """Início do maior sufixo de `text[position:]` que é prefixo de `tag` (ou len(text))."""
+        start = max(position, len(text) - len(tag) + 1)
+        index = text.find(tag[0], start)
+        while index != -1:
+            if tag.startswith(text[index:]):
+                return index
+            index = text.find(tag[0], index + 1)
+        return len(text)
+
+    def _emit(self, segments, text):
+        if not text:
+            return
+        channel = self.THINKING if self.thinking else self.ANSWER
+        if channel == self.ANSWER and self._answer_started is None:
+            self._answer_started = time.monotonic()
+        self._parts[channel].append(text)
+        segments.append((channel, text))
+
+    def _toggle(self):
+        now = time.monotonic()
+        if self.thinking:
+            self._thinking_total += now - self._thinking_since
+            self._thinking_since = None
+        else:
+            self._thinking_since = now
+        self.thinking = not self.thinking
+
+    @property
+    def answer(self):
+        return "".join(self._parts[self.ANSWER])
+
+    @property
+    def reasoning(self):
+        return "".join(self._parts[self.THINKING])
+
+    def timings(self):
+        """Tempo gasto raciocinando e gerando a resposta visível (segundos, após `finish`)."""
+        answer_time = None
+        if self._answer_started is not None and self._finished_at is not None:
+            answer_time = round(self._finished_at - self._answer_started, 3)
+        return {
+            "thinking_time": round(self._thinking_total, 3) if self._parts[self.THINKING] else None,
+            "answer_time": answer_time
+        }
@@ -0,0 +1,319 @@
+"""
+Tokenizador Local - CriativosPro
+Conta tokens com o vocabulário real do modelo, em vez de estimar por caracteres.
+
+O vocabulário de cada família de modelos é baixado uma única vez do Ollama
+(`/api/show` com verbose: tokens, merges e scores do GGUF) e guardado em
+`APPDATA/CriativosPro/tokenizers/<família>.json.gz`; modelos que compartilham
+o tokenizador reaproveitam o mesmo arquivo. Suporta os dois formatos dos GGUF:
+  - "gpt2": BPE em bytes (Llama 3, Qwen, Mistral Nemo...), por ranking de merges;
+  - "llama": BPE do SentencePiece (Llama 2, Mistral, Gemma...), por score das peças.
+
+Só a contagem é necessária (não os ids), então cada palavra é segmentada uma
+vez e o número de peças fica em cache. Contagens de mensagens inteiras ficam em
+uma LRU indexada pelo hash do conteúdo: recontar um contexto de 10 turnos é só
+hashing. A segmentação é Python puro: no event loop, conte com `count_async`
+(thread à parte); `count` é a versão síncrona, segura entre threads.
+Enquanto o vocabulário não está disponível (ou no LM Studio, que não o
+expõe), a contagem cai na estimativa por caracteres.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from core.database import db
+from core.http_pool import http_pool
+from core.constants import (
+    TOKENIZER_DIR_NAME, TOKEN_COUNT_CACHE_ENTRIES, TOKENIZER_WORD_CACHE_ENTRIES, TOKENIZER_MESSAGE_OVERHEAD,
+    TOKENIZER_FETCH_RETRY, CONTEXT_CHARS_PER_TOKEN, DEFAULT_URLS, CONNECTION_TIMEOUT
+)
+from core.logger import root_logger as logger
+
+# Pré-tokenização no estilo do Llama 3 / Qwen (o `re` não tem \p{L}: [^\W\d_] são as letras)
+PRETOKENIZE_PATTERN = re.compile(
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"
+)
+# SentencePiece: espaço vira "▁" e cada palavra começa nele
+SENTENCEPIECE_SPACE = "▁"
+SENTENCEPIECE_PATTERN = re.compile(f"{SENTENCEPIECE_SPACE}*[^{SENTENCEPIECE_SPACE}]+|{SENTENCEPIECE_SPACE}+")
+
+
+def bytes_to_unicode():
+    """Tabela do BPE em bytes do GPT-2: cada byte vira um caractere imprimível."""
+    visible = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    codes = visible[:]
+    extra = 0
+    for byte in range(256):
+        if byte not in visible:
+            visible.append(byte)
+            codes.append(256 + extra)
+            extra += 1
+    return dict(zip(visible, map(chr, codes)))
+
+BYTE_ENCODER = bytes_to_unicode()
+
+
+class BaseTokenizer:
+    """Segmentação com cache por palavra; as subclasses implementam `_count_word`."""
+
+    def __init__(self, family):
+        self.family = family
+        self._words = {}
+
+    def count(self, text):
+        total = 0
+        words = self._words
+        for word in self._split(text):
+            count = words.get(word)
+            if count is None:
+                if len(words) >= TOKENIZER_WORD_CACHE_ENTRIES:
+                    words.clear()
+                count = words[word] = self._count_word(word)
+            total += count
+        return total
+
+
+class ByteLevelBPE(BaseTokenizer):
+    """BPE em bytes ("gpt2" no GGUF): aplica os merges pela ordem de prioridade."""
+
+    def __init__(self, family, merges):
+        super().__init__(family)
+        self.ranks = {tuple(merge.split(" ", 1)): rank for rank, merge in enumerate(merges)}
+
+    def _split(self, text):
+        return PRETOKENIZE_PATTERN.findall(text)
+
+    def _count_word(self, word):
+        symbols = [BYTE_ENCODER[byte] for byte in word.encode("utf-8")]
+        ranks = self.ranks
+        while len(symbols) > 1:
+            best, best_rank = None, None
+            for pair in zip(symbols, symbols[1:]):
+                rank = ranks.get(pair)
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best, best_rank = pair, rank
+            if best is None:
+                break
+            first, second = best
+            merged, index = [], 0
+            while index < len(symbols):
+                if index < len(symbols) - 1 and symbols[index] == first and symbols[index + 1] == second:
+                    merged.append(first + second)
+                    index += 2
+                else:
+                    merged.append(symbols[index])
+                    index += 1
+            symbols = merged
+        return len(symbols)
+
+
+class SentencePieceBPE(BaseTokenizer):
+    """BPE do SentencePiece ("llama" no GGUF): junta o par cuja peça tem maior score."""
+
+    def __init__(self, family, tokens, scores):
+        super().__init__(family)
+        self.scores = dict(zip(tokens, scores))
+
+    def _split(self, text):
+        return SENTENCEPIECE_PATTERN.findall(SENTENCEPIECE_SPACE + text.replace(" ", SENTENCEPIECE_SPACE))
+
+    def _count_word(self, word):
+        symbols = list(word)
+        scores = self.scores
+        while len(symbols) > 1:
+            best, best_score = None, None
+            for index in range(len(symbols) - 1):
+                score = scores.get(symbols[index] + symbols[index + 1])
+                if score is not None and (best_score is None or score > best_score):
+                    best, best_score = index, score
+            if best is None:
+                break
+            symbols[best:best + 2] = [symbols[best] + symbols[best + 1]]
+        # Caracteres fora do vocabulário viram um token por byte (byte fallback)
+        return sum(1 if symbol in scores else len(symbol.encode("utf-8")) for symbol in symbols)
+
+
+def load_tokenizer(family, data):
+    """Cria o tokenizador a partir do vocabulário salvo (formato de `TokenizerService._parse_model_info`)."""
+    if data["type"] == "gpt2":
+        return ByteLevelBPE(family, data["merges"])
+    if data["type"] == "llama":
+        return SentencePieceBPE(family, data["tokens"], data["scores"])
+    raise ValueError(f"Tipo de tokenizador não suportado: {data['type']}")
+
+
+class TokenizerService:
+    """Vocabulários por família de modelos e contagens memorizadas por conteúdo."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(os.path.dirname(db.db_path), TOKENIZER_DIR_NAME)
+        self._index = None          # modelo -> família (index.json)
+        self._tokenizers = {}       # família -> tokenizador carregado
+        self._loading = {}          # modelo -> task de carga/download
+        self._retry_at = {}         # modelo -> instante da próxima tentativa após falha
+        self._counts = OrderedDict()  # (família, hash do texto) -> tokens
+        self._lock = threading.Lock()   # a LRU é usada pelas threads de contagem
+        self.stats = {"hits": 0, "misses": 0, "estimated": 0, "vocabularies": 0, "fetch_errors": 0}
+
+    # === Contagem ===
+
+    def tokenizer_for(self, model_name):
+        # Sem ler o disco: antes de `load_index` terminar, o modelo fica na estimativa
+        family = (self._index or {}).get(model_name)
+        return self._tokenizers.get(family) if family else None
+
+    def count(self, model_name, text):
+        """
+        Tokens de `text` no vocabulário do modelo (estimativa por caracteres se ainda não carregado).
+        Síncrono e CPU-bound: no event loop use `count_async`.
+        """
+        tokenizer = self.tokenizer_for(model_name)
+        if tokenizer is None:
+            self.stats["estimated"] += 1
+            return len(text) // CONTEXT_CHARS_PER_TOKEN + 1
+
+        key = (tokenizer.family, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                self.stats["hits"] += 1
+                return count
+            self.stats["misses"] += 1
+
+        # Segmentação fora do lock (pode levar milissegundos em textos longos)
+        count = tokenizer.count(text)
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > TOKEN_COUNT_CACHE_ENTRIES:
+                self._counts.popitem(last=False)
+        return count
+
+    async def count_async(self, model_name, text):
+        """`count` numa thread, sem bloquear o event loop."""
+        return await asyncio.to_thread(self.count, model_name, text)
+
+    def count_messages(self, model_name, messages):
+        """Tokens de uma lista de mensagens de chat, incluindo o overhead do template."""
+        return sum(self.count(model_name, message["content"]) + TOKENIZER_MESSAGE_OVERHEAD for message in messages)
+
+    def is_exact(self, model_name):
+        return self.tokenizer_for(model_name) is not None
+
+    # === Vocabulários ===
+
+    def prefetch(self, provider_name, model_name):
+        """Carrega (do disco ou do provedor) o vocabulário do modelo em background, uma única vez."""
+        if self.tokenizer_for(model_name) is not None or model_name in self._loading:
+            return
+        if time.monotonic() < self._retry_at.get(model_name, 0):
+            return
+        task = asyncio.ensure_future(self._load(provider_name, model_name))
+        self._loading[model_name] = task
+        task.add_done_callback(lambda _: self._loading.pop(model_name, None))
+
+    async def load_index(self):
+        """Lê o index.json (modelo -> família) fora do event loop."""
+        if self._index is None:
+            await asyncio.to_thread(self._read_index)
+
+    async def _load(self, provider_name, model_name):
+        try:
+            await self.load_index()
+            family = self._index.get(model_name)
+            if family is None or not await asyncio.to_thread(os.path.exists, self._path(family)):
+                if provider_name != "ollama":
+                    raise ValueError(f"{provider_name} não expõe o vocabulário do modelo")
+                info = await self._fetch_ollama(model_name)
+                family, data = self._parse_model_info(info)
+                await asyncio.to_thread(self._write, family, data)
+                self._index[model_name] = family
+                await asyncio.to_thread(self._write_index, dict(self._index))
+
+            if family not in self._tokenizers:
+                self._tokenizers[family] = await asyncio.to_thread(self._read, family)
+                self.stats["vocabularies"] += 1
+                logger.info(f"[Tokenizer] Vocabulário '{family}' carregado para {model_name}")
+        except Exception as e:
+            self.stats["fetch_errors"] += 1
+            self._retry_at[model_name] = time.monotonic() + TOKENIZER_FETCH_RETRY
+            logger.warning(f"[Tokenizer] Sem vocabulário para {model_name} (usando estimativa): {e}")
+
+    async def _fetch_ollama(self, model_name):
+        base_url = db.get_setting("base_url_ollama", DEFAULT_URLS["ollama"]).rstrip("/")
+        base_url = base_url[:-3] if base_url.endswith("/v1") else base_url
+        # Mesmo cliente (e conexões) do provedor Ollama
+        client = http_pool.get(base_url)
+        response = await client.post(f"{base_url}/api/show", json={"model": model_name, "verbose": True},
+                                     timeout=CONNECTION_TIMEOUT)
+        response.raise_for_status()
+        # Vocabulário completo (vários MB de JSON): decodificado fora do event loop
+        body = await asyncio.to_thread(response.json)
+        return body.get("model_info") or {}
+
+    @staticmethod
+    def _parse_model_info(info):
+        """Extrai do `model_info` do GGUF só o necessário para contar (família, dados)."""
+        kind = info.get("tokenizer.ggml.model")
+        tokens = info.get("tokenizer.ggml.tokens")
+        if not tokens:
+            raise ValueError("model_info sem tokenizer.ggml.tokens")
+        pre = info.get("tokenizer.ggml.pre") or kind
+        family = re.sub(r"[^\w.-]", "_", f"{info.get('general.architecture', 'modelo')}-{pre}-{len(tokens)}")
+        if kind == "gpt2":
+            return family, {"type": "gpt2", "merges": info["tokenizer.ggml.merges"]}
+        if kind == "llama":
+            return family, {"type": "llama", "tokens": tokens, "scores": info["tokenizer.ggml.scores"]}
+        raise ValueError(f"Tokenizador '{kind}' não suportado")
+
+    def _path(self, family):
+        return os.path.join(self.directory, f"{family}.json.gz")
+
+    def _read(self, family):
+        with gzip.open(self._path(family), "rt", encoding="utf-8") as source:
+            return load_tokenizer(family, json.load(source))
+
+    def _write(self, family, data):
+        if os.path.exists(self._path(family)):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        partial = self._path(family) + ".part"
+        with gzip.open(partial, "wt", encoding="utf-8") as target:
+            json.dump(data, target, ensure_ascii=False)
+        os.replace(partial, self._path(family))
+
+    def _read_index(self):
+        if self._index is None:
+            try:
+                with open(os.path.join(self.directory, "index.json"), encoding="utf-8") as source:
+                    self._index = json.load(source)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _write_index(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "index.json")
+        with open(path + ".part", "w", encoding="utf-8") as target:
+            json.dump(index, target, ensure_ascii=False, indent=1)
+        os.replace(path + ".part", path)
+
+    def register(self, model_name, family, tokenizer):
+        """Associa um tokenizador já carregado a um modelo (benchmarks, vocabulários locais)."""
+        self._read_index()[model_name] = family
+        self._tokenizers[family] = tokenizer
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / total, 4) if total else 0.0
+        stats["families"] = sorted(self._tokenizers)
+        return stats
+
+# Instância global
+tokenizer_service = TokenizerService()
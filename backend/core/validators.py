@@ -2,9 +2,13 @@
 Módulo de Validação de Inputs - CriativosPro
 Garante que todos os dados recebidos do usuário sejam validados e sanitizados.
 """
+import os
 import re
 from typing import Any, Dict, Optional
 from urllib.parse import urlparse
+from core.constants import (
+    GenerationPriority, STREAM_COALESCE_WINDOW_MS, STREAM_COALESCE_MAX_BYTES, STREAM_COALESCE_MAX_WINDOW_MS
+)
 
 class ValidationError(Exception):
     """Exceção customizada para erros de validação."""
@@ -18,10 +22,12 @@ class InputValidator:
     MAX_SESSION_NAME_LENGTH = 100
     MAX_PROMPT_LENGTH = 10000
     MAX_PROFILE_FIELD_LENGTH = 500
+    MAX_SEARCH_QUERY_LENGTH = 200
     MIN_MESSAGE_LENGTH = 1
     
     # Padrões Regex
     SESSION_ID_PATTERN = re.compile(r'^sess_\d+_[a-z0-9]{9}$')
+    TRANSFER_EXTENSIONS = ('.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz')
     SAFE_STRING_PATTERN = re.compile(r'^[a-zA-Z0-9\s\-_.,!?áéíóúàèìòùâêîôûãõçÁÉÍÓÚÀÈÌÒÙÂÊÎÔÛÃÕÇ]+$')
     
     @staticmethod
@@ -204,6 +210,131 @@ class InputValidator:
         
         return validated
     
+    @staticmethod
+    def validate_search_query(query: str) -> str:
+        """
+        Valida um termo de busca no histórico.
+        
+        Args:
+            query: Texto digitado pelo usuário
+            
+        Returns:
+            Termo validado
+            
+        Raises:
+            ValidationError: Se o termo for inválido
+        """
+        if not isinstance(query, str):
+            raise ValidationError("Busca deve ser uma string")
+        
+        query = query.strip()
+        
+        if not query:
+            raise ValidationError("Busca não pode estar vazia")
+        
+        if len(query) > InputValidator.MAX_SEARCH_QUERY_LENGTH:
+            raise ValidationError(f"Busca excede o limite de {InputValidator.MAX_SEARCH_QUERY_LENGTH} caracteres")
+        
+        return query
+    
+    @staticmethod
+    def validate_priority(priority: Optional[str]) -> int:
+        """
+        Valida a classe de prioridade pedida pelo cliente ("interactive" ou "batch").
+        A classe background é reservada para trabalho interno do backend.
+        
+        Args:
+            priority: Nome da classe (None = interativa)
+            
+        Returns:
+            Prioridade (GenerationPriority)
+            
+        Raises:
+            ValidationError: Se a classe for inválida
+        """
+        if priority is None:
+            return GenerationPriority.INTERACTIVE
+        
+        allowed = {GenerationPriority.NAMES[p]: p for p in (GenerationPriority.INTERACTIVE, GenerationPriority.BATCH)}
+        if priority not in allowed:
+            raise ValidationError(f"Prioridade inválida. Use: {', '.join(allowed)}")
+        
+        return allowed[priority]
+    
+    @staticmethod
+    def validate_stream_options(options: Dict[str, Any], current: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Valida as preferências de agrupamento do streaming de um cliente.
+        Só as chaves enviadas são validadas; as ausentes vêm de `current`.
+        
+        Args:
+            options: {"window_ms": int, "max_bytes": int, "thinking": bool}, todas opcionais
+            current: Preferências atuais do cliente (padrão: as do servidor)
+            
+        Returns:
+            Preferências completas (atuais + as enviadas, validadas)
+            
+        Raises:
+            ValidationError: Se algum valor estiver fora dos limites
+        """
+        if not isinstance(options, dict):
+            raise ValidationError("Opções de streaming devem ser um objeto")
+        
+        result = dict(current or {
+            "window_ms": STREAM_COALESCE_WINDOW_MS, "max_bytes": STREAM_COALESCE_MAX_BYTES, "thinking": False
+        })
+        
+        if "window_ms" in options:
+            window_ms = options["window_ms"]
+            if not isinstance(window_ms, int) or isinstance(window_ms, bool) or not 0 <= window_ms <= STREAM_COALESCE_MAX_WINDOW_MS:
+                raise ValidationError(f"window_ms deve ser um inteiro entre 0 e {STREAM_COALESCE_MAX_WINDOW_MS}")
+            result["window_ms"] = window_ms
+        
+        if "max_bytes" in options:
+            max_bytes = options["max_bytes"]
+            if not isinstance(max_bytes, int) or isinstance(max_bytes, bool) or not 1 <= max_bytes <= 65536:
+                raise ValidationError("max_bytes deve ser um inteiro entre 1 e 65536")
+            result["max_bytes"] = max_bytes
+        
+        if "thinking" in options:
+            thinking = options["thinking"]
+            if not isinstance(thinking, bool):
+                raise ValidationError("thinking deve ser booleano")
+            result["thinking"] = thinking
+        
+        return result
+    
+    @staticmethod
+    def validate_transfer_path(path: str, must_exist: bool = False) -> str:
+        """
+        Valida o caminho de um arquivo de exportação/importação (NDJSON, opcionalmente .gz).
+        
+        Args:
+            path: Caminho informado pelo usuário
+            must_exist: Se o arquivo precisa existir (importação)
+            
+        Returns:
+            Caminho absoluto validado
+            
+        Raises:
+            ValidationError: Se o caminho for inválido
+        """
+        if not isinstance(path, str) or not path.strip():
+            raise ValidationError("Caminho do arquivo deve ser uma string não vazia")
+        
+        path = os.path.abspath(os.path.expanduser(path.strip()))
+        
+        if not path.lower().endswith(InputValidator.TRANSFER_EXTENSIONS):
+            raise ValidationError(f"Extensão inválida. Use: {', '.join(InputValidator.TRANSFER_EXTENSIONS)}")
+        
+        if must_exist and not os.path.isfile(path):
+            raise ValidationError("Arquivo não encontrado")
+        
+        if not os.path.isdir(os.path.dirname(path)):
+            raise ValidationError("Diretório de destino não existe")
+        
+        return path
+    
     @staticmethod
     def sanitize_for_log(data: Any, max_length: int = 100) -> str:
         """
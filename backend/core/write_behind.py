@@ -0,0 +1,278 @@
+"""
+Fila Write-Behind - CriativosPro
+Agrupa inserts de histórico, upserts de sessão e métricas em transações
+únicas, descarregadas por tamanho de lote ou intervalo de tempo.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from core.database import db
+from core.constants import (
+    WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_MAX_RETRIES, WRITE_BEHIND_REJECTED_KEEP
+)
+from core.logger import root_logger as logger
+
+
+class WriteBehindQueue:
+    """
+    Buffer assíncrono de escrita.
+
+    As escritas são enfileiradas em memória (sem tocar o disco) e um flusher
+    em background as grava em uma única transação quando o lote atinge
+    `max_batch` itens ou a cada `flush_interval` segundos.
+
+    Consistência: dentro de `consistent_read` nenhum flush acontece, então
+    ler o banco e somar `pending_messages` garante read-your-writes sem
+    duplicar linhas.
+
+    Falhas: banco ocupado (SQLITE_BUSY/LOCKED) devolve o lote à fila e tenta de
+    novo indefinidamente. Qualquer outro erro também devolve o lote, mas depois
+    de `WRITE_BEHIND_MAX_RETRIES` falhas seguidas a fila é gravada item a item e
+    os itens que ainda falham vão para `rejected` (e para o log), sem travar o resto.
+    """
+
+    def __init__(self, max_batch=WRITE_BEHIND_MAX_BATCH, flush_interval=WRITE_BEHIND_FLUSH_INTERVAL):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._messages = []  # (session_id, role, content, metadata_json)
+        self._metrics = []   # tupla na ordem das colunas de metrics
+        self._sketches = {}  # (provider, model, métrica) -> QuantileSketch acumulado
+        self._lock = threading.Lock()        # Protege as listas (seção curta)
+        self._flush_lock = threading.Lock()  # Serializa flush x leituras consistentes
+        self._session_handler = None
+        self._session_listener = None
+        self._wakeup = None
+        self._task = None
+        self._failures = 0  # Falhas não transitórias seguidas
+        self.rejected = deque(maxlen=WRITE_BEHIND_REJECTED_KEEP)  # (tipo, item, erro)
+        self.stats = {"flushes": 0, "rows": 0, "rejected": 0}
+
+    def set_session_handler(self, handler):
+        """
+        Registra o callback `handler(cursor, session_id, role, content, metadata_json)` aplicado
+        a cada mensagem gravada. Ele pode retornar "added"/"updated" para sinalizar mudança na sessão.
+        """
+        self._session_handler = handler
+
+    def set_session_listener(self, listener):
+        """Registra a coroutine `listener({session_id: "added"|"updated"})` chamada após cada flush."""
+        self._session_listener = listener
+
+    # === Enfileiramento ===
+
+    def add_message(self, session_id, role, content, metadata=None):
+        with self._lock:
+            self._messages.append((session_id, role, content, json.dumps(metadata) if metadata else None))
+            size = len(self._messages) + len(self._metrics)
+        self._notify(size)
+
+    def add_metric(self, session_id, provider, model, metrics_data):
+        row = db.metric_row(session_id, provider, model, metrics_data)
+        with self._lock:
+            self._metrics.append(row)
+            size = len(self._messages) + len(self._metrics)
+        self._notify(size)
+
+    def add_latency_sketches(self, provider, model, sketches):
+        """Acumula os sketches de latência de uma geração (ttft, duration, inter_token)."""
+        with self._lock:
+            for metric, sketch in sketches.items():
+                if sketch.count == 0:
+                    continue
+                key = (provider, model, metric)
+                if key in self._sketches:
+                    self._sketches[key].merge(sketch)
+                else:
+                    self._sketches[key] = sketch
+            size = len(self._messages) + len(self._metrics)
+        self._notify(size)
+
+    def has_pending(self, session_id):
+        with self._lock:
+            return any(m[0] == session_id for m in self._messages)
+
+    def pending_messages(self, session_id):
+        """Mensagens da sessão ainda não gravadas, na ordem de chegada."""
+        with self._lock:
+            return [m for m in self._messages if m[0] == session_id]
+
+    @contextmanager
+    def consistent_read(self):
+        """Bloqueia flushes enquanto o bloco lê o banco."""
+        with self._flush_lock:
+            yield
+
+    def drop_session(self, session_id):
+        """Descarta escritas pendentes de uma sessão que está sendo removida."""
+        with self._flush_lock, self._lock:
+            self._messages = [m for m in self._messages if m[0] != session_id]
+
+    # === Flush ===
+
+    def _notify(self, size):
+        """Garante o flusher ativo e o acorda quando o lote enche."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sem event loop (scripts/síncrono): grava imediatamente
+            self._flush_sync()
+            return
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        if size >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"[WriteBehind] Falha no flush: {e}")
+
+    async def flush(self):
+        """Grava tudo que estiver pendente em uma única transação."""
+        with self._lock:
+            if not self._messages and not self._metrics and not self._sketches:
+                return
+        changes = await db.run(self._flush_sync)
+        if changes and self._session_listener:
+            try:
+                await self._session_listener(changes)
+            except Exception as e:
+                logger.error(f"[WriteBehind] Falha ao notificar sessões alteradas: {e}")
+
+    def _flush_sync(self):
+        """Grava o lote pendente e retorna as sessões alteradas ({session_id: "added"|"updated"})."""
+        with self._flush_lock:
+            with self._lock:
+                messages, self._messages = self._messages, []
+                metrics, self._metrics = self._metrics, []
+                sketches, self._sketches = self._sketches, {}
+            if not messages and not metrics and not sketches:
+                return {}
+
+            rejected = self.stats["rejected"]
+            if self._failures >= WRITE_BEHIND_MAX_RETRIES:
+                logger.warning(f"[WriteBehind] {self._failures} falhas seguidas; gravando item a item")
+                changes = self._write_isolated(messages, metrics, sketches)
+            else:
+                try:
+                    changes = self._write(messages, metrics, sketches)
+                except Exception as e:
+                    # Devolve o lote para a frente da fila para não perder dados
+                    self._requeue(messages, metrics, sketches)
+                    if not self._is_transient(e):
+                        self._failures += 1
+                    raise
+
+            self._failures = 0
+            self.stats["flushes"] += 1
+            self.stats["rows"] += len(messages) + len(metrics) - (self.stats["rejected"] - rejected)
+            return changes
+
+    def _write(self, messages, metrics, sketches):
+        """Grava mensagens, métricas e sketches em uma transação; retorna as sessões alteradas."""
+        changes = {}
+        with db.pool.transaction() as conn:
+            cursor = conn.cursor()
+            # Insert e regra de sessão intercalados: o resumo da sessão criada
+            # no meio do lote não pode contar as mensagens seguintes duas vezes
+            for message in messages:
+                cursor.execute('''
+                    INSERT INTO history (session_id, role, content, metadata)
+                    VALUES (?, ?, ?, ?)
+                ''', message)
+                if self._session_handler:
+                    change = self._session_handler(cursor, *message)
+                    if change and changes.get(message[0]) != "added":
+                        changes[message[0]] = change
+            if metrics:
+                db.insert_metrics(cursor, metrics)
+            if sketches:
+                db.merge_latency_sketches(cursor, sketches)
+        return changes
+
+    def _write_isolated(self, messages, metrics, sketches):
+        """
+        Grava cada item em sua própria transação e separa os que falham. Um erro
+        transitório interrompe a passada: o item e os seguintes voltam para a fila.
+        """
+        items = [("message", ([message], [], {})) for message in messages]
+        items += [("metric", ([], [metric], {})) for metric in metrics]
+        if sketches:
+            items.append(("sketches", ([], [], sketches)))
+
+        changes = {}
+        for index, (kind, batch) in enumerate(items):
+            try:
+                for session_id, change in self._write(*batch).items():
+                    if changes.get(session_id) != "added":
+                        changes[session_id] = change
+            except Exception as e:
+                if self._is_transient(e):
+                    rest = [batch for _, batch in items[index:]]
+                    self._requeue(
+                        [m for batch in rest for m in batch[0]], [m for batch in rest for m in batch[1]],
+                        next((batch[2] for batch in rest if batch[2]), {})
+                    )
+                    raise
+                self._reject(kind, batch, e)
+        return changes
+
+    @staticmethod
+    def _is_transient(error):
+        """Banco ocupado por outro escritor (SQLITE_BUSY/SQLITE_LOCKED): o mesmo lote pode passar depois."""
+        if not isinstance(error, sqlite3.OperationalError):
+            return False
+        name = getattr(error, "sqlite_errorname", "")
+        return name.startswith(("SQLITE_BUSY", "SQLITE_LOCKED")) or "locked" in str(error) or "busy" in str(error)
+
+    def _requeue(self, messages, metrics, sketches):
+        with self._lock:
+            self._messages[:0] = messages
+            self._metrics[:0] = metrics
+            for key, sketch in sketches.items():
+                if key in self._sketches:
+                    sketch.merge(self._sketches[key])
+                self._sketches[key] = sketch
+
+    def _reject(self, kind, batch, error):
+        """Tira da fila um item que falha sozinho, guardando-o em `rejected` e no log."""
+        messages, metrics, sketches = batch
+        if kind == "message":
+            session_id, role, content, _ = messages[0]
+            detail = f"sessão {session_id}, {role}, {len(content or '')} caracteres"
+            item = messages[0]
+        elif kind == "metric":
+            detail = f"sessão {metrics[0][0]}, {metrics[0][1]}/{metrics[0][2]}"
+            item = metrics[0]
+        else:
+            detail = ", ".join("/".join(map(str, key)) for key in sketches)
+            item = sketches
+        self.rejected.append((kind, item, str(error)))
+        self.stats["rejected"] += 1
+        logger.error(f"[WriteBehind] Item recusado ({kind}: {detail}): {error}")
+
+    async def close(self):
+        """Interrompe o flusher e grava o que restar (chamado no shutdown)."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+
+# Instância global
+write_behind = WriteBehindQueue()
@@ -0,0 +1,29 @@
+"""Testes - validação das opções de streaming (set_stream_options)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.validators import validator, ValidationError
+from core.constants import STREAM_COALESCE_WINDOW_MS, STREAM_COALESCE_MAX_BYTES
+
+
+def test_thinking_only_uses_defaults():
+    options = validator.validate_stream_options({"thinking": True})
+    assert options == {"window_ms": STREAM_COALESCE_WINDOW_MS, "max_bytes": STREAM_COALESCE_MAX_BYTES, "thinking": True}
+
+
+def test_thinking_only_keeps_current_options():
+    current = {"window_ms": 0, "max_bytes": 256, "thinking": False}
+    options = validator.validate_stream_options({"thinking": True}, current)
+    assert options == {"window_ms": 0, "max_bytes": 256, "thinking": True}
+    assert current["thinking"] is False
+
+
+def test_invalid_sent_key_is_rejected():
+    with pytest.raises(ValidationError):
+        validator.validate_stream_options({"window_ms": 500})
+    with pytest.raises(ValidationError):
+        validator.validate_stream_options({"thinking": "sim"})
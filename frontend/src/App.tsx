@@ -41,15 +41,29 @@ function App() {
   const [showSettings, setShowSettings] = useState(false);
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputValue, setInputValue] = useState('');
-  const [status, setStatus] = useState('IDLE');
+  // Status de geração por sessão (session_id -> 'queued' | 'generating'); sessões ociosas não aparecem
+  const [generatingSessions, setGeneratingSessions] = useState<Record<string, string>>({});
+  // Posição na fila de admissão (1 = próxima) das sessões que aguardam vaga
+  const [queuePositions, setQueuePositions] = useState<Record<string, number>>({});
   const [providers, setProviders] = useState<Record<string, string[]>>({});
   const [selectedProvider, setSelectedProvider] = useState<string>('');
   const [selectedModel, setSelectedModel] = useState<string>('');
   const [sessions, setSessions] = useState<any[]>([]);
+  // Paginação da lista de sessões (cursor = [last_activity, id] da última carregada)
+  const [sessionsCursor, setSessionsCursor] = useState<[string, string] | null>(null);
+  const [hasMoreSessions, setHasMoreSessions] = useState(false);
 
   // Gerador de ID único para sessão
   const generateSessionId = () => `sess_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
   const [currentSessionId, setCurrentSessionId] = useState<string>(generateSessionId());
+  // Eventos de streaming chegam de várias sessões: só os da sessão aberta mexem na conversa
+  const currentSessionRef = useRef(currentSessionId);
+  useEffect(() => { currentSessionRef.current = currentSessionId; }, [currentSessionId]);
+  const status = generatingSessions[currentSessionId] ? 'PROCESSING' : 'IDLE';
+
+  // Paginação do histórico (cursor = id da mensagem mais antiga carregada)
+  const [historyCursor, setHistoryCursor] = useState<number | null>(null);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
 
   // Modal de Exclusão
   const [showDeleteModal, setShowDeleteModal] = useState(false);
@@ -81,6 +95,8 @@ function App() {
     setTimeout(() => {
       setMessages([]);
       setCurrentSessionId(generateSessionId());
+      setHistoryCursor(null);
+      setHasOlderMessages(false);
       setActiveView('chat');
       setIsResetting(false);
     }, 10);
@@ -91,6 +107,16 @@ function App() {
     socketRef.current?.emit('load_session', { session_id: sessionId });
   };
 
+  const handleLoadOlderMessages = () => {
+    if (!hasOlderMessages || historyCursor === null) return;
+    socketRef.current?.emit('load_older_messages', { session_id: currentSessionId, cursor: historyCursor });
+  };
+
+  const handleLoadMoreSessions = () => {
+    if (!hasMoreSessions || sessionsCursor === null) return;
+    socketRef.current?.emit('get_sessions', { cursor: sessionsCursor });
+  };
+
   const socketRef = useRef<Socket | null>(null);
   const thinkingTimeoutRef = useRef<number | null>(null);
   const isFirstChunkRef = useRef(true);
@@ -143,12 +169,40 @@ function App() {
       setTimeout(() => {
         setMessages(data.messages);
         setCurrentSessionId(data.session_id);
+        setHistoryCursor(data.cursor ?? null);
+        setHasOlderMessages(Boolean(data.has_more));
         setActiveView('chat');
         setIsResetting(false);
       }, 10);
     });
 
-    socketRef.current.on('system_status', (data) => setStatus(data.status));
+    socketRef.current.on('session_page', (data) => {
+      setMessages(prev => [...data.messages, ...prev]);
+      setHistoryCursor(data.cursor ?? null);
+      setHasOlderMessages(Boolean(data.has_more));
+    });
+
+    socketRef.current.on('generation_status', (data) => {
+      setGeneratingSessions(prev => {
+        const next = { ...prev };
+        if (data.status === 'idle') delete next[data.session_id];
+        else next[data.session_id] = data.status;
+        return next;
+      });
+      if (data.status !== 'queued') {
+        setQueuePositions(prev => {
+          const next = { ...prev };
+          delete next[data.session_id];
+          return next;
+        });
+      }
+    });
+
+    const updateQueuePosition = (data: any) => {
+      setQueuePositions(prev => ({ ...prev, [data.session_id]: data.position }));
+    };
+    socketRef.current.on('queued', updateQueuePosition);
+    socketRef.current.on('queue_position', updateQueuePosition);
     socketRef.current.on('models_data', (data) => {
       setProviders(data.providers);
       if (Object.keys(data.providers).length > 0 && !selectedProvider) {
@@ -159,6 +213,7 @@ function App() {
     });
 
     socketRef.current.on('chat_chunk', (data) => {
+      if (data.session_id && data.session_id !== currentSessionRef.current) return;
       // Se for o primeiro chunk, aguardar 1.5s para dar sensação de pensamento
       if (isFirstChunkRef.current) {
         isFirstChunkRef.current = false;
@@ -187,6 +242,7 @@ function App() {
     });
 
     socketRef.current.on('chat_end', (data) => {
+      if (data.session_id && data.session_id !== currentSessionRef.current) return;
       setMessages(prev => {
         const last = prev[prev.length - 1];
         if (last && last.role === 'assistant') {
@@ -194,10 +250,34 @@ function App() {
         }
         return prev;
       });
-      socketRef.current?.emit('get_sessions', {});
     });
 
-    socketRef.current.on('sessions_list', (data) => setSessions(data.sessions));
+    socketRef.current.on('sessions_list', (data) => {
+      setSessions(data.sessions);
+      setSessionsCursor(data.cursor ?? null);
+      setHasMoreSessions(Boolean(data.has_more));
+    });
+
+    socketRef.current.on('sessions_page', (data) => {
+      setSessions(prev => [...prev, ...data.sessions.filter((s: any) => !prev.some(p => p.id === s.id))]);
+      setSessionsCursor(data.cursor ?? null);
+      setHasMoreSessions(Boolean(data.has_more));
+    });
+
+    // Atualizações incrementais: a sessão alterada sobe para o topo da lista
+    const upsertSession = (data: any) => {
+      setSessions(prev => [data.session, ...prev.filter(s => s.id !== data.session.id)]);
+    };
+    socketRef.current.on('session_added', upsertSession);
+    socketRef.current.on('session_updated', upsertSession);
+
+    socketRef.current.on('session_removed', (data) => {
+      setSessions(prev => prev.filter(s => s.id !== data.session_id));
+    });
+
+    socketRef.current.on('new_session_title', (data) => {
+      setSessions(prev => prev.map(s => s.id === data.session_id ? { ...s, title: data.title } : s));
+    });
 
     // Listeners de Áudio (TTS)
     socketRef.current.on('tts_ready', (data) => {
@@ -237,7 +317,7 @@ function App() {
     // Tratamento de Erro Geral do Chat
     socketRef.current.on('error', (data) => {
       console.error("Erro do Backend:", data);
-      setStatus('IDLE');
+      if (data.session_id && data.session_id !== currentSessionRef.current) return;
 
       // Atualiza a última mensagem do bot (que estaria com '...') para mostrar o erro
       setMessages(prev => {
@@ -260,8 +340,6 @@ function App() {
     // Listener para Parada Manual
     socketRef.current.on('generation_stopped', () => {
       console.log("Geração interrompida pelo usuário");
-      setStatus('IDLE');
-
     });
 
     return () => { socketRef.current?.disconnect(); };
@@ -324,7 +402,8 @@ function App() {
       content: previousMsg.content, // Reenvia o prompt da mensagem anterior
       session_id: currentSessionId,
       provider: selectedProvider,
-      model: selectedModel
+      model: selectedModel,
+      bypass_cache: true // Regenerar pede uma resposta nova, não a do cache
     });
   }, [messages, currentSessionId, selectedProvider, selectedModel]);
 
@@ -375,7 +454,7 @@ function App() {
                 <span className="text-[10px] mt-2 italic">Silêncio criativo...</span>
               </div>
             ) : (
-              sessions.slice(0, 8).map(s => (
+              sessions.map(s => (
                 <div key={s.id} className="group relative w-full mb-1">
                   <button
                     onClick={() => handleLoadSession(s.id)}
@@ -393,6 +472,14 @@ function App() {
                 </div>
               ))
             )}
+            {hasMoreSessions && (
+              <button
+                onClick={handleLoadMoreSessions}
+                className="w-full px-4 py-2 rounded-xl text-[10px] font-bold uppercase tracking-[0.2em] text-white/20 hover:text-white hover:bg-white/5 transition-all"
+              >
+                Mais conversas
+              </button>
+            )}
           </div>
         </nav>
 
@@ -466,7 +553,9 @@ function App() {
           <div className="flex-1 flex justify-end items-center">
             <div className="flex items-center gap-2.5 px-4 py-2 bg-white/5 rounded-full border border-white/5">
               <div className="w-1.5 h-1.5 rounded-full bg-emerald-500 status-dot-pulse"></div>
-              <span className="text-[9px] font-bold text-emerald-500 uppercase tracking-[0.2em]">Neural Link Active</span>
+              <span className="text-[9px] font-bold text-emerald-500 uppercase tracking-[0.2em]">
+                {queuePositions[currentSessionId] ? `Na fila · posição ${queuePositions[currentSessionId]}` : 'Neural Link Active'}
+              </span>
             </div>
           </div>
         </header>
@@ -491,6 +580,8 @@ function App() {
                   selectedModel={selectedModel}
                   playingMessageIndex={playingMessageIndex}
                   loadingAudioIndex={loadingAudioIndex}
+                  hasOlderMessages={hasOlderMessages}
+                  handleLoadOlderMessages={handleLoadOlderMessages}
                 />
               )}
 
@@ -544,7 +635,7 @@ function App() {
 }
 
 /* Chat Home View */
-function ChatView({ messages, inputValue, setInputValue, handleSendMessage, handleToggleAudio, handleDeleteMessage, handleRetryMessage, status, selectedModel, playingMessageIndex, loadingAudioIndex }: any) {
+function ChatView({ messages, inputValue, setInputValue, handleSendMessage, handleToggleAudio, handleDeleteMessage, handleRetryMessage, status, selectedModel, playingMessageIndex, loadingAudioIndex, hasOlderMessages, handleLoadOlderMessages }: any) {
   // Referência para auto-scroll
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const scrollContainerRef = useRef<HTMLDivElement>(null);
@@ -576,6 +667,16 @@ function ChatView({ messages, inputValue, setInputValue, handleSendMessage, hand
             </div>
           ) : (
             <div className="space-y-8">
+              {hasOlderMessages && (
+                <div className="flex justify-center">
+                  <button
+                    onClick={handleLoadOlderMessages}
+                    className="px-4 py-2 rounded-lg text-[10px] font-bold uppercase tracking-[0.2em] text-white/40 hover:text-white hover:bg-white/5 border border-white/5 transition-all"
+                  >
+                    Carregar mensagens anteriores
+                  </button>
+                </div>
+              )}
               {messages.map((msg: any, i: number) => (
                 <MessageBubble
                   key={i}
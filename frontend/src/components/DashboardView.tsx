@@ -61,7 +61,7 @@ export function DashboardView({ socket }: DashboardViewProps) {
             </header>
 
             {/* Grid de Cards Principais */}
-            <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6 mb-12">
+            <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-5 gap-6 mb-12">
                 <StatCard
                     icon={<Database className="text-purple-500" />}
                     label="Total de Tokens"
@@ -83,6 +83,13 @@ export function DashboardView({ socket }: DashboardViewProps) {
                     subvalue="Tempo de resposta"
                     color="emerald"
                 />
+                <StatCard
+                    icon={<Database className="text-blue-500" />}
+                    label="Cache de Respostas"
+                    value={`${((stats.totals.cache_hit_ratio ?? 0) * 100).toFixed(1)}%`}
+                    subvalue={`${stats.totals.cache_hits ?? 0} acertos / ${(stats.totals.cache_hits ?? 0) + (stats.totals.cache_misses ?? 0)} consultas`}
+                    color="blue"
+                />
                 <StatCard
                     icon={<Activity className="text-pink-500" />}
                     label="Estabilidade"
@@ -132,6 +139,7 @@ function StatCard({ icon, label, value, subvalue, color }: any) {
         yellow: "bg-yellow-500/10 border-yellow-500/20 text-yellow-400",
         emerald: "bg-emerald-500/10 border-emerald-500/20 text-emerald-400",
         pink: "bg-pink-500/10 border-pink-500/20 text-pink-400",
+        blue: "bg-blue-500/10 border-blue-500/20 text-blue-400",
     };
 
     return (